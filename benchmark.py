@@ -0,0 +1,438 @@
+#!/usr/bin/env python
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+import yaml
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from nuage_metroae_config.configuration import Configuration
+from nuage_metroae_config.logger import Logger
+from nuage_metroae_config.template import Template, TemplateStore
+from tests.mock_writer import MockWriter
+
+'''
+Performance benchmarks for the nuage_metroae_config module.
+
+Example Usage:
+
+python benchmark.py decode
+python benchmark.py decode -n 1000 -tp tests/fixtures/valid_templates
+python benchmark.py templates -n 500 -o results.json
+python benchmark.py memory -n 2000
+'''
+
+FIXTURE_TEMPLATE_DIRECTORY = os.path.join(os.path.dirname(__file__), "tests",
+                                          "fixtures", "valid_templates")
+DEFAULT_ITERATIONS = 200
+DEFAULT_RECORDS = 200
+DEFAULT_REPEAT = 3
+DEFAULT_MEMORY_RECORDS = 2000
+
+# Synthetic template sizes as (attributes per object, nesting depth)
+TEMPLATE_SIZES = {"small": (2, 1),
+                  "medium": (10, 3),
+                  "large": (40, 6)}
+TEMPLATE_VARIANTS = ["static-json", "static-yaml", "dynamic-yaml"]
+ATTRIBUTE_TYPES = ["string", "integer", "boolean", "choice"]
+
+
+def main():
+    parser = get_parser()
+    args = parser.parse_args()
+
+    if args.action is None:
+        parser.print_help()
+        exit(1)
+
+    args.func(args)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog="benchmark")
+
+    sub_parser = parser.add_subparsers(dest='action')
+
+    decode_parser = sub_parser.add_parser(
+        "decode", help="Compare decoding paths for rendered templates")
+    decode_parser.add_argument('-tp', '--template_path', dest='template_path',
+                               action='store', required=False,
+                               default=FIXTURE_TEMPLATE_DIRECTORY,
+                               help='Path containing template files')
+    decode_parser.add_argument('-n', '--iterations', dest='iterations',
+                               type=int, required=False,
+                               default=DEFAULT_ITERATIONS,
+                               help='Number of decodes per measurement')
+    decode_parser.set_defaults(func=benchmark_decode)
+
+    templates_parser = sub_parser.add_parser(
+        "templates", help="Measure loading, validating, parsing and "
+                          "applying synthetic templates")
+    templates_parser.add_argument('-n', '--records', dest='records',
+                                  type=int, required=False,
+                                  default=DEFAULT_RECORDS,
+                                  help='Number of user data records per '
+                                       'template')
+    templates_parser.add_argument('-r', '--repeat', dest='repeat',
+                                  type=int, required=False,
+                                  default=DEFAULT_REPEAT,
+                                  help='Number of times each measurement is '
+                                       'repeated, the fastest is reported')
+    templates_parser.add_argument('-o', '--output', dest='output',
+                                  action='store', required=False,
+                                  help='File to write JSON results to, '
+                                       'otherwise written to stdout')
+    templates_parser.set_defaults(func=benchmark_templates)
+
+    memory_parser = sub_parser.add_parser(
+        "memory", help="Measure the memory used by the action tree of "
+                       "synthetic templates")
+    memory_parser.add_argument('-n', '--records', dest='records',
+                               type=int, required=False,
+                               default=DEFAULT_MEMORY_RECORDS,
+                               help='Number of user data records per '
+                                    'template')
+    memory_parser.add_argument('-o', '--output', dest='output',
+                               action='store', required=False,
+                               help='File to write JSON results to, '
+                                    'otherwise written to stdout')
+    memory_parser.set_defaults(func=benchmark_memory)
+
+    return parser
+
+
+def read_template_files(path):
+    templates = list()
+    for file_name in sorted(os.listdir(path)):
+        if (file_name.endswith(".yml") or
+                file_name.endswith(".yaml") or
+                file_name.endswith(".json")):
+            with open(os.path.join(path, file_name), 'r') as file:
+                template = Template()
+                template._parse_without_vars(file.read(), file_name)
+                templates.append(template)
+
+    return templates
+
+
+def generate_sample_value(variable, index=0):
+    var_type = variable["type"].lower()
+    if var_type == "list":
+        var_type = variable["item-type"].lower()
+        return [generate_sample_value(
+            dict(variable, type=var_type), index)]
+
+    if var_type in ["integer", "float"]:
+        ranges = variable.get("range")
+        if ranges is None:
+            return index
+        if type(ranges) != list:
+            ranges = [ranges]
+        if isinstance(ranges[0], str):
+            return int(float(ranges[0].split("..")[0]))
+        return ranges[0]
+    elif var_type == "boolean":
+        return index % 2 == 0
+    elif var_type == "choice":
+        return variable["choices"][index % len(variable["choices"])]
+    elif var_type == "ipv4" or var_type == "ipv4_or_6":
+        return "10.%d.%d.1" % ((index // 256) % 256, index % 256)
+    elif var_type == "ipv6":
+        return "fd00::%x" % index
+    else:
+        return "%s_%d" % (variable["name"], index)
+
+
+def generate_sample_data(template, index=0):
+    data = dict()
+    for variable in template.variables:
+        data[variable["name"]] = generate_sample_value(variable, index)
+
+    return data
+
+
+def read_rendered_templates(path):
+    rendered = list()
+    for template in read_template_files(path):
+        data = generate_sample_data(template)
+        rendered.append((template.filename,
+                         template._replace_vars_with_kwargs(**data)))
+
+    return rendered
+
+
+def time_decode(decode_func, text, iterations):
+    try:
+        decode_func(text)
+    except Exception:
+        return None
+
+    return timeit.timeit(lambda: decode_func(text),
+                         number=iterations) / iterations
+
+
+def benchmark_decode(args):
+    decoders = [("yaml", yaml.safe_load)]
+    if yaml.__with_libyaml__:
+        decoders.append(("libyaml", lambda text: yaml.load(
+            text, Loader=yaml.CSafeLoader)))
+    decoders.append(("json", json.loads))
+    template = Template()
+    decoders.append(("template", template._decode_to_dict))
+
+    header = "%-40s" % "file" + "".join(["%12s" % x[0] for x in decoders])
+    print(header)
+    print("-" * len(header))
+
+    for file_name, text in read_rendered_templates(args.template_path):
+        template.filename = file_name
+        line = "%-40s" % file_name
+        for name, decode_func in decoders:
+            seconds = time_decode(decode_func, text, args.iterations)
+            if seconds is None:
+                line += "%12s" % "n/a"
+            else:
+                line += "%10.1fus" % (seconds * 1000000)
+        print(line)
+
+
+def generate_template(size_name, variant):
+    attribute_count, depth = TEMPLATE_SIZES[size_name]
+    is_dynamic = variant.startswith("dynamic")
+    name = "Synthetic %s %s" % (size_name, variant)
+
+    variables = [{"name": "name", "type": "string"}]
+    if is_dynamic:
+        variables.append({"name": "is_enabled", "type": "boolean"})
+
+    actions = list()
+    level_actions = actions
+    for level in range(depth):
+        set_values = dict()
+        set_values["name"] = "{{ name }}" if level == 0 else "level_%d" % level
+        for index in range(attribute_count):
+            var_name = "attribute_%d_%d" % (level, index)
+            variable = {"name": var_name,
+                        "type": ATTRIBUTE_TYPES[index % len(ATTRIBUTE_TYPES)]}
+            if variable["type"] == "choice":
+                variable["choices"] = ["FIRST", "SECOND", "THIRD"]
+            elif variable["type"] == "integer":
+                variable["range"] = "0..1000000"
+            variables.append(variable)
+            set_values[var_name] = "{{ %s }}" % var_name
+
+        object_actions = [{"set-values": set_values}]
+        level_actions.append({"create-object": {"type": "Level%d" % level,
+                                                "actions": object_actions}})
+        level_actions = object_actions
+
+    template_dict = {"name": name,
+                     "description": "Synthetic %s template" % size_name,
+                     "template-version": "1.0",
+                     "software-type": "Nuage Networks VSD",
+                     "software-version": "5.0.2",
+                     "variables": variables,
+                     "actions": actions}
+
+    if variant.endswith("json"):
+        text = json.dumps(template_dict, indent=4)
+    else:
+        text = yaml.safe_dump(template_dict, default_flow_style=False)
+
+    # Placeholders were dumped as quoted strings, unquote them to make them
+    # substitutions
+    text = text.replace('"{{ ', '{{ ').replace(' }}"', ' }}')
+    text = text.replace("'{{ ", "{{ ").replace(" }}'", " }}")
+
+    if is_dynamic:
+        text = text.replace(
+            "name: {{ name }}",
+            "name: {{ name }}{% if is_enabled %}\n" +
+            " " * (text.index("name: {{ name }}") -
+                   text.rfind("\n", 0, text.index("name: {{ name }}")) - 1) +
+            "description: enabled{% endif %}")
+
+    return name, text
+
+
+def write_synthetic_templates(path):
+    templates = list()
+    for size_name in sorted(TEMPLATE_SIZES):
+        for variant in TEMPLATE_VARIANTS:
+            name, text = generate_template(size_name, variant)
+            extension = ".json" if variant.endswith("json") else ".yml"
+            file_name = name.lower().replace(" ", "_") + extension
+            with open(os.path.join(path, file_name), 'w') as file:
+                file.write(text)
+            templates.append({"name": name,
+                              "size": size_name,
+                              "variant": variant})
+
+    return templates
+
+
+def time_best(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.STDOUT).decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_template(store, template_info, records, repeat):
+    template = store.get_template(template_info["name"])
+    data_list = [generate_sample_data(template, index)
+                 for index in range(records)]
+
+    def validate():
+        for data in data_list:
+            template.validate_template_data(**data)
+
+    def parse():
+        for data in data_list:
+            template._parse_with_vars(**data)
+
+    def execute():
+        config = Configuration(store)
+        logger = Logger()
+        logger.set_to_stdout("OUTPUT", False)
+        config.set_logger(logger)
+        for data in data_list:
+            config.add_template_data(template_info["name"], **data)
+        config.apply(MockWriter())
+
+    result = dict(template_info)
+    result["records"] = records
+    result["validate_seconds"] = time_best(validate, repeat)
+    result["parse_seconds"] = time_best(parse, repeat)
+    result["execute_seconds"] = time_best(execute, repeat)
+
+    return result
+
+
+def benchmark_templates(args):
+    template_path = tempfile.mkdtemp(prefix="metroae_benchmark_")
+    try:
+        templates = write_synthetic_templates(template_path)
+
+        def read_templates():
+            TemplateStore().read_templates(template_path)
+
+        read_seconds = time_best(read_templates, args.repeat)
+
+        store = TemplateStore()
+        store.read_templates(template_path)
+        results = [benchmark_template(store, x, args.records, args.repeat)
+                   for x in templates]
+    finally:
+        shutil.rmtree(template_path)
+
+    report = {"commit": get_commit(),
+              "python_version": platform.python_version(),
+              "libyaml": yaml.__with_libyaml__,
+              "records": args.records,
+              "repeat": args.repeat,
+              "read_templates": {"templates": len(templates),
+                                 "seconds": read_seconds},
+              "templates": results}
+
+    report_text = json.dumps(report, indent=4, sort_keys=True)
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            file.write(report_text + "\n")
+    else:
+        print(report_text)
+
+
+def count_actions(root_action):
+    count = 0
+    actions = [root_action]
+    while len(actions) > 0:
+        action = actions.pop()
+        count += 1
+        actions.extend(action.children)
+
+    return count
+
+
+def measure_action_tree(store, template_info, records):
+    template = store.get_template(template_info["name"])
+    logger = logging.getLogger("metroae_benchmark")
+    logger.setLevel(logging.CRITICAL)
+    config = Configuration(store)
+    config.set_logger(logger)
+    for index in range(records):
+        config.add_template_data(template_info["name"],
+                                 **generate_sample_data(template, index))
+
+    # Only the memory still held by the tree after compiling is measured,
+    # the parsed template dicts are released as each record is read
+    gc.collect()
+    tracemalloc.start()
+    try:
+        config._compile_templates(False, False)
+        gc.collect()
+        tree_bytes = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    action_count = count_actions(config.root_action)
+
+    result = dict(template_info)
+    result["records"] = records
+    result["actions"] = action_count
+    result["bytes"] = tree_bytes
+    result["bytes_per_action"] = tree_bytes // action_count
+
+    return result
+
+
+def benchmark_memory(args):
+    if tracemalloc is None:
+        print("The memory benchmark requires tracemalloc (Python 3)")
+        exit(1)
+
+    template_path = tempfile.mkdtemp(prefix="metroae_benchmark_")
+    try:
+        templates = [x for x in write_synthetic_templates(template_path)
+                     if x["variant"] == "static-json"]
+        store = TemplateStore()
+        store.read_templates(template_path)
+        results = [measure_action_tree(store, x, args.records)
+                   for x in templates]
+    finally:
+        shutil.rmtree(template_path)
+
+    report = {"commit": get_commit(),
+              "python_version": platform.python_version(),
+              "records": args.records,
+              "templates": results}
+
+    report_text = json.dumps(report, indent=4, sort_keys=True)
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            file.write(report_text + "\n")
+    else:
+        print(report_text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
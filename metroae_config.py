@@ -13,7 +13,9 @@ from nuage_metroae_config.configuration import Configuration
 from nuage_metroae_config.document_template_md import DOCUMENT_README_MD
 from nuage_metroae_config.errors import MetroConfigError
 from nuage_metroae_config.es_reader import EsReader
+from nuage_metroae_config.journal import Journal
 from nuage_metroae_config.query import Query
+from nuage_metroae_config.run_report import RunReport
 from nuage_metroae_config.template import TemplateStore
 from nuage_metroae_config.user_data_parser import UserDataParser
 from nuage_metroae_config.vsd_writer import VsdWriter, SOFTWARE_TYPE
@@ -29,7 +31,9 @@ DEFAULT_VSD_PASSWORD = 'csproot'
 DEFAULT_VSD_ENTERPRISE = 'csp'
 DEFAULT_URL = 'https://127.0.0.1:8443'
 DEFAULT_LOG_LEVEL = 'DEBUG'
+DEFAULT_CALL_LATENCY = 0.1
 ENV_TEMPLATE = 'TEMPLATE_PATH'
+ENV_TEMPLATE_CACHE = 'TEMPLATE_CACHE'
 ENV_USER_DATA = 'USER_DATA_PATH'
 ENV_VSD_USERNAME = 'VSD_USERNAME'
 ENV_VSD_PASSWORD = 'VSD_PASSWORD'
@@ -65,6 +69,7 @@ EXCEL_DIR = "/metroae_data/excel"
 EXCEL_FILE_PREFIX = "user_data_form_"
 LOGS_DIR = "/metroae_data"
 LOG_LEVEL_STRS = ["OUTPUT", "ERROR", "INFO", "DEBUG", "API"]
+PLAN_ACTIONS = ["create", "update", "delete", "assign", "unassign", "no-op"]
 
 VERSION_OUTPUT = "MetroAE Config Engine version %s" % ENGINE_VERSION
 
@@ -190,6 +195,13 @@ def add_template_path_parser_argument(parser):
                         action='append', required=False,
                         default=None,
                         help='Path containing template files. Can also set using environment variable %s' % (ENV_TEMPLATE))
+    parser.add_argument('-tc', '--template_cache', dest='template_cache',
+                        action='store', required=False,
+                        default=os.getenv(ENV_TEMPLATE_CACHE, None),
+                        help='File to cache parsed templates in to speed up loading. Can also set using environment variable %s' % (ENV_TEMPLATE_CACHE))
+    parser.add_argument('-tj', '--template_processes', dest='template_processes',
+                        type=int, required=False, default=1,
+                        help='Number of processes used to parse the templates when they are not parsed on first use')
     parser.add_argument('--version', dest='version',
                         action='store_true', required=False,
                         help='Displays version information')
@@ -249,6 +261,37 @@ def add_parser_arguments(parser):
                         default=os.getenv(ENV_VSD_ENTERPRISE,
                                           DEFAULT_VSD_ENTERPRISE),
                         help='Enterprise for VSD. Can also set using environment variable %s' % (ENV_VSD_ENTERPRISE))
+    parser.add_argument('-wt', '--writer_threads', dest='writer_threads',
+                        type=int, required=False, default=1,
+                        help='Number of threads writing independent objects to VSD concurrently. Can not be used with --plan')
+    parser.add_argument('-pl', '--plan', dest='plan',
+                        action='store_true', required=False,
+                        help='Print the objects which would be created, updated or deleted on VSD without writing them')
+    parser.add_argument('-bf', '--bulk_fetch', dest='bulk_fetch',
+                        action='store_true', required=False,
+                        help='Fetch existing objects from VSD in bulk and only save objects with changed values')
+    parser.add_argument('-cd', '--cascade_delete', dest='cascade_delete',
+                        action='store_true', required=False,
+                        help='When reverting, do not delete children which VSD deletes along with their parent')
+    parser.add_argument('-jf', '--journal_file', dest='journal_file',
+                        action='store', required=False, default=None,
+                        help='Record the actions completed on VSD to the specified file')
+    parser.add_argument('-rs', '--resume', dest='resume',
+                        action='store_true', required=False,
+                        help='Resume a failed write, skipping the actions completed in the journal file')
+    parser.add_argument('-rp', '--run_report', dest='run_report',
+                        action='store', required=False, default=None,
+                        help='Write a JSON report of the time taken by each action and VSD API call to the specified file')
+    parser.add_argument('-st', '--streaming', dest='streaming',
+                        action='store_true', required=False,
+                        help='Build and write the configuration one independent partition at a time to limit memory use')
+    parser.add_argument('-ce', '--call_estimate', dest='call_estimate',
+                        action='store_true', required=False,
+                        help='Print an estimate of the VSD API calls and time taken to write the configuration when validating, or only the reads with --plan')
+    parser.add_argument('-cl', '--call_latency', dest='call_latency',
+                        type=float, required=False,
+                        default=DEFAULT_CALL_LATENCY,
+                        help='Seconds per VSD API call used for the estimated time. Default is %s' % (DEFAULT_CALL_LATENCY))
     parser.add_argument('-es', '--es_address', dest='es_address',
                         action='store', required=False,
                         default=os.getenv(ENV_ES_ADDRESS, None),
@@ -403,6 +446,8 @@ class MetroConfig(object):
         else:
             if self.action == VALIDATE_ACTION:
                 print(">>> All actions valid")
+            elif self.args.plan:
+                print(">>> Plan complete, no changes written")
             else:
                 print(">>> All actions successfully applied")
 
@@ -664,8 +709,19 @@ class MetroConfig(object):
         if self.get_software_version() is not None:
             self.writer.set_software_version(self.get_software_version())
 
+        self.writer.set_bulk_fetch(self.args.bulk_fetch)
+        self.writer.set_cascade_delete(self.args.cascade_delete)
+
     def setup_template_store(self):
         self.store = TemplateStore(ENGINE_VERSION)
+        if self.args.template_cache:
+            self.store.set_cache_file(self.args.template_cache)
+        self.store.set_process_count(self.args.template_processes)
+        if self.action in [CREATE_ACTION, UPDATE_ACTION, REVERT_ACTION]:
+            # Only the templates referenced by the user data need parsing.
+            # Validate parses all templates so that errors in any of them
+            # are reported.
+            self.store.set_lazy_parsing()
 
         if self.args.software_version is not None:
             self.device_version = {
@@ -717,6 +773,21 @@ class MetroConfig(object):
         config.set_software_version(self.get_software_type(),
                                     self.get_software_version())
         config.set_logger(self.logger)
+        config.set_thread_count(self.args.writer_threads)
+        if self.args.resume and self.args.journal_file is None:
+            raise Exception("A journal file (-jf) is required to resume")
+        if (self.args.streaming and self.args.journal_file is not None and
+                not self.args.plan):
+            raise Exception("A journal file (-jf) can not be used when streaming (-st)")
+        if self.args.plan and self.args.writer_threads > 1:
+            # Plan entries would be listed in the order threads finish
+            raise Exception("Plan mode (-pl) can not be used with more than one writer thread (-wt)")
+        config.set_streaming(self.args.streaming)
+        if self.args.journal_file is not None and not self.args.plan:
+            config.set_journal(Journal(self.args.journal_file,
+                                       resume=self.args.resume))
+        if self.args.run_report is not None:
+            config.set_run_report(RunReport(self.args.run_report))
         for data in self.template_data:
             template_name = data[0]
             template_data = data[1]
@@ -727,6 +798,9 @@ class MetroConfig(object):
         else:
             validate_actions = [True, False]
 
+        # Also set when validating so that the call estimate only counts
+        # the reads of a plan
+        self.writer.set_plan_only(self.args.plan)
         for validate_only in validate_actions:
             self.writer.set_validate_only(validate_only)
             if self.action == REVERT_ACTION:
@@ -738,9 +812,51 @@ class MetroConfig(object):
 
             self.writer.set_validate_only(False)
 
-            if self.action == VALIDATE_ACTION:
+            if validate_only and self.args.call_estimate:
+                self.print_call_estimate(self.writer.get_call_estimate(),
+                                         self.args.call_latency)
+
+            if (self.action == VALIDATE_ACTION and
+                    config.root_action is not None):
+                # There is no tree to print when streaming
                 print(str(config.root_action))
 
+        self.writer.set_plan_only(False)
+        if self.args.plan and self.action != VALIDATE_ACTION:
+            self.print_plan(self.writer.get_plan())
+
+    def print_plan(self, plan):
+        counts = dict([(x, 0) for x in PLAN_ACTIONS])
+        print("")
+        print("Plan")
+        print("----")
+        for entry in plan:
+            counts[entry["action"]] += 1
+            if entry["action"] == "no-op":
+                continue
+
+            line = "%s %s" % (entry["action"], entry["object"])
+            if entry["parent"] is not None:
+                line += " in %s" % entry["parent"]
+            print(line)
+            for name in sorted(entry["attributes"]):
+                print("    %s = %s" % (name, repr(entry["attributes"][name])))
+
+        print(", ".join(["%d %s" % (counts[x], x) for x in PLAN_ACTIONS]))
+
+    def print_call_estimate(self, estimate, latency):
+        total = 0
+        print("")
+        print("API call estimate")
+        print("-----------------")
+        for entry in estimate:
+            total += entry["count"]
+            print("%s %s: %d" % (entry["method"], entry["object"],
+                                 entry["count"]))
+
+        print("%d calls, about %.1f seconds at %s seconds per call" % (
+            total, total * latency, latency))
+
     def perform_query(self):
         query = Query()
         query.set_logger(self.logger)
@@ -4,9 +4,11 @@ from .errors import (ConflictError,
                      MetroConfigError,
                      TemplateActionError,
                      TemplateParseError)
-from .logger import Logger
+from .logger import Logger, is_log_enabled
 from .util import get_dict_field_no_case
 import base64
+import collections
+from six.moves import intern
 
 DEFAULT_SELECTION_FIELD = "name"
 FIRST_SELECTOR = "$first"
@@ -16,12 +18,35 @@ CHILD_SELECTOR = "$child"
 RETRIEVE_VALUE_SELECTOR = "$retrieve-value"
 DEPENDENCY_ONLY = "$dependency-only"
 
+# Number of siblings selecting objects of the same type by the same field
+# from which the writer is asked to coalesce the selects
+COALESCE_SELECT_COUNT = 10
+
+# Shared by all actions without children or marks, which are most of them in
+# large configurations
+NO_CHILDREN = ()
+NO_MARKS = frozenset()
+
+
+def intern_name(name):
+    """
+    Returns the name as a string shared by all actions using the same name.
+    """
+    try:
+        return intern(name)
+    except TypeError:
+        return name
+
 
 class Action(object):
     """
     Private class to track and perform the actions required to write the
     configuration to the device
     """
+    __slots__ = ("parent", "state", "disable_combine", "children",
+                 "child_index", "child_positions", "store_marks",
+                 "retrieve_marks", "template_name", "order", "level", "log")
+
     def __init__(self, parent, state=None):
         self.parent = parent
         if state is None:
@@ -31,9 +56,13 @@ class Action(object):
 
         self.disable_combine = False
 
-        self.children = list()
-        self.store_marks = set()
-        self.retrieve_marks = set()
+        self.children = NO_CHILDREN
+        # Index of children by the keys which may identify them as the same
+        # object as a new action, see add_child_action_sorted
+        self.child_index = None
+        self.child_positions = None
+        self.store_marks = NO_MARKS
+        self.retrieve_marks = NO_MARKS
         self.template_name = None
         self.order = 0
         if parent is None:
@@ -45,17 +74,18 @@ class Action(object):
             self.log = parent.log
 
     def __str__(self):
-        return self._to_string_with_children()
-
-    def _to_string_with_children(self):
-        cur_output = self._to_string(self.level)
-
-        cur_output += "\n"
-
-        for child in self.children:
-            cur_output += child._to_string_with_children()
-
-        return cur_output
+        return "".join(self.iter_string_lines())
+
+    def iter_string_lines(self):
+        """
+        Yields the lines describing this action and all of its children,
+        each ending with a newline.
+        """
+        actions = [self]
+        while len(actions) > 0:
+            action = actions.pop()
+            yield action._to_string(action.level) + "\n"
+            actions.extend(reversed(action.children))
 
     def _to_string(self, indent_level):
         if self.level == 0:
@@ -134,40 +164,123 @@ class Action(object):
     def set_store_only(self, store_only=True):
         self.state['is_store_only'] = store_only
 
+    def reset_execution(self):
+        """
+        Clears the values stored by a previous execution so that the tree can
+        be executed again.
+        """
+        self.set_store_only(False)
+        self.state.pop('revert_contexts', None)
+        actions = [self]
+        while len(actions) > 0:
+            action = actions.pop()
+            if isinstance(action, StoreValueAction):
+                action.stored_value = None
+            actions.extend(action.children)
+
+    def set_executor(self, executor):
+        self.state['executor'] = executor
+
     def set_template_name(self, name):
         self.template_name = name
 
     def execute(self, writer, context=None):
         if self.is_revert():
+            # Objects selected while gathering the stored values are reused
+            # when reverting instead of being selected again
+            self.state['revert_contexts'] = dict()
             self.log.debug("Gather store values before revert")
             self.set_store_only()
             self.execute_children(writer, context=None)
             self.log.debug("Perform revert")
             self.set_store_only(False)
 
-        self.execute_children(writer, context=None)
+        try:
+            self.execute_children(writer, context=None)
+        finally:
+            self.state.pop('revert_contexts', None)
 
     def execute_children(self, writer, context=None):
-        if self.is_revert() is True:
-            if self.is_store_only():
-                ordered_list = self.children
-            else:
-                ordered_list = reversed(self.children)
-
-            for child in ordered_list:
+        self.coalesce_selects(writer, context)
+        executor = self.get_executor()
+        if executor is not None and len(self.children) > 1:
+            executor.execute_children(self, writer, context)
+        elif self.is_revert() is True:
+            for child in self.get_ordered_children(writer):
                 try:
-                    child.execute(writer, context)
+                    self.execute_child(child, writer, context)
                 except MetroConfigError as e:
                     e.reraise_with_location(child._get_location())
         else:
+            is_output = (not writer.is_validate_only() and
+                         is_log_enabled(self.log, "OUTPUT"))
             for child in self.children:
-                if not writer.is_validate_only():
+                if is_output:
                     child.log.output(child._to_string(child.level))
                 try:
-                    child.execute(writer, context)
+                    self.execute_child(child, writer, context)
                 except MetroConfigError as e:
                     e.reraise_with_location(child._get_location())
 
+    def coalesce_selects(self, writer, context=None):
+        if len(self.children) < COALESCE_SELECT_COUNT:
+            return
+
+        select_counts = collections.OrderedDict()
+        for child in self.children:
+            key = child.get_coalesce_key()
+            if key is not None:
+                if key not in select_counts:
+                    select_counts[key] = [child, 0]
+                select_counts[key][1] += 1
+
+        for first_child, count in select_counts.values():
+            if count >= COALESCE_SELECT_COUNT:
+                writer.coalesce_selects(first_child.object_type,
+                                        first_child.field, context)
+
+    def get_coalesce_key(self):
+        """
+        Returns a key shared by the sibling selects which can be answered
+        from one list of objects fetched by the writer.  Returns None if
+        this action does not select by a field value.
+        """
+        return None
+
+    def execute_child(self, child, writer, context=None):
+        journal = self.get_journal()
+        if journal is None or self.is_store_only():
+            self._execute_child_action(child, writer, context)
+        elif journal.is_complete(child):
+            self.log.debug(child._get_location("Completed before resume "))
+        else:
+            self._execute_child_action(child, writer, context)
+            journal.record_complete(child, writer, context)
+
+    def _execute_child_action(self, child, writer, context):
+        run_report = self.get_run_report()
+        if run_report is None:
+            child.execute(writer, context)
+        else:
+            run_report.execute(child, writer, context)
+
+    def get_ordered_children(self, writer):
+        if self.is_revert() is True:
+            # Children deleted by cascade are only visited to gather the
+            # values they store
+            if self.is_store_only():
+                return [x for x in self.children
+                        if len(x.store_marks) > 0 or
+                        not self.is_deleted_by_cascade(x, writer)]
+            else:
+                return [x for x in reversed(self.children)
+                        if not self.is_deleted_by_cascade(x, writer)]
+        else:
+            return self.children
+
+    def is_deleted_by_cascade(self, child, writer):
+        return False
+
     def is_set_values(self):
         return False
 
@@ -186,6 +299,32 @@ class Action(object):
     def is_same_object(self, other_action):
         return False
 
+    def get_merge_keys(self):
+        """
+        Returns the keys under which this action is indexed as a child so
+        that new actions for the same object can find it.  Returns None if
+        the action may be the same object as any other action.
+        """
+        return list()
+
+    def get_merge_probes(self):
+        """
+        Returns the keys to look up in the child index to find children
+        which may be the same object as this action.  Returns None if all
+        children must be checked.
+        """
+        return list()
+
+    def get_merge_index_keys(self):
+        """
+        Returns the merge keys and merge probes of this action as used in
+        the child index.  An action can only be combined with another action
+        if one of its probes is a key of the other action.  Either is None
+        if the action may be combined with any other action.
+        """
+        return (Action._get_index_keys(self.get_merge_keys()),
+                Action._get_index_keys(self.get_merge_probes()))
+
     def get_child_value(self, field):
         if len(self.children) > 0 and self.children[0].is_set_values():
             return self.children[0].get_value(field)
@@ -202,6 +341,44 @@ class Action(object):
         return ('is_store_only' in self.state and
                 self.state['is_store_only'] is True)
 
+    def get_executor(self):
+        return self.state.get('executor')
+
+    def set_journal(self, journal):
+        self.state['journal'] = journal
+
+    def get_journal(self):
+        return self.state.get('journal')
+
+    def set_run_report(self, run_report):
+        self.state['run_report'] = run_report
+
+    def get_run_report(self):
+        return self.state.get('run_report')
+
+    def select_for_revert(self, select_function, *args):
+        """
+        Returns the context selected by calling select_function with args.
+        During a revert, the context or the MissingSelectionError from the
+        first selection is reused when the action is executed again.
+        """
+        revert_contexts = self.state.get('revert_contexts')
+        if revert_contexts is None:
+            return select_function(*args)
+
+        if id(self) not in revert_contexts:
+            try:
+                revert_contexts[id(self)] = select_function(*args)
+            except MissingSelectionError as e:
+                revert_contexts[id(self)] = e
+                raise
+
+        new_context = revert_contexts[id(self)]
+        if isinstance(new_context, MissingSelectionError):
+            raise MissingSelectionError(str(new_context))
+
+        return new_context
+
     def read_children_actions(self, current_dict):
         child_actions = Action.get_dict_field(current_dict, 'actions')
         if child_actions is None:
@@ -215,6 +392,9 @@ class Action(object):
             self.add_child_action_sorted(new_action)
 
     def add_child_action_sorted(self, new_action):
+        if self.children is NO_CHILDREN:
+            self.children = list()
+
         try:
             if len(self.children) > 0 and new_action.is_set_values():
                 # A single set values action must always be at position 0
@@ -231,40 +411,180 @@ class Action(object):
                                                    match_indicies[1:])
                 else:
                     self.children.append(new_action)
+                    self._set_child_position(new_action,
+                                             len(self.children) - 1)
+                    self._add_to_child_index(new_action)
 
         except MetroConfigError as e:
+            # Children may have been partially combined, index them again
+            self.child_index = None
+            self.child_positions = None
             e.reraise_with_location(new_action._get_location())
 
     def find_same_object_indicies_in_children(self, new_action):
         indicies = []
-        for i, child in enumerate(self.children):
+        for child in self._find_merge_candidates(new_action):
             if (child.is_same_object(new_action) or
                     new_action.is_same_object(child)):
-                indicies.append(i)
+                index = self._get_child_position(child)
+                if index is not None:
+                    indicies.append(index)
+
+        indicies.sort()
         return indicies
 
     def combine_same_objects(self, existing_index, combine_action):
+        existing_action = self.children[existing_index]
+        self._remove_from_child_index(existing_action)
         if combine_action.is_create():
-            combine_action.combine(self.children[existing_index])
+            combine_action.combine(existing_action)
             self.children[existing_index] = combine_action
+            self._set_child_position(combine_action, existing_index)
+            self._add_to_child_index(combine_action)
         else:
-            self.children[existing_index].combine(combine_action)
+            existing_action.combine(combine_action)
+            self._add_to_child_index(existing_action)
 
     def combine_children_indicies(self, first_index, remaining_indicies):
         for remaining_index in remaining_indicies:
             self.combine_same_objects(first_index,
                                       self.children[remaining_index])
+        first_action = self.children[first_index]
         for remaining_index in reversed(remaining_indicies):
+            if self.children[remaining_index] is not first_action:
+                self._remove_from_child_index(self.children[remaining_index])
             del self.children[remaining_index]
+        if len(remaining_indicies) > 0:
+            self.child_positions = None
+
+    def _find_merge_candidates(self, new_action):
+        probes = Action._get_index_keys(new_action.get_merge_probes())
+        if probes is None or self.child_index is None:
+            # Without an index all children need to be checked
+            return list(self.children)
+
+        candidates = dict(self.child_index["unindexed"])
+        keyed_children = self.child_index["keyed"]
+        for probe in probes:
+            for child in keyed_children.get(probe, []):
+                candidates[id(child)] = child
+
+        return list(candidates.values())
+
+    def _add_to_child_index(self, child):
+        if self.child_index is None:
+            self._build_child_index()
+            return
+
+        self._remove_from_child_index(child)
+        keys = Action._get_index_keys(child.get_merge_keys())
+        self.child_index["child_keys"][id(child)] = keys
+        if keys is None:
+            self.child_index["unindexed"][id(child)] = child
+        else:
+            keyed_children = self.child_index["keyed"]
+            for key in set(keys):
+                if key not in keyed_children:
+                    keyed_children[key] = list()
+                keyed_children[key].append(child)
+
+    def _remove_from_child_index(self, child):
+        if self.child_index is None:
+            return
+
+        keys = self.child_index["child_keys"].pop(id(child), [])
+        if keys is None:
+            del self.child_index["unindexed"][id(child)]
+        else:
+            keyed_children = self.child_index["keyed"]
+            for key in set(keys):
+                keyed_children[key] = [x for x in keyed_children[key]
+                                       if x is not child]
+                if len(keyed_children[key]) == 0:
+                    del keyed_children[key]
+
+    def _build_child_index(self):
+        self.child_index = {"keyed": dict(),
+                            "unindexed": dict(),
+                            "child_keys": dict()}
+        for child in self.children:
+            self._add_to_child_index(child)
+
+    def _get_child_position(self, child):
+        if self.child_positions is not None:
+            index = self.child_positions.get(id(child))
+            if (index is not None and index < len(self.children) and
+                    self.children[index] is child):
+                return index
+
+        # Children were inserted, removed or reordered, find them again
+        self.child_positions = dict()
+        for index, existing_child in enumerate(self.children):
+            self.child_positions[id(existing_child)] = index
+
+        return self.child_positions.get(id(child))
+
+    def _set_child_position(self, child, index):
+        if self.child_positions is not None:
+            self.child_positions[id(child)] = index
+
+    def _get_attribute_keys(self, key_type):
+        if len(self.children) == 0 or not self.children[0].is_set_values():
+            return []
+
+        object_type = self.object_type.lower()
+        return [(key_type, object_type, str(field).lower(), value)
+                for field, value in self.children[0].attributes.items()]
+
+    @staticmethod
+    def _get_index_keys(keys):
+        if keys is None:
+            return None
+
+        index_keys = list()
+        for key in keys:
+            try:
+                hash(key)
+            except TypeError:
+                try:
+                    key = Action._get_index_value(key)
+                except TypeError:
+                    # Values which can not be hashed are never indexed
+                    return None
+            index_keys.append(key)
+
+        return index_keys
+
+    @staticmethod
+    def _get_index_value(value):
+        # Equal values must give equal index values
+        if type(value) == list or type(value) == tuple:
+            return tuple([Action._get_index_value(x) for x in value])
+        if type(value) == dict:
+            return frozenset([(Action._get_index_value(k),
+                               Action._get_index_value(v))
+                              for k, v in value.items()])
+        hash(value)
+        return value
 
     def mark_ancestors_for_reorder(self, mark, is_store):
         if self.parent is not None:
-            if is_store is True:
-                self.parent.store_marks.add(mark)
-            else:
-                self.parent.retrieve_marks.add(mark)
+            self.parent.add_marks([mark], is_store)
             self.parent.mark_ancestors_for_reorder(mark, is_store)
 
+    def add_marks(self, marks, is_store):
+        if len(marks) == 0:
+            return
+
+        if is_store is True:
+            if self.store_marks is NO_MARKS:
+                self.store_marks = set()
+            self.store_marks.update(marks)
+        else:
+            if self.retrieve_marks is NO_MARKS:
+                self.retrieve_marks = set()
+            self.retrieve_marks.update(marks)
+
     def reorder(self):
         self.reorder_orders()
         self.reorder_retrieve()
@@ -283,53 +603,93 @@ class Action(object):
             self.children.extend(sort_dict[order])
 
     def reorder_retrieve(self):
-        complete = False
-
-        for i in range(len(self.retrieve_marks)):
-            if not complete:
-                complete = True
-                for mark in self.retrieve_marks:
-                    if self.reorder_children(mark):
-                        complete = False
+        # The index for combining children is only needed while reading
+        self.child_index = None
+        self.child_positions = None
+        if len(self.retrieve_marks) > 0 and len(self.children) > 1:
+            self.children = self.sort_children_by_dependencies()
 
         for child in self.children:
             child.reorder_retrieve()
 
-    def reorder_children(self, mark):
-        store_indicies = self.find_marked_indicies_in_children(
-            mark, is_store=True)
-        retrieve_indicies = self.find_marked_indicies_in_children(
-            mark, is_store=False)
+    def sort_children_by_dependencies(self):
+        """
+        Returns the children sorted so that children storing values come
+        before the children retrieving them.  Children which store values
+        are moved just before the first child which needs them, otherwise
+        the order is unchanged.  Raises TemplateActionError for circular
+        dependencies.
+        """
+        storing_children = dict()
+        for child in self.children:
+            for mark in child.store_marks:
+                if mark not in storing_children:
+                    storing_children[mark] = list()
+                storing_children[mark].append(child)
+
+        positions = dict()
+        for index, child in enumerate(self.children):
+            positions[id(child)] = index
+
+        sorted_children = list()
+        visited = dict()
+        for first_child in self.children:
+            if id(first_child) in visited:
+                continue
+
+            # Depth first through the dependencies without recursion.  Each
+            # entry is the child, its dependencies as (child, mark) and the
+            # mark which led to the child.
+            visited[id(first_child)] = False
+            stack = [(first_child,
+                      self._get_dependencies(first_child, storing_children,
+                                             positions),
+                      None)]
+            while len(stack) > 0:
+                child, dependencies, _ = stack[-1]
+                if len(dependencies) > 0:
+                    dependency, mark = dependencies.pop()
+                    if id(dependency) not in visited:
+                        visited[id(dependency)] = False
+                        stack.append((dependency,
+                                      self._get_dependencies(
+                                          dependency, storing_children,
+                                          positions),
+                                      mark))
+                    elif visited[id(dependency)] is False:
+                        self._raise_dependency_cycle(stack, dependency, mark)
+                else:
+                    stack.pop()
+                    visited[id(child)] = True
+                    sorted_children.append(child)
 
-        did_move = False
+        return sorted_children
 
-        if len(store_indicies) > 0 and len(retrieve_indicies) > 0:
-            first_retrieve_index = retrieve_indicies[0]
+    def _get_dependencies(self, child, storing_children, positions):
+        dependencies = list()
+        for mark in child.retrieve_marks:
+            for storing_child in storing_children.get(mark, []):
+                if storing_child is not child:
+                    dependencies.append((storing_child, mark))
 
-            # Move store actions just before first receive
-            for store_index in store_indicies:
-                if store_index > first_retrieve_index:
-                    store_action = self.children[store_index]
-                    del self.children[store_index]
-                    self.children.insert(first_retrieve_index, store_action)
-                    did_move = True
+        # Reversed so that the first dependency is popped first
+        dependencies.sort(key=lambda x: positions[id(x[0])], reverse=True)
+        return dependencies
 
-        return did_move
+    def _raise_dependency_cycle(self, stack, dependency, mark):
+        names = set([str(mark.as_name)])
+        for index in range(len(stack) - 1, 0, -1):
+            if stack[index][0] is dependency:
+                break
+            names.add(str(stack[index][2].as_name))
 
-    def find_marked_indicies_in_children(self, mark, is_store):
-        indicies = []
-        for i, child in enumerate(self.children):
-            if is_store is True:
-                if mark in child.store_marks:
-                    indicies.append(i)
-            else:
-                if mark in child.retrieve_marks:
-                    indicies.append(i)
-
-        return indicies
+        raise TemplateActionError(
+            "Circular dependency between stored values: %s" %
+            ", ".join(sorted(names)))
 
 
 class CreateObjectAction(Action):
+    __slots__ = ("object_type", "select_by_field", "is_updatable")
 
     def __init__(self, parent, state):
         super(CreateObjectAction, self).__init__(parent, state)
@@ -341,14 +701,15 @@ class CreateObjectAction(Action):
         return True
 
     def read(self, create_dict):
-        self.object_type = Action.get_dict_field(create_dict, 'type')
+        self.object_type = intern_name(Action.get_dict_field(create_dict,
+                                                             'type'))
         if self.object_type is None:
             raise TemplateParseError(
                 "Create object action missing required 'type' field")
 
         field = Action.get_dict_field(create_dict, 'select-by-field')
         if field is not None:
-            self.select_by_field = field
+            self.select_by_field = intern_name(field)
 
         updatable = Action.get_dict_field(create_dict, 'update-supported')
         if updatable is not None:
@@ -360,7 +721,16 @@ class CreateObjectAction(Action):
 
     def execute(self, writer, context=None):
         if self.is_revert() is False:
-            if not self.is_update():
+            journal = self.get_journal()
+            object_id = None
+            if journal is not None:
+                object_id = journal.get_object_id(self)
+
+            if object_id is not None:
+                # Written before resuming, only some children remain
+                new_context = writer.select_object(self.object_type, "id",
+                                                   object_id, context)
+            elif not self.is_update():
                 new_context = writer.create_object(self.object_type, context)
             else:
                 if self.select_by_field.lower() in [FIRST_SELECTOR,
@@ -412,10 +782,11 @@ class CreateObjectAction(Action):
                             return
                         select_value = select_value.get_stored_value()
 
-                    new_context = writer.select_object(self.object_type,
-                                                       self.select_by_field,
-                                                       select_value,
-                                                       context)
+                    new_context = self.select_for_revert(writer.select_object,
+                                                         self.object_type,
+                                                         self.select_by_field,
+                                                         select_value,
+                                                         context)
 
                 # Always delete children first
                 self.execute_children(writer, new_context)
@@ -429,6 +800,12 @@ class CreateObjectAction(Action):
                 # Skip deletion if object is not present (not created)
                 self.log.debug("Selection failed for revert")
 
+    def is_deleted_by_cascade(self, child, writer):
+        # Children removed by the device when this object is deleted need
+        # not be selected and deleted first
+        return ((child.is_create() or child.is_select()) and
+                writer.is_cascade_delete(self.object_type, child.object_type))
+
     def get_select_value(self):
         return self.get_child_value(self.select_by_field.lower())
 
@@ -462,6 +839,30 @@ class CreateObjectAction(Action):
         this_value = self.get_select_value()
         return this_value is not None and this_value == other_value
 
+    def get_merge_keys(self):
+        keys = [("selector", self._get_selector_key())]
+        keys.extend(self._get_attribute_keys("attribute"))
+        select_value = self.get_select_value()
+        if select_value is not None:
+            keys.append(("field", self.object_type.lower(),
+                         self.select_by_field.lower(), select_value))
+
+        return keys
+
+    def get_merge_probes(self):
+        keys = [("selector", self._get_selector_key())]
+        keys.extend(self._get_attribute_keys("field"))
+        select_value = self.get_select_value()
+        if select_value is not None:
+            keys.append(("attribute", self.object_type.lower(),
+                         self.select_by_field.lower(), select_value))
+
+        return keys
+
+    def _get_selector_key(self):
+        selector = self.get_object_selector()
+        return (selector['type'], selector['field'], selector['value'])
+
     def combine(self, other_action):
         if other_action.is_create():
             select_value = self.get_select_value()
@@ -469,8 +870,8 @@ class CreateObjectAction(Action):
                                 (self.object_type, self.select_by_field,
                                  str(select_value)))
 
-        self.store_marks.update(other_action.store_marks)
-        self.retrieve_marks.update(other_action.retrieve_marks)
+        self.add_marks(other_action.store_marks, is_store=True)
+        self.add_marks(other_action.retrieve_marks, is_store=False)
 
         for child in other_action.children:
             child.parent = self
@@ -483,6 +884,8 @@ class CreateObjectAction(Action):
 
 
 class SelectObjectAction(Action):
+    __slots__ = ("object_type", "field", "value", "is_child_find",
+                 "is_updatable")
 
     def __init__(self, parent, state):
         super(SelectObjectAction, self).__init__(parent, state)
@@ -496,12 +899,14 @@ class SelectObjectAction(Action):
         return True
 
     def read(self, select_dict):
-        self.object_type = Action.get_dict_field(select_dict, 'type')
+        self.object_type = intern_name(Action.get_dict_field(select_dict,
+                                                             'type'))
         if self.object_type is None:
             raise TemplateParseError(
                 "Select object action missing required 'type' field")
 
-        self.field = Action.get_dict_field(select_dict, 'by-field')
+        self.field = intern_name(Action.get_dict_field(select_dict,
+                                                       'by-field'))
         if self.field is None:
             raise TemplateParseError(
                 "Select object action missing required 'by-field' field")
@@ -543,36 +948,74 @@ class SelectObjectAction(Action):
 
     def execute(self, writer, context=None):
         try:
-            if type(self.field) == list:
+            if (self.is_child_find is True or (type(self.field) != list and
+                                               self.field.lower() ==
+                                               POSITION_SELECTOR)):
+                # The finds made on each candidate of a $child search and
+                # positions are not reused as they depend on the context and
+                # the objects deleted.  The object found by a $child search
+                # still exists, so it is reused like any other selection.
+                new_context = self.select(writer, context)
+            else:
+                new_context = self.select_for_revert(self.select, writer,
+                                                     context)
 
-                new_context = self.select_multiple(writer, context)
+            if self.is_child_find is not True:
+                self.execute_children(writer, new_context)
 
-            elif self.field.lower() == POSITION_SELECTOR:
+        except MissingSelectionError as e:
+            if self.is_revert() is not True or self.is_child_find is True:
+                raise e
 
-                new_context = self.select_by_position(writer, context)
+    def get_coalesce_key(self):
+        if self.is_child_find is True:
+            return None
 
-            elif self.field.lower() == CHILD_SELECTOR:
+        if type(self.field) == list:
+            return (self.object_type.lower(),
+                    tuple(sorted([x.lower() for x in self.field])))
 
-                new_context = self.select_child(writer, context)
+        if self.field.startswith("$"):
+            return None
 
-            elif self.field.lower() == RETRIEVE_VALUE_SELECTOR:
+        return (self.object_type.lower(), self.field.lower())
 
-                new_context = self.select_retrieve_value(writer, context)
+    def select(self, writer, context):
+        if type(self.field) == list:
 
-            else:
-                new_context = writer.select_object(self.object_type,
-                                                   self.field,
-                                                   self.value,
-                                                   context)
-            if self.is_child_find is not True:
-                self.execute_children(writer, new_context)
+            new_context = self.select_multiple(writer, context)
 
-        except MissingSelectionError as e:
-            if self.is_revert() is not True or self.is_child_find is True:
-                raise e
+        elif self.field.lower() == POSITION_SELECTOR:
+
+            new_context = self.select_by_position(writer, context)
+
+        elif self.field.lower() == CHILD_SELECTOR:
+
+            new_context = self.select_child(writer, context)
+
+        elif self.field.lower() == RETRIEVE_VALUE_SELECTOR:
+
+            new_context = self.select_retrieve_value(writer, context)
+
+        else:
+            new_context = writer.select_object(self.object_type,
+                                               self.field,
+                                               self.value,
+                                               context)
+
+        return new_context
 
     def select_multiple(self, writer, context):
 
+        # The writer may compare the values without a call for each field of
+        # each object
+        new_context = writer.select_object_by_fields(self.object_type,
+                                                     self.field,
+                                                     self.value,
+                                                     context)
+        if new_context is not None:
+            return new_context
+
         context_list = writer.get_object_list(self.object_type,
                                               context)
         self.log.debug("Searching for multiple criteria %s = %s" %
@@ -615,6 +1058,13 @@ class SelectObjectAction(Action):
     def select_child(self, writer, context):
 
         child_select = self.get_child_selector(self.value.lower())
+        if (type(child_select.field) != list and
+                child_select.get_coalesce_key() is not None):
+            new_context = self.select_child_in_bulk(writer, context,
+                                                    child_select)
+            if new_context is not None:
+                return new_context
+
         child_select.is_child_find = True
         context_list = writer.get_object_list(self.object_type,
                                               context)
@@ -641,6 +1091,34 @@ class SelectObjectAction(Action):
 
         return new_context
 
+    def select_child_in_bulk(self, writer, context, child_select):
+        # The children of all of the objects are found by the writer at once
+        # instead of searching each object in turn
+        matches = writer.get_object_list_by_child(self.object_type,
+                                                  child_select.object_type,
+                                                  child_select.field,
+                                                  child_select.value,
+                                                  context)
+        if matches is None:
+            return None
+
+        if len(matches) == 0:
+            raise MissingSelectionError(
+                "Could not find matching child selection " +
+                str(child_select).strip())
+
+        # The first object with a matching child is selected as when
+        # searching each object in turn
+        new_context, child_count = matches[0]
+        if child_count > 1:
+            raise MultipleSelectionError(
+                "Multiple %s objects exist with %s = %s" %
+                (child_select.object_type, child_select.field,
+                 child_select.value))
+
+        self.log.debug("Found " + str(new_context))
+        return new_context
+
     def select_retrieve_value(self, writer, context):
 
         selector = self.get_child_value(self.value.lower())
@@ -707,9 +1185,41 @@ class SelectObjectAction(Action):
         return match or (other_selector['field'] == this_selector["field"] and
                          other_selector['value'] == this_selector["value"])
 
+    def get_merge_keys(self):
+        return self._get_merge_keys("attribute", "field")
+
+    def get_merge_probes(self):
+        return self._get_merge_keys("field", "attribute")
+
+    def _get_merge_keys(self, attribute_key_type, field_key_type):
+        if self.disable_combine is True:
+            return list()
+
+        if type(self.field) == list:
+            fields = self.field
+            values = self.value
+        else:
+            fields = [self.field]
+            values = [self.value]
+
+        # Selections which can match objects without the selected fields
+        # can not be indexed
+        if (len(fields) == 0 or None in values or
+                [x for x in fields if not isinstance(x, str)]):
+            return None
+
+        selector = self.get_object_selector()
+        keys = [("selector", (selector['type'], selector['field'],
+                              selector['value']))]
+        keys.extend(self._get_attribute_keys(attribute_key_type))
+        keys.append((field_key_type, self.object_type.lower(),
+                     fields[0].lower(), values[0]))
+
+        return keys
+
     def combine(self, other_action):
-        self.store_marks.update(other_action.store_marks)
-        self.retrieve_marks.update(other_action.retrieve_marks)
+        self.add_marks(other_action.store_marks, is_store=True)
+        self.add_marks(other_action.retrieve_marks, is_store=False)
 
         for child in other_action.children:
             child.parent = self
@@ -743,6 +1253,7 @@ class SelectObjectAction(Action):
 
 
 class SetValuesAction(Action):
+    __slots__ = ("attributes", "as_list")
 
     def __init__(self, parent, state):
         super(SetValuesAction, self).__init__(parent, state)
@@ -775,7 +1286,7 @@ class SetValuesAction(Action):
                                      str(value).strip(),
                                      str(existing_value).strip()))
 
-            self.attributes[field] = value
+            self.attributes[intern_name(field)] = value
 
     def append_list_attribute(self, field, value):
         if value is not None:
@@ -790,7 +1301,7 @@ class SetValuesAction(Action):
                                          str(value).strip(),
                                          str(existing_value).strip()))
             else:
-                self.attributes[field] = list()
+                self.attributes[intern_name(field)] = list()
 
             if type(value) == list:
                 self.attributes[field].extend(value)
@@ -877,10 +1388,12 @@ class SetValuesAction(Action):
                 attributes_copy[obj_name][param] = resolved_value
             elif key.lower().startswith(DEPENDENCY_ONLY):
                 pass
+            elif type(resolved_value) is dict:
+                # Copied as params may be set in it from other fields
+                if key not in attributes_copy:
+                    attributes_copy[key] = dict(resolved_value)
             else:
-                if (type(resolved_value) is not dict or
-                        key not in attributes_copy):
-                    attributes_copy[key] = resolved_value
+                attributes_copy[key] = resolved_value
 
         return attributes_copy
 
@@ -888,7 +1401,7 @@ class SetValuesAction(Action):
         return Action.get_dict_field(self.attributes, field.lower())
 
     def _to_string(self, indent_level):
-        cur_output = ""
+        lines = list()
         indent = Action._indent(indent_level)
 
         for field, value in self.attributes.items():
@@ -906,9 +1419,9 @@ class SetValuesAction(Action):
                     ["retrieve %s" %
                      x._get_reference_string() for x in value]) + "]"
 
-            cur_output += "%s%s = %s\n" % (indent, str(field), str(value))
+            lines.append("%s%s = %s" % (indent, str(field), str(value)))
 
-        return cur_output.rstrip()
+        return "\n".join(lines).rstrip()
 
     def _get_location(self, prefix="In "):
         location = prefix + "[set values]"
@@ -919,6 +1432,7 @@ class SetValuesAction(Action):
 
 
 class StoreValueAction(Action):
+    __slots__ = ("as_name", "from_field", "stored_value")
 
     def __init__(self, parent, state):
         super(StoreValueAction, self).__init__(parent, state)
@@ -983,6 +1497,7 @@ class StoreValueAction(Action):
 
 
 class RetrieveValueAction(SetValuesAction):
+    __slots__ = ("from_name", "to_field")
 
     def __init__(self, parent, state):
         super(RetrieveValueAction, self).__init__(parent, state)
@@ -1027,6 +1542,9 @@ class RetrieveValueAction(SetValuesAction):
 
 
 class SaveToFileAction(Action):
+    __slots__ = ("file_path", "from_field", "append_to_file",
+                 "prefix_string", "suffix_string", "decode",
+                 "write_to_console")
 
     def __init__(self, parent, state):
         super(SaveToFileAction, self).__init__(parent, state)
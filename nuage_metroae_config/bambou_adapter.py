@@ -1,4 +1,5 @@
 import sys
+import threading
 
 from bambou import NURESTFetcher, NURESTSession, NURESTObject, NURESTRootObject
 from bambou.exceptions import InternalConsitencyError
@@ -27,7 +28,26 @@ class Session(NURESTSession):
         self.enterprise_spec = enterprise_spec
 
 
-class ConfigObject(NURESTObject):
+class ChildNameMixin(object):
+    """
+    Mixin keeping the name of the child type being written to an object
+    separately for each thread so that children can be written to the same
+    parent concurrently
+    """
+
+    @property
+    def current_child_name(self):
+        return getattr(self._get_child_names(), "name", None)
+
+    @current_child_name.setter
+    def current_child_name(self, child_name):
+        self._get_child_names().name = child_name
+
+    def _get_child_names(self):
+        return self.__dict__.setdefault("_child_names", threading.local())
+
+
+class ConfigObject(ChildNameMixin, NURESTObject):
     """
     Wrapper class around Bambou object needed to override with MetroAE config
     specific methods.  This class is effectively a generic config object of any
@@ -248,6 +268,28 @@ class Fetcher(NURESTFetcher):
     def new(self):
         return ConfigObject(self.spec)
 
+    def get(self, filter=None, page=None, **kwargs):
+        """
+        Fetches the objects matching the filter.  The VSD returns one page
+        of objects per request, so all of the pages are fetched unless a
+        specific page is requested.
+        """
+        if page is not None:
+            return super(Fetcher, self).get(filter=filter, page=page,
+                                            **kwargs)
+
+        objects = super(Fetcher, self).get(filter=filter, **kwargs)
+        page = 0
+        while len(objects) < self.current_total_count:
+            page += 1
+            page_objects = super(Fetcher, self).get(filter=filter, page=page,
+                                                    **kwargs)
+            if len(page_objects) == 0:
+                break
+            objects.extend(page_objects)
+
+        return objects
+
     def _prepare_url(self):
         return self.parent_object.get_resource_url_for_child_name(
             self.resource_name)
@@ -283,7 +325,7 @@ class EnterpriseFetcher(Fetcher):
         return csp_enterprise
 
 
-class Root(NURESTRootObject):
+class Root(ChildNameMixin, NURESTRootObject):
     """
     Wrapper class around Bambou root object needed to override with MetroAE
     config specific methods.
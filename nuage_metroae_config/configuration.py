@@ -1,7 +1,9 @@
 import collections
 
 from .actions import Action
-from .logger import Logger
+from .errors import JournalError
+from .executor import ConcurrentExecutor
+from .logger import Logger, is_log_enabled
 
 
 class Configuration(object):
@@ -18,6 +20,14 @@ class Configuration(object):
         self.data = collections.OrderedDict()
         self.log = Logger()
         self.is_update = False
+        self.thread_count = 1
+        self.journal = None
+        self.run_report = None
+        self.is_streaming = False
+        self.root_action = None
+        # The (is_revert, is_update) mode root_action was built for, None
+        # when it must be rebuilt
+        self.compiled_mode = None
 
     def set_logger(self, logger):
         """
@@ -26,6 +36,7 @@ class Configuration(object):
         which is intended to print to stdout.
         """
         self.log = logger
+        self.compiled_mode = None
 
     def get_logger(self):
         return self.log
@@ -38,6 +49,47 @@ class Configuration(object):
         """
         self.software_type = software_type
         self.software_version = software_version
+        self.compiled_mode = None
+
+    def set_thread_count(self, thread_count):
+        """
+        Sets the number of threads used to write the configuration.  When
+        more than one, independent objects are written to the device
+        concurrently.  The writer must support being called from multiple
+        threads.
+        """
+        self.thread_count = thread_count
+
+    def set_journal(self, journal):
+        """
+        Sets a Journal to record the actions completed while writing the
+        configuration to the device.  When the journal resumes a write that
+        failed, the actions completed before the failure are skipped.  The
+        journal is not used when only validating.
+        """
+        self.journal = journal
+
+    def set_run_report(self, run_report):
+        """
+        Sets a RunReport to record the time, call count and error count of
+        the actions executed and the calls made to the device writer.  The
+        report is written after each apply, update or revert.
+        """
+        self.run_report = run_report
+
+    def set_streaming(self, is_streaming=True):
+        """
+        Sets streaming mode.  The template data is split into partitions of
+        records whose top level objects are independent of the other
+        partitions, such as all of the records for one enterprise.  The
+        actions of each partition are built, written to the device and
+        released before the next so that memory grows with the largest
+        partition instead of the whole configuration.  A journal can not be
+        used when streaming.
+        """
+        self.is_streaming = is_streaming
+        self.root_action = None
+        self.compiled_mode = None
 
     def get_template_names(self):
         """
@@ -140,6 +192,7 @@ class Configuration(object):
             self.data[key] = list()
 
         self.data[key].append(template_data)
+        self.compiled_mode = None
 
         return {"key": key, "index": index}
 
@@ -147,6 +200,7 @@ class Configuration(object):
         key, index = self._get_data_index(id)
 
         self.data[key][index] = template_data
+        self.compiled_mode = None
 
         return id
 
@@ -171,37 +225,246 @@ class Configuration(object):
         return id['key']
 
     def _execute_templates(self, writer, is_revert=False, is_update=False):
-        self.root_action = Action(None)
-        self.root_action.set_logger(self.log)
-        self.is_update = is_update
-        if is_revert is True:
-            self._walk_data(self._revert_data)
+        journal = None
+        if self.journal is not None and not writer.is_validate_only():
+            journal = self.journal
+
+        if self.is_streaming is True:
+            if journal is not None:
+                raise JournalError("A journal can not be used when streaming")
+            self.is_update = is_update
+            root_actions = self._iter_partition_root_actions(is_revert)
         else:
-            self._walk_data(self._apply_data)
-        self.root_action.reorder()
-        self.log.debug(str(self.root_action))
-        writer.start_session()
-        self.root_action.execute(writer)
-        writer.stop_session()
-
-    def _walk_data(self, callback_func):
+            # The tree is reused while the data is unchanged, such as for the
+            # validate pass followed by the writing pass
+            mode = (is_revert, is_update)
+            if self.compiled_mode != mode:
+                self._compile_templates(is_revert, is_update)
+                self.compiled_mode = mode
+            else:
+                self.root_action.reset_execution()
+            root_actions = [self.root_action]
+
+        run_report = self.run_report
+        if run_report is not None:
+            if is_revert is True:
+                run_mode = "revert"
+            elif is_update is True:
+                run_mode = "update"
+            else:
+                run_mode = "apply"
+            run_report.start(run_mode, writer.is_validate_only())
+            writer = run_report.get_writer(writer)
+
+        error = None
+        try:
+            writer.start_session()
+            for root_action in root_actions:
+                self._execute_root_action(root_action, writer, journal,
+                                          run_report)
+                # Released before the next partition is built
+                root_action = None
+            writer.stop_session()
+        except Exception as e:
+            self.compiled_mode = None
+            error = e
+            raise
+        finally:
+            if journal is not None:
+                journal.stop()
+            if run_report is not None:
+                run_report.stop(error)
+
+    def _execute_root_action(self, root_action, writer, journal, run_report):
+        if run_report is not None:
+            root_action.set_run_report(run_report)
+        try:
+            if journal is not None:
+                journal.start(root_action)
+                root_action.set_journal(journal)
+            if self.thread_count > 1:
+                executor = ConcurrentExecutor(self.thread_count)
+                executor.execute(root_action, writer)
+            else:
+                root_action.execute(writer)
+        finally:
+            if journal is not None:
+                root_action.set_journal(None)
+            if run_report is not None:
+                root_action.set_run_report(None)
+
+    def _compile_templates(self, is_revert, is_update):
+        self.compiled_mode = None
+        self.root_action = None
+        self.is_update = is_update
+        self.root_action = self._build_root_action(self._iter_data(),
+                                                   is_revert)
+
+    def _build_root_action(self, records, is_revert):
+        root_action = self._new_root_action()
+        for template, data in records:
+            self._read_data(root_action, template, data, is_revert)
+        root_action.reorder()
+        if is_log_enabled(self.log, "DEBUG"):
+            self.log.debug(str(root_action))
+
+        return root_action
+
+    def _new_root_action(self):
+        root_action = Action(None)
+        root_action.set_logger(self.log)
+        return root_action
+
+    def _iter_data(self):
         for template_name, data_list in self.data.items():
             template = self.get_template(template_name)
             for data in data_list:
                 if data is not None:
-                    callback_func(template, data)
+                    yield template, data
 
-    def _apply_data(self, template, data):
+    def _read_data(self, root_action, template, data, is_revert):
         template_dict = template._parse_with_vars(**data)
-        self.root_action.reset_state()
-        self.root_action.set_revert(False)
-        self.root_action.set_update(self.is_update)
-        self.root_action.set_template_name(template.get_name())
-        self.root_action.read_children_actions(template_dict)
+        root_action.reset_state()
+        root_action.set_revert(is_revert)
+        if is_revert is False:
+            root_action.set_update(self.is_update)
+        root_action.set_template_name(template.get_name())
+        root_action.read_children_actions(template_dict)
+
+    def _iter_partition_root_actions(self, is_revert):
+        partitions = self._get_partitions(is_revert)
+        if is_revert is True:
+            # Objects are removed in the reverse order of their creation
+            partitions.reverse()
+
+        count = len(partitions)
+        for index in range(count):
+            records = partitions[index]
+            partitions[index] = None
+            self.log.debug("Building partition %d of %d with %d records" %
+                           (index + 1, count, len(records)))
+            root_action = self._build_root_action(records, is_revert)
+            records = None
+            yield root_action
+            root_action = None
+
+    def _get_partitions(self, is_revert):
+        # Records are put in the same partition when any of their top level
+        # actions could be combined into the same object.  This is found
+        # through the keys of the child index without building the actions
+        # of all records at once.  Values are only stored and retrieved
+        # within a record, which is never split.
+        records = list()
+        record_orders = list()
+        partitions = _Partitions()
+        key_records = dict()
+        probe_records = dict()
+        for template, data in self._iter_data():
+            record_index = len(records)
+            records.append((template, data))
+            partitions.add()
+            record_root = self._new_root_action()
+            self._read_data(record_root, template, data, is_revert)
+            orders = [x.order for x in record_root.children]
+            if len(orders) == 0:
+                orders = [0]
+            record_orders.append((min(orders), max(orders)))
+            for child in record_root.children:
+                keys, probes = child.get_merge_index_keys()
+                if keys is None or probes is None:
+                    partitions.join_all(record_index)
+                    continue
+                for key in keys:
+                    if key in probe_records:
+                        partitions.join(record_index, probe_records[key])
+                for probe in probes:
+                    if probe in key_records:
+                        partitions.join(record_index, key_records[probe])
+                for key in keys:
+                    key_records.setdefault(key, record_index)
+                for probe in probes:
+                    probe_records.setdefault(probe, record_index)
+
+        return [[records[x] for x in partition]
+                for partition in self._sort_partitions_by_order(
+                    partitions.get_partitions(), record_orders)]
+
+    @staticmethod
+    def _sort_partitions_by_order(partitions, record_orders):
+        # The top level actions are written in the order of their 'order'
+        # field.  Partitions are sorted by their lowest order and the ones
+        # whose orders overlap are merged so that no action is written
+        # before an action of a lower order in another partition.
+        order_ranges = list()
+        for partition in partitions:
+            order_ranges.append(
+                [min([record_orders[x][0] for x in partition]),
+                 max([record_orders[x][1] for x in partition]),
+                 partition])
+        order_ranges.sort(key=lambda x: x[0])
+
+        merged_ranges = list()
+        for order_range in order_ranges:
+            if (len(merged_ranges) > 0 and
+                    order_range[0] < merged_ranges[-1][1]):
+                merged_range = merged_ranges[-1]
+                merged_range[1] = max(merged_range[1], order_range[1])
+                merged_range[2] = sorted(merged_range[2] + order_range[2])
+            else:
+                merged_ranges.append(order_range)
+
+        return [x[2] for x in merged_ranges]
+
+
+class _Partitions(object):
+    """
+    Private class grouping record indicies into disjoint partitions
+    """
 
-    def _revert_data(self, template, data):
-        template_dict = template._parse_with_vars(**data)
-        self.root_action.reset_state()
-        self.root_action.set_revert(True)
-        self.root_action.set_template_name(template.get_name())
-        self.root_action.read_children_actions(template_dict)
+    def __init__(self):
+        self.parents = list()
+        self.join_all_index = None
+
+    def add(self):
+        self.parents.append(len(self.parents))
+        if self.join_all_index is not None:
+            self.join(len(self.parents) - 1, self.join_all_index)
+
+    def join(self, first_index, second_index):
+        first_root = self._find(first_index)
+        second_root = self._find(second_index)
+        # The lowest index is kept as the root so partitions stay in the
+        # order of their first record
+        if first_root < second_root:
+            self.parents[second_root] = first_root
+        elif second_root < first_root:
+            self.parents[first_root] = second_root
+
+    def join_all(self, index):
+        if self.join_all_index is None:
+            self.join_all_index = index
+            for other_index in range(len(self.parents)):
+                self.join(other_index, index)
+
+    def get_partitions(self):
+        partitions = collections.OrderedDict()
+        for index in range(len(self.parents)):
+            root = self._find(index)
+            if root not in partitions:
+                partitions[root] = list()
+            partitions[root].append(index)
+
+        return list(partitions.values())
+
+    def _find(self, index):
+        root = index
+        while self.parents[root] != root:
+            root = self.parents[root]
+
+        # Compress the path so later finds are quick
+        while self.parents[index] != root:
+            parent = self.parents[index]
+            self.parents[index] = root
+            index = parent
+
+        return root
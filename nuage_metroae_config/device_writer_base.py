@@ -38,6 +38,43 @@ class DeviceWriterBase(object):
     def is_validate_only(self):
         return self.validate_only
 
+    def is_cascade_delete(self, object_name, child_object_name):
+        """
+        Returns True if the device deletes the children of type
+        child_object_name when deleting an object of type object_name.
+        These children are not deleted separately when reverting.
+        """
+        return False
+
+    def coalesce_selects(self, object_name, by_field, context=None):
+        """
+        Called before many objects of type object_name are selected by
+        by_field in the current context.  The device writer may fetch all of
+        these objects at once and answer the selects from the list fetched.
+        """
+        pass
+
+    def select_object_by_fields(self, object_name, by_fields, values,
+                                context=None):
+        """
+        Selects the object in the current context with each of the list of
+        by_fields equal to the corresponding value.  Returns None if the
+        device writer does not support this, the object is then selected
+        from the list of objects and their values.
+        """
+        return None
+
+    def get_object_list_by_child(self, object_name, child_object_name,
+                                 by_field, value, context=None):
+        """
+        Gets the objects of type object_name in the current context which
+        have children of type child_object_name with by_field equal to value.
+        Returns a list of (context, child count) tuples for these objects in
+        the order of the object list.  Returns None if the device writer does
+        not support this, each object is then searched for the child.
+        """
+        return None
+
     # Abstract prototype functions
     # All types of device writer classes will need to implement these
     # functions in order to apply the configurations to the device.
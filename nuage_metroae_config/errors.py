@@ -137,6 +137,13 @@ class InvalidObjectError(DeviceWriterError):
     pass
 
 
+class JournalError(MetroConfigError):
+    """
+    Exception class when a journal of completed actions cannot be resumed
+    """
+    pass
+
+
 #
 # User data parsing errors
 #
@@ -0,0 +1,341 @@
+import collections
+import sys
+import threading
+
+import six
+
+from .actions import FIRST_SELECTOR, LAST_SELECTOR, POSITION_SELECTOR
+from .errors import MetroConfigError
+from .logger import is_log_enabled
+
+LOG_FUNCTIONS = ["log", "debug", "info", "warning", "error", "critical",
+                 "output"]
+
+
+class ConcurrentExecutor(object):
+    """
+    Executes the actions of a configuration with independent sibling
+    subtrees written concurrently by a bounded pool of threads.
+
+    Siblings are run one at a time in their usual order except for runs of
+    create and select actions of the same order.  Within such a run, a
+    sibling waits for the earlier siblings which store or retrieve values
+    that it retrieves or stores and for the earlier siblings selecting or
+    creating the same type of object.  Set values, store, retrieve and save
+    to file actions and objects selected by position are never run
+    concurrently with their siblings.
+
+    The output logged by concurrent siblings is buffered and written in the
+    same order as when executed one at a time.  When siblings fail, the
+    error of the first in that order is raised after the siblings that
+    were already running complete.
+    """
+
+    def __init__(self, thread_count):
+        """
+        Requires the total number of threads executing actions, including
+        the thread calling execute.
+        """
+        self.thread_count = thread_count
+        self.condition = threading.Condition()
+        self.queue = collections.deque()
+        self.threads = list()
+        self.is_running = False
+        self.thread_state = threading.local()
+        self.replaced_loggers = list()
+
+    def execute(self, root_action, writer):
+        """
+        Executes the root action and all of its children on the writer.
+        """
+        self._replace_loggers(root_action, writer)
+        root_action.set_executor(self)
+        self._start_threads()
+        try:
+            root_action.execute(writer)
+        finally:
+            self._stop_threads()
+            root_action.set_executor(None)
+            self._restore_loggers()
+
+    def execute_children(self, action, writer, context=None):
+        """
+        Executes the children of the action, called by the action in place
+        of executing them one at a time.
+        """
+        ordered_list = action.get_ordered_children(writer)
+        if action.is_revert() is True:
+            is_output = False
+        else:
+            is_output = (not writer.is_validate_only() and
+                         is_log_enabled(action.log, "OUTPUT"))
+
+        for siblings in self._get_concurrent_siblings(ordered_list):
+            if len(siblings) == 1:
+                child = siblings[0]
+                if is_output:
+                    child.log.output(child._to_string(child.level))
+                try:
+                    action.execute_child(child, writer, context)
+                except MetroConfigError as e:
+                    e.reraise_with_location(child._get_location())
+            else:
+                tasks = self._get_tasks(siblings, writer, context, is_output)
+                self._execute_tasks(tasks)
+
+    #
+    # Private functions to do the work
+    #
+
+    def _get_concurrent_siblings(self, ordered_list):
+        siblings = list()
+        for child in ordered_list:
+            if len(siblings) > 0 and (not self._is_concurrent(child) or
+                                      siblings[-1].order != child.order):
+                yield siblings
+                siblings = list()
+
+            siblings.append(child)
+            if not self._is_concurrent(child):
+                yield siblings
+                siblings = list()
+
+        if len(siblings) > 0:
+            yield siblings
+
+    @staticmethod
+    def _is_concurrent(action):
+        if action.is_create():
+            field = action.select_by_field
+        elif action.is_select():
+            field = action.field
+        else:
+            return False
+
+        return (type(field) == list or
+                str(field).lower() not in [FIRST_SELECTOR,
+                                           LAST_SELECTOR,
+                                           POSITION_SELECTOR])
+
+    def _get_tasks(self, siblings, writer, context, is_output):
+        tasks = list()
+        storing_tasks = dict()
+        retrieving_tasks = dict()
+        creating_tasks = dict()
+        selecting_tasks = dict()
+        for child in siblings:
+            task = _ActionTask(child, writer, context, is_output)
+            object_type = str(child.object_type).lower()
+            for mark in child.retrieve_marks:
+                task.add_dependencies(storing_tasks.get(mark, []))
+            for mark in child.store_marks:
+                task.add_dependencies(retrieving_tasks.get(mark, []))
+            if child.is_create():
+                task.add_dependencies(selecting_tasks.get(object_type, []))
+                creating_tasks.setdefault(object_type, []).append(task)
+            else:
+                task.add_dependencies(creating_tasks.get(object_type, []))
+                selecting_tasks.setdefault(object_type, []).append(task)
+            for mark in child.retrieve_marks:
+                retrieving_tasks.setdefault(mark, []).append(task)
+            for mark in child.store_marks:
+                storing_tasks.setdefault(mark, []).append(task)
+            tasks.append(task)
+
+        return tasks
+
+    def _execute_tasks(self, tasks):
+        group = _TaskGroup()
+        with self.condition:
+            for task in tasks:
+                task.group = group
+                if task.pending_count == 0:
+                    self._queue_task(task)
+            self.condition.notify_all()
+
+            # Help with the queued tasks while waiting so that threads
+            # executing the children of a task are never idle
+            while group.active_count > 0:
+                if len(self.queue) > 0:
+                    self._run_queued_task()
+                else:
+                    self.condition.wait()
+
+        for task in tasks:
+            self._write_log_records(task.log_records)
+
+        for task in tasks:
+            if task.exc_info is not None:
+                error = task.exc_info[1]
+                if isinstance(error, MetroConfigError):
+                    error.reraise_with_location(task.action._get_location())
+                six.reraise(*task.exc_info)
+
+    def _queue_task(self, task):
+        task.group.active_count += 1
+        self.queue.append(task)
+
+    def _run_queued_task(self):
+        # Called with the condition acquired, which is released while the
+        # task runs
+        task = self.queue.popleft()
+        self.condition.release()
+        try:
+            self._run_task(task)
+        finally:
+            self.condition.acquire()
+            self._finish_task(task)
+
+    def _run_task(self, task):
+        if task.group.is_failed:
+            return
+
+        log_buffers = self._get_log_buffers()
+        log_buffers.append(task.log_records)
+        try:
+            action = task.action
+            if task.is_output:
+                action.log.output(action._to_string(action.level))
+            action.parent.execute_child(action, task.writer, task.context)
+        except Exception:
+            task.exc_info = sys.exc_info()
+        finally:
+            log_buffers.pop()
+
+    def _finish_task(self, task):
+        group = task.group
+        if task.exc_info is not None:
+            group.is_failed = True
+        elif not group.is_failed:
+            for dependent in task.dependents:
+                dependent.pending_count -= 1
+                if dependent.pending_count == 0:
+                    self._queue_task(dependent)
+
+        group.active_count -= 1
+        self.condition.notify_all()
+
+    def _start_threads(self):
+        self.is_running = True
+        for index in range(self.thread_count - 1):
+            thread = threading.Thread(target=self._work,
+                                      name="metroae-executor-%d" % index)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def _stop_threads(self):
+        with self.condition:
+            self.is_running = False
+            self.condition.notify_all()
+
+        for thread in self.threads:
+            thread.join()
+
+        self.threads = list()
+
+    def _work(self):
+        with self.condition:
+            while self.is_running:
+                if len(self.queue) > 0:
+                    self._run_queued_task()
+                else:
+                    self.condition.wait()
+
+    def _get_log_buffers(self):
+        if not hasattr(self.thread_state, "log_buffers"):
+            self.thread_state.log_buffers = list()
+
+        return self.thread_state.log_buffers
+
+    def _write_log(self, log_function, args, kwargs):
+        log_buffers = self._get_log_buffers()
+        if len(log_buffers) > 0:
+            log_buffers[-1].append((log_function, args, kwargs))
+        else:
+            log_function(*args, **kwargs)
+
+    def _write_log_records(self, log_records):
+        for log_function, args, kwargs in log_records:
+            self._write_log(log_function, args, kwargs)
+
+    def _replace_loggers(self, root_action, writer):
+        buffered_loggers = dict()
+
+        def get_buffered_logger(logger):
+            if id(logger) not in buffered_loggers:
+                buffered_loggers[id(logger)] = _BufferedLogger(self, logger)
+            return buffered_loggers[id(logger)]
+
+        actions = [root_action]
+        while len(actions) > 0:
+            action = actions.pop()
+            self.replaced_loggers.append((action, action.log))
+            action.set_logger(get_buffered_logger(action.log))
+            actions.extend(action.children)
+
+        if hasattr(writer, "get_logger"):
+            self.replaced_loggers.append((writer, writer.get_logger()))
+            writer.set_logger(get_buffered_logger(writer.get_logger()))
+
+    def _restore_loggers(self):
+        for logged_object, logger in self.replaced_loggers:
+            logged_object.set_logger(logger)
+
+        self.replaced_loggers = list()
+
+
+class _ActionTask(object):
+    """
+    Private class tracking the execution of an action by the executor
+    """
+
+    def __init__(self, action, writer, context, is_output):
+        self.action = action
+        self.writer = writer
+        self.context = context
+        self.is_output = is_output
+        self.group = None
+        self.dependents = list()
+        self.dependency_ids = set()
+        self.pending_count = 0
+        self.log_records = list()
+        self.exc_info = None
+
+    def add_dependencies(self, tasks):
+        for task in tasks:
+            if id(task) not in self.dependency_ids:
+                self.dependency_ids.add(id(task))
+                task.dependents.append(self)
+                self.pending_count += 1
+
+
+class _TaskGroup(object):
+    """
+    Private class tracking the tasks for the children of one action
+    """
+
+    def __init__(self):
+        self.active_count = 0
+        self.is_failed = False
+
+
+class _BufferedLogger(object):
+    """
+    Private class wrapping a logger so that the entries logged while a task
+    is executed are buffered until they can be written in order
+    """
+
+    def __init__(self, executor, logger):
+        self.executor = executor
+        self.logger = logger
+
+    def __getattr__(self, name):
+        attribute = getattr(self.logger, name)
+        if name not in LOG_FUNCTIONS:
+            return attribute
+
+        def log(*args, **kwargs):
+            self.executor._write_log(attribute, args, kwargs)
+
+        return log
@@ -0,0 +1,158 @@
+import hashlib
+import itertools
+import json
+import os
+import threading
+
+from .actions import StoreValueAction
+from .errors import JournalError
+
+
+class Journal(object):
+    """
+    Records the actions completed while writing a configuration to a file so
+    that a write which failed part way can be resumed.
+
+    The file contains one JSON entry per line.  The first entry holds a
+    signature of the configuration written.  Each following entry holds the
+    key of a completed action along with the id of the object created or
+    updated by a set values action or the value stored by a store value
+    action.
+
+    When resuming, the actions completed by the previous write are skipped
+    and the values they stored are restored so that later retrieves still
+    resolve.  Objects which were created before the failure, but whose
+    children were not all written, are selected by id instead of being
+    created again.
+    """
+
+    def __init__(self, file_name, resume=False):
+        """
+        Requires the name of the journal file.  When resume is set and the
+        file exists, the write recorded in it is resumed.  Otherwise the file
+        is overwritten.
+        """
+        self.file_name = file_name
+        self.resume = resume
+        self.lock = threading.Lock()
+        self.keys = dict()
+        self.entries = dict()
+        self.journal_file = None
+
+    def start(self, root_action):
+        """
+        Opens the journal for writing the configuration of the root action.
+        The values stored by actions completed before resuming are restored.
+        """
+        self.keys = dict()
+        self.entries = dict()
+        store_actions = list()
+        actions = [(root_action, "")]
+        while len(actions) > 0:
+            action, key = actions.pop()
+            self.keys[id(action)] = key
+            if isinstance(action, StoreValueAction):
+                store_actions.append(action)
+            for index, child in enumerate(action.children):
+                actions.append((child, "%s/%d" % (key, index)))
+
+        signature = self._get_signature(root_action)
+        if self.resume and os.path.isfile(self.file_name):
+            is_line_complete = self._read_entries(signature)
+            for action in store_actions:
+                entry = self.entries.get(self.keys[id(action)])
+                if entry is not None and "value" in entry:
+                    action.stored_value = entry["value"]
+            self.journal_file = open(self.file_name, "a")
+            if not is_line_complete:
+                self.journal_file.write("\n")
+        else:
+            self.journal_file = open(self.file_name, "w")
+            self._write_entry({"signature": signature})
+
+    def stop(self):
+        """
+        Closes the journal file.
+        """
+        if self.journal_file is not None:
+            self.journal_file.close()
+            self.journal_file = None
+
+    def is_complete(self, action):
+        """
+        Returns True if the action and all of its children were completed.
+        """
+        return self.keys.get(id(action)) in self.entries
+
+    def get_object_id(self, action):
+        """
+        Returns the id of the object written by a create action before
+        resuming or None if it was not written.
+        """
+        if len(action.children) == 0:
+            return None
+
+        entry = self.entries.get(self.keys.get(id(action.children[0])))
+        if entry is None:
+            return None
+
+        return entry.get("object_id")
+
+    def record_complete(self, action, writer, context=None):
+        """
+        Records that the action and all of its children were completed.  The
+        context is the one the action was executed in.
+        """
+        entry = {"key": self.keys[id(action)]}
+        if (action.is_set_values() and action.parent.is_create() and
+                action.parent.children[0] is action and
+                action.is_revert() is False):
+            entry["object_id"] = writer.get_value("id", context)
+        elif isinstance(action, StoreValueAction):
+            entry["value"] = action.stored_value
+
+        with self.lock:
+            self._write_entry(entry)
+
+    #
+    # Private functions to do the work
+    #
+
+    def _get_signature(self, root_action):
+        signature = hashlib.sha1()
+        lines = ["revert=%s update=%s\n" % (root_action.is_revert(),
+                                            root_action.is_update())]
+        for line in itertools.chain(lines, root_action.iter_string_lines()):
+            if not isinstance(line, bytes):
+                line = line.encode("utf-8")
+            signature.update(line)
+
+        return signature.hexdigest()
+
+    def _read_entries(self, signature):
+        try:
+            with open(self.file_name, "r") as journal_file:
+                contents = journal_file.read()
+            lines = contents.splitlines()
+            header = json.loads(lines[0])
+            # A failure while writing may leave the last line incomplete
+            for line in lines[1:]:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self.entries[entry["key"]] = entry
+        except (IOError, IndexError, KeyError, ValueError) as e:
+            raise JournalError("Could not read journal %s: %s" % (
+                self.file_name, str(e)))
+
+        if header.get("signature") != signature:
+            raise JournalError(
+                "Journal %s was written for a different configuration" %
+                self.file_name)
+
+        return contents.endswith("\n")
+
+    def _write_entry(self, entry):
+        self.journal_file.write(json.dumps(entry) + "\n")
+        self.journal_file.flush()
@@ -1,3 +1,6 @@
+import logging
+
+
 class Logger(object):
     """
     Class to manage the logging and user output of the nuage_metroae_config
@@ -33,3 +36,21 @@ class Logger(object):
 
     def set_to_stdout(self, log_type, enabled=True):
         self.log_type_to_stdout[log_type] = enabled
+
+
+def is_log_enabled(logger, level_name):
+    """
+    Returns whether the logger would write messages of the named level.
+    Loggers based on the logging Python library are checked for the level,
+    other loggers are assumed to write all levels.  Used to skip formatting
+    messages that would be discarded.
+    """
+    is_enabled_for = getattr(logger, "isEnabledFor", None)
+    if is_enabled_for is None:
+        return True
+
+    level = logging.getLevelName(level_name)
+    if not isinstance(level, int):
+        return True
+
+    return is_enabled_for(level)
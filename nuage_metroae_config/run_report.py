@@ -0,0 +1,231 @@
+import json
+import threading
+import time
+
+# Device writer functions which are timed by the report
+INSTRUMENTED_CALLS = ["start_session", "stop_session", "create_object",
+                      "update_object", "select_object", "coalesce_selects",
+                      "select_object_by_fields", "get_object_list",
+                      "get_object_list_by_child", "set_values",
+                      "unset_values", "delete_object"]
+
+# Device writer functions which are passed the object name as the first
+# argument, the others are counted for the object of the current action
+OBJECT_NAME_CALLS = ["create_object", "update_object", "select_object",
+                     "coalesce_selects", "select_object_by_fields",
+                     "get_object_list", "get_object_list_by_child"]
+
+ACTION_NAMES = {"CreateObjectAction": "create-object",
+                "SelectObjectAction": "select-object",
+                "SetValuesAction": "set-values",
+                "StoreValueAction": "store-value",
+                "RetrieveValueAction": "retrieve-value",
+                "SaveToFileAction": "save-to-file"}
+
+
+class RunReport(object):
+    """
+    Records the wall time, call count and error count of the actions
+    executed and of the calls made to the device writer while a
+    configuration is applied, updated or reverted.  These are totalled by
+    template name and object type and written as a JSON report when done.
+
+    The time of an action includes the time of all of its children.  An
+    error is only counted for the action which raised it, not for its
+    ancestors.
+    """
+
+    def __init__(self, file_name=None):
+        """
+        The report is written to the file name, if specified.  It is also
+        available from get_report().
+        """
+        self.file_name = file_name
+        self.lock = threading.Lock()
+        self.thread_state = threading.local()
+        self.report = None
+        self.mode = None
+        self.is_validate_only = False
+        self.start_time = None
+        self.action_stats = dict()
+        self.call_stats = dict()
+        self.counted_errors = dict()
+
+    def start(self, mode, is_validate_only=False):
+        """
+        Starts recording a run of the specified mode (apply, update or
+        revert).
+        """
+        self.mode = mode
+        self.is_validate_only = is_validate_only
+        self.action_stats = dict()
+        self.call_stats = dict()
+        self.counted_errors = dict()
+        self.start_time = time.time()
+
+    def stop(self, error=None):
+        """
+        Stops recording and writes the report.  The error which stopped the
+        run, if any, is included.
+        """
+        self.report = {
+            "mode": self.mode,
+            "validate_only": self.is_validate_only,
+            "seconds": time.time() - self.start_time,
+            "error": None if error is None else str(error),
+            "templates": self._get_template_totals(),
+            "actions": self._get_stats_list(self.action_stats, "action"),
+            "api_calls": self._get_stats_list(self.call_stats, "call")}
+        self.counted_errors = dict()
+
+        if self.file_name is not None:
+            with open(self.file_name, "w") as report_file:
+                report_file.write(json.dumps(self.report, indent=4,
+                                             sort_keys=True) + "\n")
+
+    def get_report(self):
+        """
+        Returns the report of the last run as a dict.
+        """
+        return self.report
+
+    def get_writer(self, writer):
+        """
+        Returns a writer which records the calls made to the specified writer.
+        """
+        return _InstrumentedWriter(self, writer)
+
+    def execute(self, action, writer, context=None):
+        """
+        Executes the action, recording its time and any error raised.
+        """
+        action_stack = self._get_action_stack()
+        action_stack.append(action)
+        start_time = time.time()
+        is_error = False
+        try:
+            action.execute(writer, context)
+        except Exception as e:
+            is_error = self._count_error(e)
+            raise
+        finally:
+            action_stack.pop()
+            key = (action.template_name,
+                   self._get_object_type(action),
+                   ACTION_NAMES.get(type(action).__name__,
+                                    type(action).__name__))
+            self._record(self.action_stats, key, time.time() - start_time,
+                         is_error)
+
+    def call(self, name, function, args, kwargs):
+        """
+        Calls the writer function, recording its time and any error raised.
+        """
+        action_stack = self._get_action_stack()
+        template_name = None
+        object_type = None
+        if len(action_stack) > 0:
+            template_name = action_stack[-1].template_name
+            object_type = self._get_object_type(action_stack[-1])
+        if name in OBJECT_NAME_CALLS and len(args) > 0:
+            object_type = args[0]
+
+        start_time = time.time()
+        is_error = False
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            is_error = True
+            raise
+        finally:
+            self._record(self.call_stats, (template_name, object_type, name),
+                         time.time() - start_time, is_error)
+
+    #
+    # Private functions to do the work
+    #
+
+    def _get_action_stack(self):
+        if not hasattr(self.thread_state, "action_stack"):
+            self.thread_state.action_stack = list()
+
+        return self.thread_state.action_stack
+
+    @staticmethod
+    def _get_object_type(action):
+        object_type = getattr(action, "object_type", None)
+        if object_type is None and action.parent is not None:
+            object_type = getattr(action.parent, "object_type", None)
+
+        return object_type
+
+    def _count_error(self, error):
+        # Errors propagate through the ancestors of the failed action, only
+        # count them once
+        with self.lock:
+            if id(error) in self.counted_errors:
+                return False
+            self.counted_errors[id(error)] = error
+            return True
+
+    def _record(self, stats, key, seconds, is_error):
+        with self.lock:
+            if key not in stats:
+                stats[key] = {"count": 0, "errors": 0, "seconds": 0.0}
+            entry = stats[key]
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            if is_error:
+                entry["errors"] += 1
+
+    @staticmethod
+    def _get_stats_list(stats, name_key):
+        stats_list = list()
+        for key, entry in stats.items():
+            template_name, object_type, name = key
+            stats_entry = {"template": template_name,
+                           "object_type": object_type,
+                           name_key: name}
+            stats_entry.update(entry)
+            stats_list.append(stats_entry)
+
+        stats_list.sort(key=lambda x: x["seconds"], reverse=True)
+        return stats_list
+
+    def _get_template_totals(self):
+        totals = dict()
+        for key, entry in self.call_stats.items():
+            template_name = key[0]
+            if template_name not in totals:
+                totals[template_name] = {"template": template_name,
+                                         "api_calls": 0,
+                                         "api_errors": 0,
+                                         "api_seconds": 0.0}
+            total = totals[template_name]
+            total["api_calls"] += entry["count"]
+            total["api_errors"] += entry["errors"]
+            total["api_seconds"] += entry["seconds"]
+
+        return sorted(totals.values(), key=lambda x: x["api_seconds"],
+                      reverse=True)
+
+
+class _InstrumentedWriter(object):
+    """
+    Private class wrapping a device writer so that the calls made to it are
+    recorded in a run report
+    """
+
+    def __init__(self, run_report, writer):
+        self.run_report = run_report
+        self.writer = writer
+
+    def __getattr__(self, name):
+        attribute = getattr(self.writer, name)
+        if name not in INSTRUMENTED_CALLS:
+            return attribute
+
+        def call(*args, **kwargs):
+            return self.run_report.call(name, attribute, args, kwargs)
+
+        return call
@@ -1,6 +1,9 @@
 import jinja2
 import jinja2.ext
+import jinja2.meta
+import jinja2.nodes
 import json
+import multiprocessing
 import os
 import re
 import six
@@ -8,11 +11,18 @@ import yaml
 
 from .document_template_md import DOCUMENT_TEMPLATE_MD
 from .errors import (MissingTemplateError,
+                     TemplateError,
                      TemplateParseError,
                      UndefinedVariableError,
                      VariableValueError)
 from .util import get_dict_field_no_case
 
+try:
+    # Use the much faster libyaml C implementation when it is available
+    from yaml import CSafeLoader as YamlSafeLoader
+except ImportError:
+    from yaml import SafeLoader as YamlSafeLoader
+
 JSON_SCHEMA_URL = "http://json-schema.org/draft-04/schema#"
 JSON_SCHEMA_ID_PREFIX = "urn:nuage-metro:config:template:"
 JSON_SCHEMA_TITLE = "Nuage Metro Config template "
@@ -20,18 +30,48 @@ VALID_VARIABLE_TYPES = ["string", "reference", "integer", "float", "boolean",
                         "ipv4", "ipv6", "ipv4_or_6", "choice", "list"]
 JSON_SCHEMA_STRING_TYPES = ["string", "reference", "ipv4", "ipv6", "ipv4_or_6"]
 EXAMPLE_COMMENT_SPACING = 40
+NULL_ENVIRONMENT = "null"
+VERIFY_ENVIRONMENT = "verify"
+RENDER_ENVIRONMENT = "render"
+TEMPLATE_CACHE_VERSION = 1
+TEMPLATE_CACHE_FILE_KEYS = ["size", "mtime", "engine_version"]
+TEMPLATE_CACHE_DATA_KEYS = ["name", "description", "template_version",
+                            "engine_version", "software_type",
+                            "software_version", "variables", "documentation",
+                            "referenced_variables"]
+SKELETON_PLACEHOLDER_PREFIX = "metroae-skeleton-variable-"
+HEADER_FIELDS = ["name", "software-type", "software-version",
+                 "template-version", "engine-version"]
+YAML_HEADER_REGEX = re.compile(r'^(%s)\s*:(.*)$' % "|".join(HEADER_FIELDS),
+                               re.IGNORECASE)
+JSON_HEADER_REGEX = re.compile(r'^\s*"(%s)"\s*:(.*?),?\s*$' %
+                               "|".join(HEADER_FIELDS), re.IGNORECASE)
+JSON_STRING_REGEX = re.compile(r'"(?:\\.|[^"\\])*"')
+JINJA_BLOCK_START_REGEX = re.compile(r'{%-?\s*(if|for|macro|call|filter)\b')
+JINJA_BLOCK_END_REGEX = re.compile(r'{%-?\s*end(if|for|macro|call|filter)\b')
 
 
 class Template(object):
     """
     Configuration template.  This class is read-only.
     """
+    # Jinja environments shared by all templates, created on first use
+    environments = dict()
+    # Version strings split into comparable parts, shared by all templates
+    parsed_versions = dict()
+
     def __init__(self):
         """
         Standard constructor.
         """
         self.filename = "(unknown)"
         self.template_string = None
+        self.compiled_templates = dict()
+        self.referenced_variables = None
+        self.data_validator = None
+        self.skeleton = None
+        self.is_skeleton_compiled = False
+        self.is_parsed = True
         self.name = "Unknown"
         self.description = None
         self.template_version = "1.0"
@@ -169,14 +209,132 @@ class Template(object):
     def _parse_without_vars(self, template_string, filename):
         self.filename = filename
         self.template_string = template_string
+        self.compiled_templates = dict()
+        self.data_validator = None
+        self.skeleton = None
+        self.is_skeleton_compiled = False
         filled_template = self._replace_vars_with_null()
         template_dict = self._decode_to_dict(filled_template)
         self._parse_headers(template_dict)
         self._parse_documentation(template_dict)
+        self._find_referenced_variables()
+        self.is_parsed = True
+
+    def _scan_headers(self, template_string, filename):
+        # Reads only the version headers without rendering or decoding the
+        # template.  Returns False if the headers could not be found reliably
+        # and the template needs to be fully parsed instead.
+        is_json = template_string.lstrip().startswith("{")
+        headers = dict()
+        depth = 0
+        jinja_depth = 0
+        for line in template_string.splitlines():
+            if is_json:
+                match = JSON_HEADER_REGEX.match(line) if depth == 1 else None
+                stripped_line = JSON_STRING_REGEX.sub("", line)
+                depth += (stripped_line.count("{") + stripped_line.count("[") -
+                          stripped_line.count("}") - stripped_line.count("]"))
+            else:
+                match = YAML_HEADER_REGEX.match(line)
+
+            if match is not None:
+                field = match.group(1).lower()
+                value = match.group(2).strip()
+                # Headers which are conditional, templated or repeated can
+                # only be determined by a full parse
+                if (jinja_depth > 0 or field in headers or value == "" or
+                        "{{" in value or "{%" in value):
+                    return False
+                try:
+                    if is_json:
+                        headers[field] = json.loads(value)
+                    else:
+                        headers[field] = yaml.load(value,
+                                                   Loader=YamlSafeLoader)
+                except (ValueError, yaml.YAMLError):
+                    return False
+
+            if "{%" in line:
+                jinja_depth += len(JINJA_BLOCK_START_REGEX.findall(line))
+                jinja_depth -= len(JINJA_BLOCK_END_REGEX.findall(line))
+
+        for field in ["name", "software-type", "software-version"]:
+            if headers.get(field) is None:
+                return False
+
+        if not isinstance(headers["name"], six.string_types):
+            return False
+
+        self.filename = filename
+        self.template_string = template_string
+        self.compiled_templates = dict()
+        self.is_parsed = False
+        self.name = headers["name"]
+        self.software_type = headers["software-type"]
+        self.software_version = headers["software-version"]
+        if headers.get("template-version") is not None:
+            self.template_version = str(headers["template-version"])
+        if headers.get("engine-version") is not None:
+            self.engine_version = str(headers["engine-version"])
+
+        return True
+
+    def _ensure_parsed(self):
+        if self.is_parsed:
+            return
+
+        scanned_headers = self._get_header_values()
+        self._parse_without_vars(self.template_string, self.filename)
+        if self._get_header_values() != scanned_headers:
+            self.is_parsed = False
+            raise TemplateParseError(
+                "In template %s, headers changed when fully parsed" %
+                self.filename)
+
+    def _get_header_values(self):
+        return (self.name, self.software_type, self.software_version,
+                self.template_version, self.engine_version)
+
+    def _parse_from_cache(self, template_string, filename, cache_data):
+        self.filename = filename
+        self.template_string = template_string
+        self.compiled_templates = dict()
+        self.data_validator = None
+        self.skeleton = None
+        self.is_skeleton_compiled = False
+        self.name = cache_data["name"]
+        self.description = cache_data["description"]
+        self.template_version = cache_data["template_version"]
+        self.engine_version = cache_data["engine_version"]
+        self.software_type = cache_data["software_type"]
+        self.software_version = cache_data["software_version"]
+        self.variables = cache_data["variables"]
+        self.documentation = cache_data["documentation"]
+        self.referenced_variables = frozenset(
+            cache_data["referenced_variables"])
+
+    def _get_cache_data(self):
+        return {"name": self.name,
+                "description": self.description,
+                "template_version": self.template_version,
+                "engine_version": self.engine_version,
+                "software_type": self.software_type,
+                "software_version": self.software_version,
+                "variables": self.variables,
+                "documentation": self.documentation,
+                "referenced_variables": sorted(self.referenced_variables)}
 
     def _decode_to_dict(self, filled_template):
+        if filled_template.lstrip().startswith("{"):
+            try:
+                return json.loads(filled_template)
+            except ValueError:
+                # Not strict JSON (or invalid), let the YAML parser decode it
+                # or report the error with a line number
+                pass
+
         try:
-            template_dict = yaml.safe_load(filled_template)
+            template_dict = yaml.load(filled_template, Loader=YamlSafeLoader)
         except yaml.YAMLError as e:
             if hasattr(e, 'problem_mark'):
                 lineno = str(e.problem_mark.line)
@@ -187,17 +345,43 @@ class Template(object):
         return template_dict
 
     def _replace_vars_with_null(self):
-        try:
-            template = jinja2.Template(
-                self.template_string,
-                extensions=(RegularExpressionExtension,),
-                autoescape=False,
-                undefined=NullUndefined)
+        template = self._get_compiled_template(NULL_ENVIRONMENT)
+        return template.render()
+
+    @staticmethod
+    def _get_environment(environment_name):
+        if environment_name not in Template.environments:
+            if environment_name == NULL_ENVIRONMENT:
+                environment = jinja2.Environment(
+                    extensions=(RegularExpressionExtension,),
+                    autoescape=False,
+                    undefined=NullUndefined)
+            elif environment_name == VERIFY_ENVIRONMENT:
+                environment = jinja2.Environment(
+                    extensions=(RegularExpressionExtension,),
+                    autoescape=False,
+                    undefined=jinja2.StrictUndefined)
+            else:
+                environment = jinja2.Environment(
+                    extensions=(JSONEscapingExtension,
+                                RegularExpressionExtension),
+                    autoescape=False,
+                    undefined=jinja2.StrictUndefined)
+            Template.environments[environment_name] = environment
+
+        return Template.environments[environment_name]
+
+    def _get_compiled_template(self, environment_name):
+        if environment_name not in self.compiled_templates:
+            environment = Template._get_environment(environment_name)
+            try:
+                self.compiled_templates[environment_name] = \
+                    environment.from_string(self.template_string)
+            except jinja2.TemplateSyntaxError as e:
+                raise TemplateParseError("Syntax error in %s:%d: %s" %
+                                         (self.filename, e.lineno, e.message))
 
-            return template.render()
-        except jinja2.TemplateSyntaxError as e:
-            raise TemplateParseError("Syntax error in %s:%d: %s" %
-                                     (self.filename, e.lineno, e.message))
+        return self.compiled_templates[environment_name]
 
     def _parse_headers(self, template_dict):
         self.name = self._get_required_field(template_dict, "name")
@@ -239,19 +423,42 @@ class Template(object):
             pass
 
     def _version_compare(self, version_l, version_r):
-        version_l_list = version_l.split(".")
-        version_r_list = version_r.split(".")
-
-        for pair in zip(version_l_list, version_r_list):
-            try:
-                if int(pair[0]) < int(pair[1]):
-                    return -1
-                if int(pair[0]) > int(pair[1]):
-                    return 1
-            except ValueError:
-                break
-
-        return len(version_l_list) - len(version_r_list)
+        numbers_l, length_l = self._parse_version(version_l)
+        numbers_r, length_r = self._parse_version(version_r)
+
+        # Numeric parts are compared up to the first non-numeric part in
+        # either version
+        for pair in zip(numbers_l, numbers_r):
+            if pair[0] < pair[1]:
+                return -1
+            if pair[0] > pair[1]:
+                return 1
+
+        return length_l - length_r
+
+    def _parse_versions(self):
+        for version in [self.template_version, self.engine_version,
+                        self.software_version]:
+            if version is not None:
+                self._parse_version(version)
+
+    @staticmethod
+    def _parse_version(version):
+        # Unquoted versions such as 5.0 are read from YAML as numbers
+        version = str(version)
+        if version not in Template.parsed_versions:
+            version_list = version.split(".")
+            numbers = list()
+            for part in version_list:
+                try:
+                    numbers.append(int(part))
+                except ValueError:
+                    break
+
+            Template.parsed_versions[version] = (tuple(numbers),
+                                                 len(version_list))
+
+        return Template.parsed_versions[version]
 
     def _convert_variables_to_schema(self):
         new_schema = dict()
@@ -442,151 +649,55 @@ class Template(object):
     def _replace_vars_with_kwargs(self, **kwargs):
         try:
             self._verify_all_vars_defined(**kwargs)
-            template = jinja2.Template(self.template_string,
-                                       extensions=(JSONEscapingExtension,
-                                                   RegularExpressionExtension),
-                                       autoescape=False,
-                                       undefined=jinja2.StrictUndefined)
+            template = self._get_compiled_template(RENDER_ENVIRONMENT)
 
             return template.render(**kwargs)
-        except jinja2.TemplateSyntaxError as e:
-            raise TemplateParseError("Syntax error in %s:%d: %s" %
-                                     (self.filename, e.lineno, e.message))
         except jinja2.UndefinedError as e:
             raise UndefinedVariableError("In template %s: Variable value %s" %
                                          (self.get_name(), e.message))
 
+    def _find_referenced_variables(self):
+        environment = Template._get_environment(VERIFY_ENVIRONMENT)
+        try:
+            ast = environment.parse(self.template_string)
+        except jinja2.TemplateSyntaxError as e:
+            raise TemplateParseError("Syntax error in %s:%d: %s" %
+                                     (self.filename, e.lineno, e.message))
+        variables = jinja2.meta.find_undeclared_variables(ast)
+        self.referenced_variables = frozenset(variables -
+                                              set(environment.globals))
+
     def _verify_all_vars_defined(self, **kwargs):
-        template = jinja2.Template(self.template_string,
-                                   extensions=(RegularExpressionExtension,),
-                                   autoescape=False,
-                                   undefined=jinja2.StrictUndefined)
+        if (self.referenced_variables is not None and
+                self.referenced_variables.issubset(kwargs)):
+            return
+
+        # Some referenced variables are missing, but they may only be used
+        # in branches which are not taken.  Render to find out for sure and
+        # to report the undefined variable.
+        template = self._get_compiled_template(VERIFY_ENVIRONMENT)
         template.render(**kwargs)
 
     def _parse_with_vars(self, **kwargs):
+        skeleton = self._get_skeleton()
+        if skeleton is not None and skeleton.can_bind(kwargs):
+            return skeleton.bind(kwargs)
+
         filled_template = self._replace_vars_with_kwargs(**kwargs)
         return self._decode_to_dict(filled_template)
 
-    def _validate_data(self, data):
-        var_info = self._generate_variable_info()
-
-        for name, value in data.items():
-            self._validate_against_variable_info(var_info, name, value)
-
-        self._validate_required_data(var_info, data)
-
-    def _generate_variable_info(self):
-        var_info = dict()
-
-        for variable in self.variables:
-            var_name = self._get_required_field(variable, "name")
-            var_info[var_name] = variable
-
-        return var_info
-
-    def _validate_against_variable_info(self, var_info, var_name, value):
-        if var_name in var_info:
-            var_schema = var_info[var_name]
-        else:
-            # No variable definition for given data.  Extra variables are ok.
-            return True
+    def _get_skeleton(self):
+        if not self.is_skeleton_compiled:
+            self.skeleton = TemplateSkeleton.compile(self)
+            self.is_skeleton_compiled = True
 
-        var_type = self._get_required_field(var_schema, "type").lower()
+        return self.skeleton
 
-        if var_type == "list":
-            if type(value) != list:
-                self._raise_value_error(var_name, "is not a list")
-
-            item_type = self._get_required_field(var_schema,
-                                                 "item-type").lower()
-
-            for item in value:
-                self._validate_variable_value(var_schema, var_name, item,
-                                              item_type)
-        else:
-            self._validate_variable_value(var_schema, var_name, value,
-                                          var_type)
-
-        return True
-
-    def _validate_variable_value(self, var_schema, var_name, value, var_type):
-        if var_type in JSON_SCHEMA_STRING_TYPES:
-            if isinstance(value, six.string_types):
-                return True
-            else:
-                allow_int = get_dict_field_no_case(var_schema, "allow-integer")
-                if allow_int is True and type(value) == int:
-                    return True
-                else:
-                    self._raise_value_error(var_name, "is not a string")
-        elif var_type == "integer":
-            if type(value) == int:
-                self._validate_range(var_schema, var_name, value)
-                return True
-            else:
-                self._raise_value_error(var_name, "is not an integer")
-        elif var_type == "float":
-            if type(value) == int or type(value) == float:
-                self._validate_range(var_schema, var_name, value)
-                return True
-            else:
-                self._raise_value_error(var_name, "is not a float")
-        elif var_type == "boolean":
-            if value is True or value is False:
-                return True
-            else:
-                self._raise_value_error(var_name, "is not a boolean")
-        elif var_type == "choice":
-            if not isinstance(value, six.string_types):
-                self._raise_value_error(var_name, "is not a string")
-            choices = self._get_required_field(var_schema, "choices")
-            upper_choices = [x.upper() for x in choices]
-            if value.upper() in upper_choices:
-                return True
-            else:
-                self._raise_value_error(var_name, "is not a valid choice")
-
-    def _validate_range(self, var_schema, var_name, value):
-        ranges = get_dict_field_no_case(var_schema, "range")
-        if ranges is not None:
-            if type(ranges) != list:
-                ranges = [ranges]
-
-            for r in ranges:
-                if isinstance(r, str):
-                    try:
-                        low, high = r.split("..")
-                        low = float(low)
-                        high = float(high)
-                        if high < low:
-                            raise ValueError("High of range greater than low")
-                        if value >= low and value <= high:
-                            return True
-                    except ValueError:
-                        self._raise_value_error(
-                            var_name, "invalid range, format is <low>..<high>")
-                elif r == value:
-                    return True
-
-            self._raise_value_error(var_name, "is not in valid range")
-
-    def _validate_required_data(self, var_info, data):
-        missing = []
-        for var_name, var_schema in var_info.items():
-            optional = get_dict_field_no_case(var_schema, "optional")
-            if optional is not True and var_name not in data:
-                missing.append(var_name)
-
-        if len(missing) == 0:
-            return True
-        else:
-            raise UndefinedVariableError(
-                "In template %s, missing required variables: %s" %
-                (self.get_name(), ', '.join(missing)))
+    def _validate_data(self, data):
+        if self.data_validator is None:
+            self.data_validator = TemplateDataValidator(self)
 
-    def _raise_value_error(self, var_name, message):
-        raise VariableValueError("In template %s, variable %s: %s" % (
-            self.get_name(), var_name, message))
+        self.data_validator.validate(data)
 
     def _parse_documentation(self, template_dict):
         self.documentation = dict()
@@ -646,6 +757,44 @@ class TemplateStore(object):
         """
         self.templates = dict()
         self.engine_version = engine_version
+        self.cache_file = None
+        self.cache = dict()
+        self.is_cache_changed = False
+        self.is_lazy = False
+        self.process_count = 1
+        self.resolved_templates = dict()
+
+    def set_process_count(self, process_count):
+        """
+        Sets the number of processes used to parse the templates of a
+        directory in parallel.  Templates are still added to the store in
+        the same order as when parsed serially.  Lazy parsing is cheap
+        enough that it is always done serially.
+        """
+        self.process_count = process_count
+
+    def set_lazy_parsing(self, is_lazy=True):
+        """
+        Enables lazy parsing of templates.  Only the name and version
+        headers of each template are read when it is added to the store.
+        The rest of the template is parsed the first time it is returned
+        by get_template, which is also when any errors in it are reported.
+        Templates which are cached (see set_cache_file) are already parsed
+        and templates missing from the cache are always fully parsed so that
+        they can be added to it.
+        """
+        self.is_lazy = is_lazy
+
+    def set_cache_file(self, cache_file):
+        """
+        Enables an on-disk cache of parsed templates kept in the specified
+        file.  Template files which have not changed since they were cached
+        are loaded without being parsed again.  The cache is updated after
+        each read_templates call.
+        """
+        self.cache_file = cache_file
+        self.cache = self._read_cache()
+        self.is_cache_changed = False
 
     def read_templates(self, path_or_file_name):
         """
@@ -654,20 +803,26 @@ class TemplateStore(object):
         Both yaml (.yml) and JSON (.json) files are supported.
         """
         if (os.path.isdir(path_or_file_name)):
+            full_paths = list()
             for file_name in os.listdir(path_or_file_name):
                 if (file_name.endswith(".yml") or
                         file_name.endswith(".yaml") or
                         file_name.endswith(".json")):
-                    full_path = os.path.join(path_or_file_name, file_name)
-                    template_string = self._read_template(full_path)
-                    self.add_template(template_string, full_path)
+                    full_paths.append(os.path.join(path_or_file_name,
+                                                   file_name))
+            if self.process_count > 1 and not self.is_lazy:
+                self._add_template_files_parallel(full_paths)
+            else:
+                for full_path in full_paths:
+                    self._add_template_file(full_path)
         elif os.path.isfile(path_or_file_name):
-            template_string = self._read_template(path_or_file_name)
-            self.add_template(template_string, path_or_file_name)
+            self._add_template_file(path_or_file_name)
         else:
             raise TemplateParseError("File or path not found: " +
                                      path_or_file_name)
 
+        self._write_cache()
+
     def add_template(self, template_string, filename=None):
         """
         Parses the specified string as a template in Yaml or JSON format.
@@ -675,7 +830,9 @@ class TemplateStore(object):
         template = Template()
         if filename is None:
             filename = "(internal)"
-        template._parse_without_vars(template_string, filename)
+        if (not self.is_lazy or
+                not template._scan_headers(template_string, filename)):
+            template._parse_without_vars(template_string, filename)
         self._register_template(template)
 
     def get_template_names(self, software_type=None, software_version=None):
@@ -702,6 +859,13 @@ class TemplateStore(object):
         and/or software_type is provided, template of specified version/type
         will be returned.
         """
+        resolve_key = (name.lower(), software_type, software_version,
+                       self.engine_version)
+        template = self.resolved_templates.get(resolve_key)
+        if template is not None:
+            template._ensure_parsed()
+            return template
+
         if name.lower() not in self.templates:
             raise MissingTemplateError("No template with name " + name)
 
@@ -720,6 +884,9 @@ class TemplateStore(object):
                 "%s template requires configuration engine version %s" % (
                     name, str(template.get_engine_version())))
 
+        template._ensure_parsed()
+        self.resolved_templates[resolve_key] = template
+
         return template
 
     #
@@ -733,8 +900,162 @@ class TemplateStore(object):
         except Exception as e:
             raise TemplateParseError("Error reading template: " + str(e))
 
+    def _add_template_file(self, file_name):
+        if self.cache_file is None:
+            template_string = self._read_template(file_name)
+            self.add_template(template_string, file_name)
+            return
+
+        file_info = self._get_file_info(file_name)
+        template_string = self._read_template(file_name)
+
+        template = self._get_cached_template(file_name, file_info,
+                                             template_string)
+        if template is None:
+            template = Template()
+            template._parse_without_vars(template_string, file_name)
+            self._cache_template(file_name, file_info, template)
+
+        self._register_template(template)
+
+    def _add_template_files_parallel(self, file_names):
+        cached_templates = dict()
+        file_infos = dict()
+        parse_file_names = list()
+        for file_name in file_names:
+            if self.cache_file is not None:
+                file_infos[file_name] = self._get_file_info(file_name)
+                template = self._get_cached_template(
+                    file_name, file_infos[file_name],
+                    self._read_template(file_name))
+                if template is not None:
+                    cached_templates[file_name] = template
+                    continue
+            parse_file_names.append(file_name)
+
+        if len(parse_file_names) > 1:
+            pool = multiprocessing.Pool(min(self.process_count,
+                                            len(parse_file_names)))
+            try:
+                results = pool.map(parse_template_file, parse_file_names)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [parse_template_file(x) for x in parse_file_names]
+
+        parse_results = dict(zip(parse_file_names, results))
+
+        # Register in the original order, stopping at the first error just
+        # like the serial loader
+        for file_name in file_names:
+            if file_name in cached_templates:
+                self._register_template(cached_templates[file_name])
+                continue
+
+            error, template_string, template_data = parse_results[file_name]
+            if error is not None:
+                raise TemplateParseError(error)
+
+            template = Template()
+            template._parse_from_cache(template_string, file_name,
+                                       template_data)
+            if self.cache_file is not None:
+                self._cache_template(file_name, file_infos[file_name],
+                                     template)
+            self._register_template(template)
+
+    def _get_cached_template(self, file_name, file_info, template_string):
+        cache_entry = self.cache.get(os.path.abspath(file_name))
+        if cache_entry is None or cache_entry["file"] != file_info:
+            return None
+
+        template = Template()
+        template._parse_from_cache(template_string, file_name,
+                                   cache_entry["template"])
+        return template
+
+    def _get_file_info(self, file_name):
+        try:
+            stat = os.stat(file_name)
+        except OSError as e:
+            raise TemplateParseError("Error reading template: " + str(e))
+
+        return {"size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "engine_version": self.engine_version}
+
+    def _cache_template(self, file_name, file_info, template):
+        cache_entry = {"file": file_info,
+                       "template": template._get_cache_data()}
+        try:
+            # Only cache templates which survive a round trip through JSON
+            if json.loads(json.dumps(cache_entry)) != cache_entry:
+                return
+        except (TypeError, ValueError):
+            return
+
+        self.cache[os.path.abspath(file_name)] = cache_entry
+        self.is_cache_changed = True
+
+    def _read_cache(self):
+        if not os.path.isfile(self.cache_file):
+            return dict()
+
+        try:
+            with open(self.cache_file, 'r') as file:
+                cache = json.load(file)
+        except (IOError, OSError, ValueError):
+            # A corrupt or unreadable cache is rebuilt from the templates
+            return dict()
+
+        if (type(cache) != dict or
+                cache.get("cache_version") != TEMPLATE_CACHE_VERSION or
+                type(cache.get("templates")) != dict):
+            return dict()
+
+        # Malformed entries are dropped so their templates are parsed again
+        return dict([(file_name, cache_entry)
+                     for file_name, cache_entry in cache["templates"].items()
+                     if self._is_valid_cache_entry(cache_entry)])
+
+    @staticmethod
+    def _is_valid_cache_entry(cache_entry):
+        if (type(cache_entry) != dict or
+                type(cache_entry.get("file")) != dict or
+                type(cache_entry.get("template")) != dict):
+            return False
+
+        return (all([x in cache_entry["file"]
+                     for x in TEMPLATE_CACHE_FILE_KEYS]) and
+                all([x in cache_entry["template"]
+                     for x in TEMPLATE_CACHE_DATA_KEYS]))
+
+    def _write_cache(self):
+        if self.cache_file is None or not self.is_cache_changed:
+            return
+
+        cache = {"cache_version": TEMPLATE_CACHE_VERSION,
+                 "templates": self.cache}
+        temp_file_name = "%s.%d.tmp" % (self.cache_file, os.getpid())
+        try:
+            with open(temp_file_name, 'w') as file:
+                json.dump(cache, file)
+            # Rename is atomic so readers never see a partial cache
+            os.rename(temp_file_name, self.cache_file)
+        except (IOError, OSError):
+            # The cache is only an optimization, templates were still read
+            if os.path.isfile(temp_file_name):
+                os.remove(temp_file_name)
+            return
+
+        self.is_cache_changed = False
+
     def _register_template(self, template):
         template_name = template.get_name().lower()
+        template._parse_versions()
+        # A new template may be a better match for previous lookups
+        self.resolved_templates = dict()
 
         if template_name not in self.templates:
             self.templates[template_name] = list()
@@ -758,10 +1079,332 @@ class TemplateStore(object):
         return latest_template
 
 
+def parse_template_file(file_name):
+    """
+    Parses a template file for TemplateStore when loading in parallel.  This
+    must be a module level function to be run in a process pool.  Returns a
+    tuple of (error message, template string, template data) where the
+    template data can be restored with Template._parse_from_cache.
+    """
+    try:
+        template_string = TemplateStore()._read_template(file_name)
+        template = Template()
+        template._parse_without_vars(template_string, file_name)
+        return (None, template_string, template._get_cache_data())
+    except TemplateParseError as e:
+        return (str(e), None, None)
+
+
 #
 # Private classes to do the work
 #
 
+class TemplatePlaceholder(object):
+    """
+    Marks where the value of a variable is substituted in a template
+    skeleton.
+    """
+    def __init__(self, var_name):
+        self.var_name = var_name
+
+
+class TemplateSkeleton(object):
+    """
+    A template decoded once with placeholders in place of its variables.
+    Templates with a structure that does not depend on the data (no
+    conditionals, loops or filters over the variables) are parsed by
+    binding the values to the placeholders instead of rendering and
+    decoding the template again.
+    """
+    def __init__(self, template_dict, var_names):
+        self.template_dict = template_dict
+        self.var_names = var_names
+
+    @staticmethod
+    def compile(template):
+        """
+        Returns the skeleton for the template, or None if the template must
+        be rendered for each set of data.
+        """
+        if (template.template_string is None or
+                SKELETON_PLACEHOLDER_PREFIX in template.template_string):
+            return None
+
+        environment = Template._get_environment(RENDER_ENVIRONMENT)
+        try:
+            ast = environment.parse(template.template_string)
+        except jinja2.TemplateSyntaxError:
+            return None
+
+        var_names = set()
+        for node in ast.body:
+            if (type(node) != jinja2.nodes.Output or
+                    not TemplateSkeleton._is_static_output(node, var_names)):
+                return None
+
+        var_names = sorted(var_names)
+        placeholders = dict()
+        placeholder_data = dict()
+        for index, var_name in enumerate(var_names):
+            placeholder = SKELETON_PLACEHOLDER_PREFIX + str(index)
+            placeholders[placeholder] = TemplatePlaceholder(var_name)
+            placeholder_data[var_name] = placeholder
+
+        try:
+            template_dict = template._decode_to_dict(
+                template._replace_vars_with_kwargs(**placeholder_data))
+        except TemplateError:
+            return None
+
+        try:
+            template_dict = TemplateSkeleton._insert_placeholders(
+                template_dict, placeholders)
+        except ValueError:
+            return None
+
+        return TemplateSkeleton(template_dict, frozenset(var_names))
+
+    def can_bind(self, data):
+        """
+        Returns True if binding the data gives exactly the same result as
+        rendering and decoding the template.
+        """
+        for var_name in self.var_names:
+            if (var_name not in data or
+                    not self._is_bindable_value(data[var_name])):
+                return False
+
+        return True
+
+    def bind(self, data):
+        """
+        Returns the template dictionary with the data substituted.
+        """
+        return self._bind_value(self.template_dict, data)
+
+    @staticmethod
+    def _is_static_output(node, var_names):
+        for child in node.nodes:
+            if type(child) == jinja2.nodes.TemplateData:
+                continue
+
+            # Every substitution is wrapped by the tojson filter of the
+            # render environment.  Anything else depends on the data.
+            if (type(child) != jinja2.nodes.Filter or
+                    child.name != "tojson" or
+                    child.args or child.kwargs or
+                    child.dyn_args is not None or
+                    child.dyn_kwargs is not None or
+                    type(child.node) != jinja2.nodes.Name):
+                return False
+
+            var_names.add(child.node.name)
+
+        return True
+
+    @staticmethod
+    def _insert_placeholders(value, placeholders):
+        if isinstance(value, dict):
+            new_dict = dict()
+            for key, item in value.items():
+                if (isinstance(key, six.string_types) and
+                        SKELETON_PLACEHOLDER_PREFIX in key):
+                    raise ValueError("Variable used as a key")
+                new_dict[key] = TemplateSkeleton._insert_placeholders(
+                    item, placeholders)
+            return new_dict
+        elif isinstance(value, list):
+            return [TemplateSkeleton._insert_placeholders(x, placeholders)
+                    for x in value]
+        elif isinstance(value, six.string_types):
+            if value in placeholders:
+                return placeholders[value]
+            if SKELETON_PLACEHOLDER_PREFIX in value:
+                raise ValueError("Variable used within a string")
+
+        return value
+
+    def _is_bindable_value(self, value):
+        # Only values which survive the JSON encoding of the render and the
+        # decoding of the template unchanged can be bound directly
+        if value is None or value is True or value is False:
+            return True
+        if type(value) in six.integer_types:
+            return True
+        if isinstance(value, six.string_types):
+            # Characters outside of the basic plane are encoded as
+            # surrogate pairs which YAML does not recombine
+            return len(value) == 0 or max(value) <= u"\uffff"
+        if type(value) == list:
+            for item in value:
+                if not self._is_bindable_value(item):
+                    return False
+            return True
+
+        return False
+
+    def _bind_value(self, value, data):
+        if isinstance(value, dict):
+            new_dict = dict()
+            for key, item in value.items():
+                new_dict[key] = self._bind_value(item, data)
+            return new_dict
+        elif isinstance(value, list):
+            return [self._bind_value(x, data) for x in value]
+        elif isinstance(value, TemplatePlaceholder):
+            return self._copy_value(data[value.var_name])
+
+        return value
+
+    def _copy_value(self, value):
+        if type(value) == list:
+            return [self._copy_value(x) for x in value]
+
+        return value
+
+
+class TemplateDataValidator(object):
+    """
+    Validates template data against the variables of a template.  The
+    variable definitions are compiled once so that each record is checked
+    without looking up fields or parsing ranges again.
+    """
+    def __init__(self, template):
+        self.template_name = template.get_name()
+        self.variables = dict()
+        self.required = list()
+
+        for variable in template.variables:
+            var_name = template._get_required_field(variable, "name")
+            self.variables[var_name] = self._compile_variable(template,
+                                                              variable)
+
+        for var_name in self.variables:
+            if self.variables[var_name]["optional"] is not True:
+                self.required.append(var_name)
+
+    def validate(self, data):
+        for var_name, value in data.items():
+            if var_name not in self.variables:
+                # No variable definition for given data.  Extra variables
+                # are ok.
+                continue
+
+            var_info = self.variables[var_name]
+            if var_info["is_list"]:
+                if type(value) != list:
+                    self._raise_value_error(var_name, "is not a list")
+
+                for item in value:
+                    self._validate_value(var_info, var_name, item)
+            else:
+                self._validate_value(var_info, var_name, value)
+
+        missing = [x for x in self.required if x not in data]
+        if len(missing) > 0:
+            raise UndefinedVariableError(
+                "In template %s, missing required variables: %s" %
+                (self.template_name, ', '.join(missing)))
+
+    def _compile_variable(self, template, variable):
+        var_type = template._get_required_field(variable, "type").lower()
+        is_list = var_type == "list"
+        if is_list:
+            var_type = template._get_required_field(variable,
+                                                    "item-type").lower()
+
+        var_info = {
+            "type": var_type,
+            "is_list": is_list,
+            "optional": get_dict_field_no_case(variable, "optional"),
+            "allow_integer": get_dict_field_no_case(
+                variable, "allow-integer") is True,
+            "ranges": None,
+            "choices": None}
+
+        if var_type in ["integer", "float"]:
+            var_info["ranges"] = self._compile_ranges(
+                get_dict_field_no_case(variable, "range"))
+        elif var_type == "choice":
+            choices = template._get_required_field(variable, "choices")
+            var_info["choices"] = frozenset(
+                [x.upper() for x in choices
+                 if isinstance(x, six.string_types)])
+
+        return var_info
+
+    def _compile_ranges(self, ranges):
+        if ranges is None:
+            return None
+
+        if type(ranges) != list:
+            ranges = [ranges]
+
+        # Each range is compiled to (low, high), or to None if the range is
+        # invalid.  Other values must match exactly.  Invalid ranges are only
+        # reported when a value is checked against them.
+        compiled = list()
+        for r in ranges:
+            if isinstance(r, str):
+                try:
+                    low, high = r.split("..")
+                    low = float(low)
+                    high = float(high)
+                    if high < low:
+                        raise ValueError("High of range greater than low")
+                    compiled.append((True, (low, high)))
+                except ValueError:
+                    compiled.append((True, None))
+            else:
+                compiled.append((False, r))
+
+        return compiled
+
+    def _validate_value(self, var_info, var_name, value):
+        var_type = var_info["type"]
+        if var_type in JSON_SCHEMA_STRING_TYPES:
+            if not isinstance(value, six.string_types):
+                if not var_info["allow_integer"] or type(value) != int:
+                    self._raise_value_error(var_name, "is not a string")
+        elif var_type == "integer":
+            if type(value) != int:
+                self._raise_value_error(var_name, "is not an integer")
+            self._validate_range(var_info, var_name, value)
+        elif var_type == "float":
+            if type(value) != int and type(value) != float:
+                self._raise_value_error(var_name, "is not a float")
+            self._validate_range(var_info, var_name, value)
+        elif var_type == "boolean":
+            if value is not True and value is not False:
+                self._raise_value_error(var_name, "is not a boolean")
+        elif var_type == "choice":
+            if not isinstance(value, six.string_types):
+                self._raise_value_error(var_name, "is not a string")
+            if value.upper() not in var_info["choices"]:
+                self._raise_value_error(var_name, "is not a valid choice")
+
+    def _validate_range(self, var_info, var_name, value):
+        ranges = var_info["ranges"]
+        if ranges is None:
+            return
+
+        for is_range, r in ranges:
+            if not is_range:
+                if r == value:
+                    return
+            elif r is None:
+                self._raise_value_error(
+                    var_name, "invalid range, format is <low>..<high>")
+            elif value >= r[0] and value <= r[1]:
+                return
+
+        self._raise_value_error(var_name, "is not in valid range")
+
+    def _raise_value_error(self, var_name, message):
+        raise VariableValueError("In template %s, variable %s: %s" % (
+            self.template_name, var_name, message))
+
+
 class NullUndefined(jinja2.Undefined):
     """
     Renders undefined template variables as null
@@ -2,6 +2,7 @@ import json
 import os
 import re
 import requests
+import threading
 
 from bambou.exceptions import BambouHTTPError
 from .bambou_adapter import (ConfigObject, EnterpriseFetcher, Fetcher, Root,
@@ -77,6 +78,76 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
         self.spec_paths = list()
         self.read_spec_paths = list()
         self.query_cache = dict()
+        self.bulk_fetch = False
+        self.plan_only = False
+        self.plan = list()
+        self.cascade_delete = False
+        self.cascade_delete_types = None
+        self.call_estimate = dict()
+        # Object lists a validate only session estimated were fetched, keyed
+        # by parent object and object name
+        self.estimated_lists = dict()
+        # Guards the cache, plan and estimate when objects are written by
+        # concurrent threads
+        self.lock = threading.Lock()
+
+    def set_bulk_fetch(self, value=True):
+        """
+        When set, objects are selected from lists fetched once per parent and
+        object type instead of fetching each object individually.  Existing
+        objects are only saved when their values are changed.
+        """
+        self.bulk_fetch = value
+
+    def set_plan_only(self, value=True):
+        """
+        When set, the objects to create, update and delete are recorded in
+        a plan instead of being written to the VSD.  Existing objects are
+        fetched in bulk as with set_bulk_fetch.  The plan is available from
+        get_plan() after the session is stopped.
+        """
+        self.plan_only = value
+
+    def get_plan(self):
+        """
+        Returns the plan recorded by the last session in plan only mode as a
+        list of dicts with keys action (create, update, delete, assign,
+        unassign or no-op), object, parent (None for assignments) and the
+        attributes changed.
+        """
+        return self.plan
+
+    def get_call_estimate(self):
+        """
+        Returns an estimate of the HTTP calls to the VSD made when writing
+        the configuration of the last session in validate only mode.  This
+        takes bulk fetch, coalesced selects and plan only mode, which only
+        reads from the VSD, into account.  Existing objects are counted as
+        saved even when fetched in bulk, where they are only saved when
+        changed.  The estimate is a list of dicts with keys method (GET,
+        POST, PUT or DELETE), object and count.
+        """
+        return [{"method": method, "object": object_name, "count": count}
+                for (method, object_name), count in
+                sorted(self.call_estimate.items())]
+
+    def set_cascade_delete(self, value=True, cascade_delete_types=None):
+        """
+        When set, children which the VSD deletes along with their parent
+        are not deleted separately when reverting.  By default these are the
+        children with a child relationship in the API specification of the
+        parent.  Instead, a dict can be provided with object names as keys
+        and lists of the child object names deleted along with them as
+        values.  A list containing "*" includes all children.
+        """
+        self.cascade_delete = value
+        if cascade_delete_types is None:
+            self.cascade_delete_types = None
+        else:
+            self.cascade_delete_types = dict()
+            for object_name, child_names in cascade_delete_types.items():
+                self.cascade_delete_types[object_name.lower()] = [
+                    x.lower() for x in child_names]
 
     def set_session_params(self, url, username="csproot",
                            password=None, enterprise="csp",
@@ -233,6 +304,9 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
                 self.session._root_object = Root(
                     self.specs[self.root_spec_name],
                     self.specs["enterprise"])
+                self.call_estimate = dict()
+                self.estimated_lists = dict()
+                self._estimate_call("GET", self.specs[self.root_spec_name])
             else:
                 self.session.start()
 
@@ -244,6 +318,7 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
             e.reraise_with_location(location)
 
         self.query_cache = dict()
+        self.plan = list()
 
     def stop_session(self):
         """
@@ -272,6 +347,10 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
                                                  by_field,
                                                  select_value,
                                                  context)
+                if self._is_bulk_fetch():
+                    # The fetched object has the current values to compare
+                    return new_context
+
                 selectedId = new_context.current_object.id
 
                 new_context = self._get_new_child_context(context)
@@ -334,6 +413,39 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
 
         return new_context
 
+    def coalesce_selects(self, object_name, by_field, context=None):
+        """
+        Fetches the list of objects of the specified type in the current
+        context once so that the following selects of these objects are
+        answered from the list instead of each fetching its object.
+        """
+        location = "Coalesce selects %s %s [%s]" % (object_name, by_field,
+                                                    context)
+        self.log.debug(location)
+        self._check_session()
+
+        if self.validate_only is True:
+            parent_object = self._get_new_child_context(context).parent_object
+            try:
+                self._estimate_list_fetch(object_name, parent_object)
+            except DeviceWriterError as e:
+                e.reraise_with_location(location)
+            return
+
+        if self._is_bulk_fetch():
+            return
+
+        try:
+            parent_object = self._get_new_child_context(context).parent_object
+            if parent_object is not None and parent_object.id is None:
+                # The parent has not been written, it has no children yet
+                return
+            self._get_object_list_with_cache(object_name, parent_object)
+        except BambouHTTPError as e:
+            raise VsdError(e, location)
+        except DeviceWriterError as e:
+            e.reraise_with_location(location)
+
     def get_object_list(self, object_name, context=None):
         """
         Gets a list of objects of specified type in the current context
@@ -364,6 +476,136 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
 
         return contexts
 
+    def select_object_by_fields(self, object_name, by_fields, values,
+                                context=None):
+        """
+        Selects the object in the current context with each of the list of
+        by_fields equal to the corresponding value.  The objects are fetched
+        once, or taken from the objects fetched in bulk or for coalesced
+        selects, and compared locally.  Returns None for parents only planned.
+        """
+        location = "Select object %s %s = %s [%s]" % (object_name,
+                                                      by_fields,
+                                                      values,
+                                                      context)
+        self.log.debug(location)
+        self._check_session()
+
+        try:
+            new_context = self._get_new_child_context(context)
+            parent_object = new_context.parent_object
+            if self.validate_only is True:
+                spec = self._get_specification(object_name)
+                self._get_fetcher(object_name, parent_object)
+                for field in by_fields:
+                    self._get_attribute_name(spec, field)
+                self._estimate_select(object_name, parent_object)
+                new_context.current_object = self._get_new_config_object(
+                    object_name)
+                new_context.object_exists = True
+                return new_context
+
+            if parent_object is not None and parent_object.id is None:
+                return None
+
+            if (self._is_bulk_fetch() or
+                    self._is_object_list_cached(object_name, parent_object)):
+                objects = self._get_object_list_with_cache(object_name,
+                                                           parent_object)
+            else:
+                objects = self._get_object_list(object_name, parent_object)
+
+            matches = list()
+            for current_object in objects:
+                object_values = [self._get_attribute(current_object, x)
+                                 for x in by_fields]
+                if object_values == list(values):
+                    matches.append(current_object)
+
+            if len(matches) == 0:
+                raise MissingSelectionError(
+                    "No object matches selection criteria")
+            if len(matches) > 1:
+                raise MultipleSelectionError(
+                    "Multiple objects match selection criteria")
+        except BambouHTTPError as e:
+            raise VsdError(e, location)
+        except DeviceWriterError as e:
+            e.reraise_with_location(location)
+
+        new_context.current_object = matches[0]
+        new_context.object_exists = True
+
+        return new_context
+
+    def get_object_list_by_child(self, object_name, child_object_name,
+                                 by_field, value, context=None):
+        """
+        Gets the objects of type object_name in the current context which
+        have children of type child_object_name with by_field equal to value.
+        When the VSD lists these children under the current context, they are
+        found with a single fetch filtered by the value instead of searching
+        each object.  Returns a list of (context, child count) tuples, or
+        None when the children can not be found this way.
+        """
+        location = "Get object list %s by child %s %s = %s [%s]" % (
+            object_name, child_object_name, by_field, value, context)
+        self.log.debug(location)
+        self._check_session()
+
+        if self._is_bulk_fetch():
+            # Children only planned or cached are not found by the VSD
+            return None
+
+        try:
+            parent_object = self._get_new_child_context(context).parent_object
+            if (self.validate_only is False and parent_object is not None and
+                    parent_object.id is None):
+                return None
+
+            spec = self._get_specification(object_name)
+            child_spec = self._get_specification(child_object_name)
+            if parent_object is None:
+                parent_spec = self.session.root_object.spec
+            else:
+                parent_spec = parent_object.spec
+            # The children are matched to the objects by their parent id,
+            # which is only the id of the object for a child relationship
+            if (not self._is_child_object(parent_spec, child_spec) or
+                    not self._is_child_relationship(spec, child_spec)):
+                return None
+
+            remote_name = self._get_attribute_name(child_spec, by_field)
+            objects = self._get_object_list(object_name, parent_object)
+            fetcher = self._get_fetcher(child_object_name, parent_object)
+            if self.validate_only is True:
+                self._estimate_call("GET", child_spec)
+                new_context = self._get_new_child_context(context)
+                new_context.current_object = objects[0]
+                new_context.object_exists = True
+                return [(new_context, 1)]
+
+            selector = '%s is "%s"' % (remote_name, value)
+            child_counts = dict()
+            for child_object in fetcher.get(filter=selector):
+                parent_id = child_object.parent_id
+                child_counts[parent_id] = child_counts.get(parent_id, 0) + 1
+
+            contexts = list()
+            for current_object in objects:
+                child_count = child_counts.get(current_object.id, 0)
+                if child_count > 0:
+                    new_context = self._get_new_child_context(context)
+                    new_context.current_object = current_object
+                    new_context.object_exists = True
+                    contexts.append((new_context, child_count))
+        except BambouHTTPError as e:
+            raise VsdError(e, location)
+        except DeviceWriterError as e:
+            e.reraise_with_location(location)
+
+        return contexts
+
     def delete_object(self, context):
         """
         Deletes the object selected in the current context
@@ -376,12 +618,18 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
                 not context.object_exists):
             raise SessionError("No object for deletion", location)
 
-        if self.validate_only is False:
+        self._record_plan("delete", context)
+        self._estimate_call("DELETE", context.current_object.spec)
+        if self._is_writing():
             try:
                 context.current_object.delete()
             except BambouHTTPError as e:
                 raise VsdError(e, location)
 
+        # Keeps the objects fetched in bulk or for coalesced selects current
+        self._remove_from_object_list_cache(context.current_object,
+                                            context.parent_object)
+
         context.current_object = None
         context.object_exists = False
 
@@ -399,7 +647,8 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
             raise SessionError("No object for setting values", location)
 
         try:
-            is_changed = self._set_attributes(context.current_object, **kwargs)
+            changed_attributes = self._set_attributes(context.current_object,
+                                                      **kwargs)
             self._validate_values(context.current_object,
                                   skip_required_check=context.object_exists)
         except DeviceWriterError as e:
@@ -408,18 +657,23 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
         if context.object_exists:
             location = "Saving [%s]" % context
             self.log.debug(location)
-            if is_changed:
-                if self.validate_only is False:
+            self._estimate_call("PUT", context.current_object.spec)
+            if len(changed_attributes) > 0:
+                self._record_plan("update", context, changed_attributes)
+                if self._is_writing():
                     try:
                         context.current_object.save()
                     except BambouHTTPError as e:
                         raise VsdError(e, location)
             else:
+                self._record_plan("no-op", context)
                 self.log.debug("No change to existing object,"
                                " save skipped [%s]" % context)
         else:
             location = "Creating child [%s]" % context
             self.log.debug(location)
+            self._record_plan("create", context, changed_attributes)
+            self._estimate_call("POST", context.current_object.spec)
             try:
                 self._add_object(context.current_object, context.parent_object)
             except BambouHTTPError as e:
@@ -483,6 +737,24 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
     def does_object_exist(self, context=None):
         return context is not None and context.object_exists
 
+    def is_cascade_delete(self, object_name, child_object_name):
+        if self.cascade_delete is False:
+            return False
+
+        if self.cascade_delete_types is not None:
+            child_names = self.cascade_delete_types.get(object_name.lower(),
+                                                        [])
+            return ("*" in child_names or
+                    child_object_name.lower() in child_names)
+
+        try:
+            spec = self._get_specification(object_name)
+            child_spec = self._get_specification(child_object_name)
+        except InvalidObjectError:
+            return False
+
+        return self._is_child_relationship(spec, child_spec)
+
     def connect(self, *args):
         """
         Creates a new connection with another device
@@ -656,6 +928,22 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
                                  (parent_spec['model']['entity_name'],
                                   child_spec['model']['entity_name']))
 
+    def _is_child_object(self, parent_spec, child_spec):
+        try:
+            self._check_child_object(parent_spec, child_spec)
+            return True
+        except InvalidObjectError:
+            return False
+
+    @staticmethod
+    def _is_child_relationship(parent_spec, child_spec):
+        child_rest_name = child_spec['model']['rest_name']
+        for child_section in parent_spec['children']:
+            if child_section['rest_name'] == child_rest_name:
+                return child_section.get('relationship') == "child"
+
+        return False
+
     def _get_new_child_context(self, old_context):
         new_context = Context()
         if old_context is not None:
@@ -683,15 +971,18 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
             return Fetcher(parent_object, spec)
 
     def _add_object(self, obj, parent_object=None):
+        original_parent = parent_object
         if parent_object is None:
             parent_object = self.session.root_object
 
         self._check_child_object(parent_object.spec, obj.spec)
 
-        if self.validate_only is False:
+        if self._is_writing():
             parent_object.current_child_name = obj.__resource_name__
             parent_object.create_child(obj)
 
+        self._add_to_object_list_cache(obj, original_parent)
+
     def _select_object(self, object_name, by_field, field_value,
                        parent_object=None):
 
@@ -700,10 +991,16 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
         remote_name = self._get_attribute_name(spec, by_field)
 
         if self.validate_only is True:
+            self._estimate_select(object_name, parent_object)
             return self._get_new_config_object(object_name)
 
-        selector = '%s is "%s"' % (remote_name, field_value)
-        objects = fetcher.get(filter=selector)
+        if (self._is_bulk_fetch() or
+                self._is_object_list_cached(object_name, parent_object)):
+            objects = self._find_objects(object_name, by_field, field_value,
+                                         parent_object)
+        else:
+            selector = '%s is "%s"' % (remote_name, field_value)
+            objects = fetcher.get(filter=selector)
         if len(objects) == 0:
             raise MissingSelectionError("No %s object exists with %s = %s" %
                                         (object_name, by_field, field_value))
@@ -716,10 +1013,11 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
 
     def _get_object_list(self, object_name, parent_object=None):
 
-        self._get_specification(object_name)
+        spec = self._get_specification(object_name)
         fetcher = self._get_fetcher(object_name, parent_object)
 
         if self.validate_only is True:
+            self._estimate_call("GET", spec)
             return [self._get_new_config_object(object_name)]
 
         objects = fetcher.get()
@@ -727,15 +1025,18 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
         return objects
 
     def _set_attributes(self, obj, **kwargs):
-        is_changed = False
+        changed_attributes = dict()
         for field, value in kwargs.items():
             local_name = field.lower()
             if not self._is_assign_attribute(local_name):
                 self._get_attribute_name(obj.spec, field)
+                # Only fetched objects have current values to compare
+                if (not self._is_bulk_fetch() or
+                        getattr(obj, local_name, None) != value):
+                    changed_attributes[field] = value
                 setattr(obj, local_name, value)
-                is_changed = True
 
-        return is_changed
+        return changed_attributes
 
     def _get_attribute(self, obj, field):
         self._get_attribute_name(obj.spec, field)
@@ -748,7 +1049,7 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
         if value is not None:
             return value
 
-        if self.validate_only is True:
+        if self.validate_only is True or (self.plan_only and obj.id is None):
             attr_type = self._get_attribute_type(obj.spec, field)
             return self._get_placeholder_validation_value(attr_type)
         else:
@@ -769,12 +1070,17 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
         child_spec = self._find_child_assign_spec(parent_object.spec,
                                                   rest_name)
         child_name = child_spec['model']['entity_name']
-        existing_objects = self._get_object_list(child_name, parent_object)
+        existing_objects = self._get_assigned_objects(child_name,
+                                                      parent_object)
 
         new_objects = self._create_assign_objects(existing_objects, new_ids,
                                                   child_name)
 
-        if (self.validate_only is not True and
+        if len(new_objects) > len(existing_objects):
+            self._record_plan("assign", parent_object, {local_name: new_ids})
+            self._estimate_call("PUT", child_spec)
+
+        if (self._is_writing() and
                 len(new_objects) > len(existing_objects)):
             parent_object.current_child_name = (
                 child_spec['model']['resource_name'])
@@ -812,12 +1118,21 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
         child_spec = self._find_child_assign_spec(parent_object.spec,
                                                   rest_name)
         child_name = child_spec['model']['entity_name']
-        existing_objects = self._get_object_list(child_name, parent_object)
+        existing_objects = self._get_assigned_objects(child_name,
+                                                      parent_object)
 
         new_objects = self._create_unassign_objects(existing_objects, new_ids,
                                                     child_name)
 
-        if (self.validate_only is not True and
+        # The objects assigned are not known when validating
+        if (len(new_objects) < len(existing_objects) or
+                self.validate_only is True):
+            self._estimate_call("PUT", child_spec)
+        if len(new_objects) < len(existing_objects):
+            self._record_plan("unassign", parent_object,
+                              {local_name: new_ids})
+
+        if (self._is_writing() and
                 len(new_objects) < len(existing_objects)):
             parent_object.current_child_name = (
                 child_spec['model']['resource_name'])
@@ -944,21 +1259,153 @@ class VsdWriter(DeviceWriterBase, DeviceReaderBase):
 
     def _get_object_list_with_cache(self, object_name, parent_object):
 
-        if parent_object is None:
-            cache_key = "root:" + object_name.lower()
-        else:
-            cache_key = parent_object.id + ":" + object_name.lower()
+        cache_key = self._get_cache_key(object_name, parent_object)
 
-        if cache_key in self.query_cache:
-            return self.query_cache[cache_key]
+        with self.lock:
+            if cache_key in self.query_cache:
+                return self.query_cache[cache_key]
 
         object_list = self._get_object_list(object_name,
                                             parent_object)
 
-        self.query_cache[cache_key] = list(object_list)
+        with self.lock:
+            # Another thread may have fetched and changed the list meanwhile
+            if cache_key in self.query_cache:
+                return self.query_cache[cache_key]
+            self.query_cache[cache_key] = list(object_list)
 
         return object_list
 
+    @staticmethod
+    def _get_cache_key(object_name, parent_object):
+        if parent_object is None:
+            return "root:" + object_name.lower()
+        else:
+            return parent_object.id + ":" + object_name.lower()
+
+    def _is_object_list_cached(self, object_name, parent_object):
+        if parent_object is not None and parent_object.id is None:
+            return False
+
+        return (self._get_cache_key(object_name, parent_object) in
+                self.query_cache)
+
+    def _add_to_object_list_cache(self, obj, parent_object):
+        if parent_object is not None and parent_object.id is None:
+            return
+
+        cache_key = self._get_cache_key(obj.get_name(), parent_object)
+        with self.lock:
+            if cache_key in self.query_cache:
+                self.query_cache[cache_key].append(obj)
+
+    def _remove_from_object_list_cache(self, obj, parent_object):
+        if parent_object is not None and parent_object.id is None:
+            return
+
+        cache_key = self._get_cache_key(obj.get_name(), parent_object)
+        with self.lock:
+            if cache_key in self.query_cache:
+                self.query_cache[cache_key] = [
+                    x for x in self.query_cache[cache_key] if x is not obj]
+
+    def _find_objects(self, object_name, by_field, field_value,
+                      parent_object):
+        if parent_object is not None and parent_object.id is None:
+            # The parent is only planned, it has no children yet
+            return list()
+
+        local_name = by_field.lower()
+        objects = self._get_object_list_with_cache(object_name,
+                                                   parent_object)
+
+        return [x for x in objects
+                if self._is_same_value(getattr(x, local_name, None),
+                                       field_value)]
+
+    @staticmethod
+    def _is_same_value(value, field_value):
+        if value == field_value:
+            return True
+
+        # Selection filters are compared as strings by the VSD
+        return value is not None and str(value) == str(field_value)
+
+    def _get_assigned_objects(self, child_name, parent_object):
+        if (self.plan_only and self.validate_only is False and
+                parent_object.id is None):
+            # The parent is only planned, nothing is assigned yet
+            return list()
+
+        return self._get_object_list(child_name, parent_object)
+
+    def _is_bulk_fetch(self):
+        return self.bulk_fetch or self.plan_only
+
+    def _is_writing(self):
+        return self.validate_only is False and self.plan_only is False
+
+    def _estimate_call(self, method, spec):
+        if self.validate_only is not True:
+            return
+
+        if self.plan_only and method != "GET":
+            # Changes are only recorded in the plan
+            return
+
+        key = (method, spec["model"]["entity_name"])
+        with self.lock:
+            self.call_estimate[key] = self.call_estimate.get(key, 0) + 1
+
+    def _estimate_select(self, object_name, parent_object):
+        if self._is_bulk_fetch() or self._is_estimated_list(object_name,
+                                                            parent_object):
+            self._estimate_list_fetch(object_name, parent_object)
+        else:
+            self._estimate_call("GET", self._get_specification(object_name))
+
+    def _estimate_list_fetch(self, object_name, parent_object):
+        # Only the first fetch of a list is sent to the VSD, later ones are
+        # answered from the cache
+        estimate_key = self._get_estimate_key(object_name, parent_object)
+        with self.lock:
+            if estimate_key in self.estimated_lists:
+                return
+            # The parent is kept so that its id is not reused
+            self.estimated_lists[estimate_key] = parent_object
+
+        self._estimate_call("GET", self._get_specification(object_name))
+
+    def _is_estimated_list(self, object_name, parent_object):
+        return (self._get_estimate_key(object_name, parent_object) in
+                self.estimated_lists)
+
+    @staticmethod
+    def _get_estimate_key(object_name, parent_object):
+        # Objects are only placeholders without ids when validating
+        return (id(parent_object), object_name.lower())
+
+    def _record_plan(self, action, context_or_object, attributes=None):
+        if not self.plan_only or self.validate_only is True:
+            return
+
+        if isinstance(context_or_object, Context):
+            obj = context_or_object.current_object
+            if context_or_object.parent_object is None:
+                parent = "Root"
+            else:
+                parent = str(context_or_object.parent_object)
+        else:
+            # Assignments are made to an object without its context
+            obj = context_or_object
+            parent = None
+
+        with self.lock:
+            self.plan.append({"action": action,
+                              "object": str(obj),
+                              "parent": parent,
+                              "attributes": dict(attributes or {})})
+
 #
 # Private classes to do the work
 #
@@ -63,6 +63,45 @@ actions:
 """)
 
 
+CREATE_OBJECTS_CASCADE_DELETE = yaml.safe_load("""
+actions:
+- Create-object:
+    Type: Level1
+    Actions:
+    - Set-values:
+        name: L1-O1
+    - Create-object:
+        Type: Level2
+        Actions:
+        - Set-values:
+            name: L2-O1
+        - Store-value:
+            As-name: store_1
+            from-field: id
+        - Create-object:
+            Type: Level3
+            Actions:
+            - Set-values:
+                name: L3-O1
+    - Select-object:
+        By-field: name
+        Type: Level2
+        Value: L2-O2
+        Actions:
+        - Set-values:
+            field1: value1
+    - Create-object:
+        Type: Level4
+        Actions:
+        - Set-values:
+            name: L4-O1
+        - Retrieve-value:
+            From-name: store_1
+            To-field: level2ID
+
+""")
+
+
 FIND_NO_SELECT = yaml.safe_load("""
 actions:
 - Select-object:
@@ -532,6 +571,39 @@ actions:
 """)
 
 
+ORDER_STORE_CYCLE = yaml.safe_load("""
+actions:
+- Select-object:
+    By-field: name
+    Type: Level1
+    Value: L1-O1
+    Actions:
+    - Store-value:
+        As-name: store_a
+        from-field: field1
+- Select-object:
+    By-field: name
+    Type: Level1
+    Value: L1-O2
+    Actions:
+    - Retrieve-value:
+        From-name: store_a
+        To-field: field1
+    - Store-value:
+        As-name: store_b
+        from-field: field2
+- Select-object:
+    By-field: name
+    Type: Level1
+    Value: L1-O1
+    Actions:
+    - Retrieve-value:
+        From-name: store_b
+        To-field: field2
+
+""")
+
+
 ORDER_STORE_4 = yaml.safe_load("""
 actions:
 - Create-object:
@@ -941,8 +1013,8 @@ actions:
     - field1
     - field2
     Value:
-    - value_5
-    - value_6
+    - value_1
+    - value_2
     Actions:
     - Create-object:
         Type: Level2
@@ -961,8 +1033,8 @@ actions:
     - field1
     - field2
     Value:
-    - value_7
-    - value_8
+    - value_3
+    - value_4
     Actions:
     - Create-object:
         Type: Level2
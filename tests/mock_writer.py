@@ -14,6 +14,9 @@ class MockWriter(object):
         self.mock_exception = None
         self.return_empty_select_list = False
         self.encode = False
+        self.cascade_delete_types = dict()
+        self.bulk_select = False
+        self.bulk_select_child_count = 1
 
     def get_recorded_actions(self):
         return self.recorded_actions
@@ -45,6 +48,17 @@ class MockWriter(object):
     def is_validate_only(self):
         return False
 
+    def set_cascade_delete_types(self, cascade_delete_types):
+        self.cascade_delete_types = cascade_delete_types
+
+    def is_cascade_delete(self, object_name, child_object_name):
+        return child_object_name in self.cascade_delete_types.get(object_name,
+                                                                  [])
+
+    def set_bulk_select(self, bulk_select=True, child_count=1):
+        self.bulk_select = bulk_select
+        self.bulk_select_child_count = child_count
+
     def set_return_empty_select_list(self, return_empty_select_list=True):
         self.return_empty_select_list = return_empty_select_list
 
@@ -102,6 +116,11 @@ class MockWriter(object):
                                                                str(context)))
         return self._new_context()
 
+    def coalesce_selects(self, object_name, by_field, context=None):
+        self._record_action("coalesce-selects %s %s [%s]" % (object_name,
+                                                             by_field,
+                                                             str(context)))
+
     def delete_object(self, context):
         """
         Deletes the object selected in the current context
@@ -158,6 +177,31 @@ class MockWriter(object):
         context_2 = self._new_context()
         return [context_1, context_2]
 
+    def select_object_by_fields(self, object_name, by_fields, values,
+                                context=None):
+        if not self.bulk_select:
+            return None
+
+        self._record_action("select-object %s %s = %s [%s]" % (
+            object_name, ",".join(by_fields), ",".join(values), str(context)))
+        return self._new_context()
+
+    def get_object_list_by_child(self, object_name, child_object_name,
+                                 by_field, value, context=None):
+        if not self.bulk_select:
+            return None
+
+        self._record_action("get-object-list %s by %s %s = %s [%s]" % (
+            object_name, child_object_name, by_field, str(value),
+            str(context)))
+
+        if self.return_empty_select_list:
+            return []
+
+        context_1 = self._new_context()
+        context_2 = self._new_context()
+        return [(context_1, self.bulk_select_child_count), (context_2, 1)]
+
     def does_object_exist(self, context):
         """
         Return is the object already exists on the device or not
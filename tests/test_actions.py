@@ -1,7 +1,13 @@
+from mock import MagicMock, patch
+import logging
 import os
 import pytest
+import re
+import threading
+import time
 
 from tests.action_test_params import (CREATE_FIELD_RETRIEVE_VALUE,
+                                      CREATE_OBJECTS_CASCADE_DELETE,
                                       CREATE_OBJECTS_DICT,
                                       CREATE_OBJECTS_NO_TYPE,
                                       CREATE_OBJECTS_SELECT_FIRST,
@@ -29,6 +35,7 @@ from tests.action_test_params import (CREATE_FIELD_RETRIEVE_VALUE,
                                       ORDER_STORE_3,
                                       ORDER_STORE_4,
                                       ORDER_STORE_5,
+                                      ORDER_STORE_CYCLE,
                                       RETRIEVE_AS_LIST,
                                       RETRIEVE_BEFORE_STORE,
                                       RETRIEVE_CONFLICT_1,
@@ -81,13 +88,20 @@ from tests.action_test_params import (CREATE_FIELD_RETRIEVE_VALUE,
                                       UPDATE_ROOT_OBJECT,
                                       UPDATE_ROOT_UPDATE_NOT_SUPPORTED_OBJECT,
                                       UPDATE_SELECT_ROOT_OBJECT)
-from nuage_metroae_config.actions import Action
+from nuage_metroae_config.actions import (Action,
+                                          COALESCE_SELECT_COUNT,
+                                          CreateObjectAction,
+                                          NO_CHILDREN,
+                                          NO_MARKS)
+from nuage_metroae_config.executor import ConcurrentExecutor
 from nuage_metroae_config.errors import (ConflictError,
                                          InvalidAttributeError,
                                          InvalidObjectError,
                                          MissingSelectionError,
+                                         MultipleSelectionError,
                                          TemplateActionError,
                                          TemplateParseError)
+from nuage_metroae_config.logger import Logger
 from .mock_writer import MockWriter
 from .template_test_params import (EXPECTED_ACL_TEMPLATE,
                                    EXPECTED_DOMAIN_TEMPLATE,
@@ -141,6 +155,16 @@ OVERRIDE_ORDERING_CASES = [
     (ORDER_OVERRIDE_2, ORDER_OVERRIDE_3, ORDER_OVERRIDE_1),
     (ORDER_OVERRIDE_3, ORDER_OVERRIDE_2, ORDER_OVERRIDE_1)]
 
+CONCURRENT_EXECUTE_CASES = [CREATE_OBJECTS_DICT,
+                            FIND_TREE,
+                            RETRIEVE_AS_LIST,
+                            STORE_RETRIEVE_DICT]
+
+INDEX_ORDERING_CASES = (CREATE_SELECT_ORDERING_CASES +
+                        CREATE_SELECT_MULTI_ORDERING_CASES +
+                        STORE_ORDERING_CASES +
+                        OVERRIDE_ORDERING_CASES)
+
 
 class TestActionsRead(object):
 
@@ -932,6 +956,48 @@ class TestActionsOrdering(object):
         assert current_action.attributes == {'name': 'L2-O1',
                                              'field1': store_action}
 
+    def test_store_cycle__invalid(self):
+        root_action = Action(None)
+
+        root_action.reset_state()
+        root_action.read_children_actions(ORDER_STORE_CYCLE)
+
+        with pytest.raises(TemplateActionError) as e:
+            root_action.reorder()
+
+        assert "Circular dependency" in str(e.value)
+        assert "store_a, store_b" in str(e.value)
+
+    def test_store_chain__success(self):
+        root_action = Action(None)
+        object_count = 300
+
+        for i in reversed(range(object_count)):
+            root_action.read_children_actions({"actions": [
+                {"create-object": {"type": "Level1",
+                                   "actions": [{"set-values": {
+                                       "name": "L1-O%d" % i}}]}}]})
+
+        # Each object retrieves the value stored by the one before it
+        root_action.reset_state()
+        for i in range(object_count):
+            actions = [{"store-value": {"as-name": "store_%d" % i,
+                                        "from-field": "field1"}}]
+            if i > 0:
+                actions.append({"retrieve-value": {
+                    "from-name": "store_%d" % (i - 1),
+                    "to-field": "field2"}})
+            root_action.read_children_actions({"actions": [
+                {"select-object": {"type": "Level1",
+                                   "by-field": "name",
+                                   "value": "L1-O%d" % i,
+                                   "actions": actions}}]})
+
+        root_action.reorder()
+
+        assert [x.get_select_value() for x in root_action.children] == [
+            "L1-O%d" % i for i in range(object_count)]
+
     def test_disable_combine__success(self):
         root_action = Action(None)
 
@@ -976,17 +1042,123 @@ class TestActionsOrdering(object):
             current_action = root_action.children[i].children[0]
             assert current_action.value == "L2-O" + str(i + 1)
 
+    @pytest.mark.parametrize("read_order", INDEX_ORDERING_CASES)
+    def test_combine_index__same_as_all_children(self, read_order):
+        root_action = Action(None)
+        for template in read_order:
+            root_action.reset_state()
+            root_action.read_children_actions(template)
+
+        with patch.object(Action, "_find_merge_candidates",
+                          lambda self, new_action: list(self.children)):
+            expected_action = Action(None)
+            for template in read_order:
+                expected_action.reset_state()
+                expected_action.read_children_actions(template)
+
+        assert str(root_action) == str(expected_action)
+
+    def test_combine_index__many_objects(self):
+        root_action = Action(None)
+        object_count = 500
+
+        for i in range(object_count):
+            root_action.reset_state()
+            root_action.read_children_actions(self.get_object_dict(i))
+
+        select_dict = self.get_object_dict(250)
+        select_dict["actions"][0]["select-object"]["actions"] = [
+            {"select-object": {
+                "type": "Level2",
+                "by-field": "name",
+                "value": "L2-O250",
+                "actions": [{"set-values": {"field2": "value"}}]}}]
+        original_same_object = CreateObjectAction.is_same_object
+        with patch.object(CreateObjectAction, "is_same_object",
+                          autospec=True,
+                          side_effect=original_same_object) as mock_same:
+            root_action.reset_state()
+            root_action.read_children_actions(select_dict)
+
+        # Only the matching object is compared, not every child
+        assert mock_same.call_count <= 2
+        assert len(root_action.children) == 1
+        assert len(root_action.children[0].children) == object_count
+        current_action = root_action.children[0].children[250]
+        assert current_action.children[0].attributes == {
+            'name': 'L2-O250', 'field1': 'value250', 'field2': 'value'}
+
+    def test_reorder__compact(self):
+        root_action = Action(None)
+        object_count = 100
+
+        for i in range(object_count):
+            root_action.reset_state()
+            root_action.read_children_actions(self.get_object_dict(i))
+        root_action.reorder()
+
+        actions = [root_action]
+        for template in [SAVE_TO_FILE, CREATE_OBJECTS_CASCADE_DELETE]:
+            other_action = Action(None)
+            other_action.read_children_actions(template)
+            other_action.reorder()
+            actions.append(other_action)
+
+        while len(actions) > 0:
+            current_action = actions.pop()
+            assert not hasattr(current_action, "__dict__")
+            assert current_action.child_index is None
+            if len(current_action.children) == 0:
+                assert current_action.children is NO_CHILDREN
+            if len(current_action.store_marks) == 0:
+                assert current_action.store_marks is NO_MARKS
+            actions.extend(current_action.children)
+
+        level_2_actions = root_action.children[0].children
+        assert level_2_actions[0].object_type is level_2_actions[1].object_type
+
+        # The index is built again when more children are read
+        select_dict = self.get_object_dict(50)
+        select_dict["actions"][0]["select-object"]["actions"] = [
+            {"select-object": {
+                "type": "Level2",
+                "by-field": "name",
+                "value": "L2-O50",
+                "actions": [{"set-values": {"field2": "value"}}]}}]
+        root_action.reset_state()
+        root_action.read_children_actions(select_dict)
+
+        assert len(root_action.children[0].children) == object_count
+        assert level_2_actions[50].children[0].attributes == {
+            'name': 'L2-O50', 'field1': 'value50', 'field2': 'value'}
+
+    def get_object_dict(self, index):
+        return {"actions": [
+            {"select-object": {
+                "type": "Level1",
+                "by-field": "name",
+                "value": "L1-O1",
+                "actions": [
+                    {"create-object": {
+                        "type": "Level2",
+                        "actions": [
+                            {"set-values": {
+                                "name": "L2-O%d" % index,
+                                "field1": "value%d" % index}}]}}]}}]}
+
 
 class TestActionsExecute(object):
 
     def run_execute_test(self, template_dict, expected_actions,
                          is_revert=False, is_update=False,
                          return_empty_select_list=False,
-                         encode=False):
+                         encode=False, cascade_delete_types=None):
         root_action = Action(None)
         writer = MockWriter()
         writer.set_return_empty_select_list(return_empty_select_list)
         writer.encode_data(encode)
+        if cascade_delete_types is not None:
+            writer.set_cascade_delete_types(cascade_delete_types)
 
         root_action.set_revert(is_revert)
         root_action.set_update(is_update)
@@ -1055,9 +1227,8 @@ class TestActionsExecute(object):
         expected_actions = """
             start-session
             select-object Enterprise name = test_enterprise [None]
-            select-object Enterprise name = test_enterprise [None]
-            unset-values name=test_enterprise [context_2]
-            delete-object [context_2]
+            unset-values name=test_enterprise [context_1]
+            delete-object [context_1]
             stop-session
         """
 
@@ -1088,13 +1259,10 @@ class TestActionsExecute(object):
             select-object DomainTemplate name = template_test_domain [context_1]
             get-value id [context_2]
             select-object Domain name = test_domain [context_1]
-            select-object Enterprise name = test_enterprise [None]
-            select-object Domain name = test_domain [context_4]
-            unset-values name=test_domain,templateID=value_1 [context_5]
-            delete-object [context_5]
-            select-object DomainTemplate name = template_test_domain [context_4]
-            unset-values name=template_test_domain [context_8]
-            delete-object [context_8]
+            unset-values name=test_domain,templateID=value_1 [context_3]
+            delete-object [context_3]
+            unset-values name=template_test_domain [context_2]
+            delete-object [context_2]
             stop-session
         """
 
@@ -1133,15 +1301,10 @@ class TestActionsExecute(object):
             get-value id [context_3]
             select-object IngressACLTemplate name = test_acl [context_2]
             select-object EgressACLTemplate name = test_acl [context_2]
-            select-object Enterprise name = test_enterprise [None]
-            select-object Domain name = test_domain [context_6]
-            select-object EgressACLTemplate name = test_acl [context_7]
-            unset-values defaultAllowIP=True,defaultAllowNonIP=False,defaultInstallACLImplicitRules=True,name=test_acl,priority=100 [context_8]
-            delete-object [context_8]
-            select-object IngressACLTemplate name = test_acl [context_7]
-            unset-values allowAddressSpoof=False,defaultAllowIP=True,defaultAllowNonIP=False,name=test_acl,priority=100 [context_11]
-            delete-object [context_11]
-            select-object Subnet name = test_subnet [context_7]
+            unset-values defaultAllowIP=True,defaultAllowNonIP=False,defaultInstallACLImplicitRules=True,name=test_acl,priority=100 [context_5]
+            delete-object [context_5]
+            unset-values allowAddressSpoof=False,defaultAllowIP=True,defaultAllowNonIP=False,name=test_acl,priority=100 [context_4]
+            delete-object [context_4]
             stop-session
         """
 
@@ -1176,6 +1339,46 @@ class TestActionsExecute(object):
         self.run_execute_test(CREATE_OBJECTS_DICT,
                               expected_actions, is_revert=True)
 
+    def test_create__revert_cascade_delete(self):
+
+        # Level3 is still selected to get to Level2 for its stored value, but
+        # neither is deleted before Level1
+        expected_actions = """
+            start-session
+            select-object Level1 name = L1-O1 [None]
+            select-object Level2 name = L2-O1 [context_1]
+            get-value id [context_2]
+            select-object Level3 name = L3-O1 [context_2]
+            select-object Level4 name = L4-O1 [context_1]
+            unset-values level2ID=value_1,name=L4-O1 [context_4]
+            delete-object [context_4]
+            unset-values name=L1-O1 [context_1]
+            delete-object [context_1]
+            stop-session
+        """
+
+        self.run_execute_test(CREATE_OBJECTS_CASCADE_DELETE,
+                              expected_actions, is_revert=True,
+                              cascade_delete_types={"Level1": ["Level2"]})
+
+    def test_create__revert_cascade_delete_all(self):
+
+        expected_actions = """
+            start-session
+            select-object Level1 name = L1-O1 [None]
+            select-object Level2 name = L2-O1 [context_1]
+            get-value id [context_2]
+            unset-values name=L1-O1 [context_1]
+            delete-object [context_1]
+            stop-session
+        """
+
+        self.run_execute_test(CREATE_OBJECTS_CASCADE_DELETE,
+                              expected_actions, is_revert=True,
+                              cascade_delete_types={
+                                  "Level1": ["Level2", "Level4"],
+                                  "Level2": ["Level3"]})
+
     def test_create__invalid_object(self):
 
         expected_actions = """
@@ -1224,12 +1427,6 @@ class TestActionsExecute(object):
             select-object Enterprise name = test_enterprise_2 [None]
             select-object DomainTemplate test_field_3 = test_value_3 [context_4]
             select-object Domain test_field_4 = test_value_4 [context_4]
-            select-object Enterprise name = test_enterprise_2 [None]
-            select-object Domain test_field_4 = test_value_4 [context_7]
-            select-object DomainTemplate test_field_3 = test_value_3 [context_7]
-            select-object Enterprise name = test_enterprise [None]
-            select-object Domain test_field_2 = test_value_2 [context_10]
-            select-object DomainTemplate test_field_1 = test_value_1 [context_10]
             stop-session
         """
 
@@ -1279,9 +1476,8 @@ class TestActionsExecute(object):
         expected_actions = """
             start-session
             select-object Enterprise field1 = value1 [None]
-            select-object Enterprise field1 = value1 [None]
-            unset-values field1=value1,field2=True,field4=4 [context_2]
-            delete-object [context_2]
+            unset-values field1=value1,field2=True,field4=4 [context_1]
+            delete-object [context_1]
             stop-session
         """
 
@@ -1334,18 +1530,14 @@ class TestActionsExecute(object):
             get-value id [context_2]
             select-object Domain name = domain1 [context_1]
             select-object Domain name = domain2 [context_1]
-            select-object Enterprise name = enterprise1 [None]
-            select-object Domain name = domain2 [context_5]
-            unset-values name=domain2,templateID=value_1 [context_6]
-            delete-object [context_6]
-            select-object Domain name = domain1 [context_5]
-            unset-values name=domain1,templateID=value_1 [context_9]
-            delete-object [context_9]
-            select-object DomainTemplate name = domain_template [context_5]
-            unset-values name=domain_template [context_12]
-            delete-object [context_12]
-            unset-values name=enterprise1 [context_5]
-            delete-object [context_5]
+            unset-values name=domain2,templateID=value_1 [context_4]
+            delete-object [context_4]
+            unset-values name=domain1,templateID=value_1 [context_3]
+            delete-object [context_3]
+            unset-values name=domain_template [context_2]
+            delete-object [context_2]
+            unset-values name=enterprise1 [context_1]
+            delete-object [context_1]
             stop-session
         """
 
@@ -1392,6 +1584,81 @@ class TestActionsExecute(object):
         self.run_execute_test(STORE_RETRIEVE_TO_OBJECT,
                               expected_actions)
 
+    def test_execute_twice__success(self):
+        root_action = Action(None)
+        root_action.read_children_actions(STORE_RETRIEVE_TO_OBJECT)
+        root_action.reorder()
+        stored_action = root_action.state["stored_values"]["template_id"]
+
+        recorded_actions = list()
+        for index in range(2):
+            writer = MockWriter()
+            root_action.reset_execution()
+            assert stored_action.stored_value is None
+            root_action.execute(writer)
+            recorded_actions.append(writer.get_recorded_actions())
+
+        assert recorded_actions[0] == recorded_actions[1]
+        assert "'entityID': 'value_1'" in recorded_actions[1][-1]
+
+    def test_execute__output_disabled(self):
+        root_action = Action(None)
+        root_action.read_children_actions(STORE_RETRIEVE_TO_OBJECT)
+        root_action.reorder()
+        # The output level as registered by metroae_config
+        logging.addLevelName(logging.ERROR + 5, "OUTPUT")
+        mock_logger = MagicMock()
+        mock_logger.isEnabledFor.return_value = False
+        actions = [root_action]
+        while len(actions) > 0:
+            current_action = actions.pop()
+            current_action.set_logger(mock_logger)
+            actions.extend(current_action.children)
+
+        with patch.object(CreateObjectAction, "_to_string") as mock_string:
+            root_action.execute(MockWriter())
+
+        mock_string.assert_not_called()
+        mock_logger.output.assert_not_called()
+
+    @pytest.mark.parametrize("select_count", [COALESCE_SELECT_COUNT - 1,
+                                              COALESCE_SELECT_COUNT])
+    def test_execute__coalesce_selects(self, select_count):
+        select_actions = [
+            {"select-object": {"type": "Level2", "by-field": "name",
+                               "value": "L2-O%d" % x}}
+            for x in range(select_count)]
+        select_actions.append(
+            {"select-object": {"type": "Level2", "by-field": "$position",
+                               "value": 0}})
+        select_actions.append(
+            {"select-object": {"type": "Other", "by-field": "name",
+                               "value": "O1"}})
+        template_dict = {"actions": [
+            {"select-object": {"type": "Level1", "by-field": "name",
+                               "value": "L1-O1",
+                               "actions": select_actions}}]}
+
+        root_action = Action(None)
+        root_action.read_children_actions(template_dict)
+        writer = MockWriter()
+        root_action.execute(writer)
+
+        recorded_actions = writer.get_recorded_actions()
+        assert recorded_actions[0] == ("select-object Level1 name = L1-O1 "
+                                       "[None]")
+        if select_count < COALESCE_SELECT_COUNT:
+            assert len([x for x in recorded_actions
+                        if x.startswith("coalesce-selects")]) == 0
+        else:
+            # Only the selects by the value of a field are coalesced
+            assert recorded_actions[1] == ("coalesce-selects Level2 name "
+                                           "[context_1]")
+            assert len([x for x in recorded_actions
+                        if x.startswith("coalesce-selects")]) == 1
+        assert len([x for x in recorded_actions
+                    if x.startswith("select-object Level2")]) == select_count
+
     def test_store_retrieve_to_object__not_set(self):
 
         with pytest.raises(ConflictError) as e:
@@ -1447,9 +1714,8 @@ class TestActionsExecute(object):
             get-object-list Level1 [None]
             select-object Level2 name = L2-O1 [context_1]
             get-object-list Level1 [None]
-            select-object Level2 name = L2-O1 [context_4]
-            unset-values name=L2-O1 [context_6]
-            delete-object [context_6]
+            unset-values name=L2-O1 [context_3]
+            delete-object [context_3]
             delete-object [context_4]
             stop-session
         """
@@ -1464,9 +1730,8 @@ class TestActionsExecute(object):
             get-object-list Level1 [None]
             select-object Level2 name = L2-O1 [context_2]
             get-object-list Level1 [None]
-            select-object Level2 name = L2-O1 [context_5]
-            unset-values name=L2-O1 [context_6]
-            delete-object [context_6]
+            unset-values name=L2-O1 [context_3]
+            delete-object [context_3]
             delete-object [context_5]
             stop-session
         """
@@ -1562,12 +1827,8 @@ class TestActionsExecute(object):
             select-object Find name = L2-O2 [context_1]
             select-object Level2 name = L2-O1 [context_1]
             select-object Find name = L2-O2 [context_1]
-            get-object-list Level1 [None]
-            select-object Find name = L2-O2 [context_6]
-            select-object Find name = L2-O2 [context_6]
-            select-object Level2 name = L2-O1 [context_6]
-            unset-values name=L2-O1 [context_10]
-            delete-object [context_10]
+            unset-values name=L2-O1 [context_4]
+            delete-object [context_4]
             stop-session
         """
 
@@ -1593,6 +1854,8 @@ class TestActionsExecute(object):
 
     def test_find_tree__revert(self):
 
+        # The deletion pass reuses the objects found by the $child searches
+        # of the store value pass instead of searching again
         expected_actions = """
             start-session
             get-object-list Level1 [None]
@@ -1602,15 +1865,8 @@ class TestActionsExecute(object):
             select-object Find name = L3-O2 [context_6]
             select-object Level3 name = L3-O1 [context_6]
             select-object Find name = L3-O2 [context_6]
-            get-object-list Level1 [None]
-            get-object-list Level2 [context_11]
-            select-object Find name = L3-O2 [context_13]
-            get-object-list Level2 [context_11]
-            select-object Find name = L3-O2 [context_16]
-            select-object Find name = L3-O2 [context_16]
-            select-object Level3 name = L3-O1 [context_16]
-            unset-values name=L3-O1 [context_20]
-            delete-object [context_20]
+            unset-values name=L3-O1 [context_9]
+            delete-object [context_9]
             stop-session
         """
 
@@ -1644,12 +1900,8 @@ class TestActionsExecute(object):
             select-object Find name = L2-O2 [context_1]
             select-object Level2 name = L2-O1 [context_1]
             select-object Find name = L2-O2 [context_1]
-            get-object-list Level1 [None]
-            select-object Find name = L2-O2 [context_6]
-            select-object Find name = L2-O2 [context_6]
-            select-object Level2 name = L2-O1 [context_6]
-            unset-values name=L2-O1 [context_10]
-            delete-object [context_10]
+            unset-values name=L2-O1 [context_4]
+            delete-object [context_4]
             stop-session
         """
 
@@ -1683,6 +1935,61 @@ class TestActionsExecute(object):
         assert "Could not find matching child selection" in str(e)
         assert "Find" in str(e)
 
+    def run_bulk_select(self, template_dict, child_count=1,
+                        return_empty_select_list=False):
+        root_action = Action(None)
+        writer = MockWriter()
+        writer.set_bulk_select(child_count=child_count)
+        writer.set_return_empty_select_list(return_empty_select_list)
+        root_action.read_children_actions(template_dict)
+        writer.start_session()
+        root_action.execute(writer)
+        writer.stop_session()
+        return writer.get_recorded_actions()
+
+    def test_find_single_level__bulk(self):
+        recorded_actions = self.run_bulk_select(FIND_SINGLE_LEVEL)
+
+        # The first object with a matching child is selected
+        assert recorded_actions == [
+            "start-session",
+            "get-object-list Level1 by Find name = L2-O2 [None]",
+            "create-object Level2 [context_1]",
+            "set-values name=L2-O1 [context_3]",
+            "select-object Find name = L2-O2 [context_1]",
+            "stop-session"]
+
+    def test_find_single_level__bulk_multiple(self):
+        with pytest.raises(MultipleSelectionError) as e:
+            self.run_bulk_select(FIND_SINGLE_LEVEL, child_count=2)
+
+        assert "Multiple Find objects exist with name = L2-O2" in str(e)
+
+    def test_find_single_level__bulk_not_found(self):
+        with pytest.raises(MissingSelectionError) as e:
+            self.run_bulk_select(FIND_SINGLE_LEVEL,
+                                 return_empty_select_list=True)
+
+        assert "Could not find matching child selection" in str(e)
+
+    def test_find_tree__bulk(self):
+        recorded_actions = self.run_bulk_select(FIND_TREE)
+
+        # Only the innermost search by a field value is done in bulk
+        assert recorded_actions[1:3] == [
+            "get-object-list Level1 [None]",
+            "get-object-list Level2 by Find name = L3-O2 [context_1]"]
+
+    def test_select_multiple__bulk(self):
+        recorded_actions = self.run_bulk_select(SELECT_MULTIPLE_SUCCESS_1)
+
+        assert recorded_actions == [
+            "start-session",
+            "select-object Level1 field1,field2 = value_1,value_2 [None]",
+            "create-object Level2 [context_1]",
+            "set-values name=L2-O1 [context_2]",
+            "stop-session"]
+
     def test_select_multiple__first_success(self):
 
         expected_actions = """
@@ -1708,14 +2015,9 @@ class TestActionsExecute(object):
             get-value field2 [context_1]
             get-value field1 [context_2]
             get-value field2 [context_2]
-            get-object-list Level1 [None]
-            get-value field1 [context_3]
-            get-value field2 [context_3]
-            get-value field1 [context_4]
-            get-value field2 [context_4]
-            select-object Level2 name = L2-O1 [context_3]
-            unset-values name=L2-O1 [context_5]
-            delete-object [context_5]
+            select-object Level2 name = L2-O1 [context_1]
+            unset-values name=L2-O1 [context_3]
+            delete-object [context_3]
             stop-session
         """
 
@@ -1748,14 +2050,9 @@ class TestActionsExecute(object):
             get-value field2 [context_1]
             get-value field1 [context_2]
             get-value field2 [context_2]
-            get-object-list Level1 [None]
-            get-value field1 [context_3]
-            get-value field2 [context_3]
-            get-value field1 [context_4]
-            get-value field2 [context_4]
-            select-object Level2 name = L2-O1 [context_4]
-            unset-values name=L2-O1 [context_5]
-            delete-object [context_5]
+            select-object Level2 name = L2-O1 [context_2]
+            unset-values name=L2-O1 [context_3]
+            delete-object [context_3]
             stop-session
         """
 
@@ -1781,11 +2078,6 @@ class TestActionsExecute(object):
             get-value field2 [context_1]
             get-value field1 [context_2]
             get-value field2 [context_2]
-            get-object-list Level1 [None]
-            get-value field1 [context_3]
-            get-value field2 [context_3]
-            get-value field1 [context_4]
-            get-value field2 [context_4]
             stop-session
         """
 
@@ -1814,11 +2106,8 @@ class TestActionsExecute(object):
             get-value objectId [context_1]
             select-object Object2 id = value_1 [None]
             select-object Level2 name = L2-O1 [context_2]
-            select-object Object2 id = value_1 [None]
-            select-object Level2 name = L2-O1 [context_4]
-            unset-values name=L2-O1 [context_5]
-            delete-object [context_5]
-            select-object Object1 name = value_1 [None]
+            unset-values name=L2-O1 [context_3]
+            delete-object [context_3]
             stop-session
         """
 
@@ -1860,12 +2149,10 @@ class TestActionsExecute(object):
             delete-object [context_4]
             unset-values other_id=value_1 [context_3]
             delete-object [context_3]
-            select-object Object1 name = L1-O1 [None]
-            select-object Object2 name = other_name [context_9]
-            unset-values name=other_name [context_10]
-            delete-object [context_10]
-            unset-values name=L1-O1 [context_9]
-            delete-object [context_9]
+            unset-values name=other_name [context_2]
+            delete-object [context_2]
+            unset-values name=L1-O1 [context_1]
+            delete-object [context_1]
             stop-session
         """
 
@@ -2123,3 +2410,112 @@ class TestActionsExecute(object):
                                         expect_error=False,
                                         is_update=True,
                                         return_empty_select_list=True)
+
+
+class DelayedWriter(MockWriter):
+    """
+    Mock writer which can be called from multiple threads and delays or
+    fails the actions matching the given strings.
+    """
+    def __init__(self, delays=None, failures=None):
+        super(DelayedWriter, self).__init__()
+        self.delays = delays or dict()
+        self.failures = failures or list()
+        self.lock = threading.Lock()
+        self.active_count = 0
+        self.max_active_count = 0
+
+    def _record_action(self, action_str):
+        with self.lock:
+            self.active_count += 1
+            self.max_active_count = max(self.active_count,
+                                        self.max_active_count)
+        for match, seconds in self.delays.items():
+            if match in action_str:
+                time.sleep(seconds)
+        with self.lock:
+            self.active_count -= 1
+            self.recorded_actions.append(action_str)
+        for match in self.failures:
+            if match in action_str:
+                raise InvalidAttributeError("Failed " + action_str)
+
+    def _new_context(self):
+        with self.lock:
+            return super(DelayedWriter, self)._new_context()
+
+    def _new_get_value(self):
+        with self.lock:
+            return super(DelayedWriter, self)._new_get_value()
+
+
+class TestActionsConcurrentExecute(object):
+
+    def run_execute(self, template_dict, writer, thread_count,
+                    is_revert=False):
+        root_action = Action(None)
+        logger = Logger()
+        logger.set_to_stdout("OUTPUT", enabled=False)
+        root_action.set_logger(logger)
+        root_action.set_revert(is_revert)
+        root_action.read_children_actions(template_dict)
+        root_action.reorder()
+        if thread_count > 1:
+            executor = ConcurrentExecutor(thread_count)
+            executor.execute(root_action, writer)
+        else:
+            root_action.execute(writer)
+
+        return logger
+
+    @staticmethod
+    def get_recorded_actions(writer):
+        # Contexts are numbered in the order objects are written
+        return sorted([re.sub(r"(context|value)_[0-9]+", r"\1", x)
+                       for x in writer.get_recorded_actions()])
+
+    @pytest.mark.parametrize("template_dict", CONCURRENT_EXECUTE_CASES)
+    @pytest.mark.parametrize("is_revert", [False, True])
+    def test_execute__same_as_sequential(self, template_dict, is_revert):
+        delays = {"Domain": 0.01, "test_select_1": 0.01}
+        writer = DelayedWriter(delays)
+        logger = self.run_execute(template_dict, writer, 1, is_revert)
+
+        concurrent_writer = DelayedWriter(delays)
+        concurrent_logger = self.run_execute(template_dict,
+                                             concurrent_writer, 4, is_revert)
+
+        assert (self.get_recorded_actions(concurrent_writer) ==
+                self.get_recorded_actions(writer))
+        assert concurrent_logger.get() == logger.get()
+
+    def test_execute__bounded(self):
+        writer = DelayedWriter({"create-object": 0.05})
+
+        self.run_execute(CREATE_OBJECTS_DICT, writer, 2)
+
+        assert len(writer.get_recorded_actions()) == 6
+        assert writer.max_active_count == 2
+
+    def test_store_retrieve__waits_for_store(self):
+        writer = DelayedWriter({"DomainTemplate": 0.05})
+
+        self.run_execute(STORE_RETRIEVE_DICT, writer, 4)
+
+        recorded_actions = writer.get_recorded_actions()
+        store_index = recorded_actions.index("get-value id [context_3]")
+        retrieve_indicies = [i for i, x in enumerate(recorded_actions)
+                             if "templateID" in x]
+        assert len(retrieve_indicies) == 2
+        assert store_index < min(retrieve_indicies)
+
+    def test_error__first_in_order(self):
+        writer = DelayedWriter({"name=domain1": 0.05},
+                               ["name=domain1", "name=domain2"])
+
+        with pytest.raises(InvalidAttributeError) as e:
+            self.run_execute(STORE_RETRIEVE_DICT, writer, 4)
+
+        assert "name=domain1" in str(e.value)
+        assert "In Domain" in e.value.get_display_string()
+        assert "stop-session" not in writer.get_recorded_actions()
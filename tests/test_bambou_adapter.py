@@ -933,6 +933,51 @@ class TestFetcher(object):
         assert 'enterprise not found' in str(e)
         assert parent_test_id in str(e)
 
+    @requests_mock.mock(kw="mock")
+    def test_find_all__pages(self, **kwargs):
+        mock = kwargs['mock']
+        session = start_session(mock)
+        fetcher = Fetcher(session.root_object, ENTERPRISE_SPEC_TEST)
+
+        resource_name = ENTERPRISE_SPEC_TEST["model"]["resource_name"]
+
+        mock.get(build_standard_mock_url(resource_name),
+                 [{"status_code": 200,
+                   "headers": {"X-Nuage-Count": "3", "X-Nuage-Page": "0"},
+                   "json": [{"name": "enterprise_1", "ID": "id1"},
+                            {"name": "enterprise_2", "ID": "id2"}]},
+                  {"status_code": 200,
+                   "headers": {"X-Nuage-Count": "3", "X-Nuage-Page": "1"},
+                   "json": [{"name": "enterprise_3", "ID": "id3"}]}])
+
+        objects = fetcher.get()
+
+        assert mock.call_count == 3
+        assert "X-Nuage-Page" not in mock.request_history[1].headers
+        assert mock.request_history[2].headers["X-Nuage-Page"] == "1"
+
+        assert [x.name for x in objects] == ["enterprise_1", "enterprise_2",
+                                             "enterprise_3"]
+
+    @requests_mock.mock(kw="mock")
+    def test_find_page__success(self, **kwargs):
+        mock = kwargs['mock']
+        session = start_session(mock)
+        fetcher = Fetcher(session.root_object, ENTERPRISE_SPEC_TEST)
+
+        resource_name = ENTERPRISE_SPEC_TEST["model"]["resource_name"]
+
+        mock.get(build_standard_mock_url(resource_name),
+                 status_code=200,
+                 headers={"X-Nuage-Count": "3", "X-Nuage-Page": "1"},
+                 json=[{"name": "enterprise_3", "ID": "id3"}])
+
+        objects = fetcher.get(page=1)
+
+        assert mock.call_count == 2
+        assert mock.last_request.headers["X-Nuage-Page"] == "1"
+        assert [x.name for x in objects] == ["enterprise_3"]
+
 
 class TestEnterpriseFetcher(object):
 
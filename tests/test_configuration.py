@@ -1,17 +1,42 @@
 from mock import call, patch, MagicMock
+import logging
 import os
 import pytest
 
 from nuage_metroae_config.actions import TemplateActionError
-from nuage_metroae_config.configuration import Configuration
+from nuage_metroae_config.configuration import Configuration, _Partitions
+from nuage_metroae_config.errors import JournalError
 from nuage_metroae_config.template import (MissingTemplateError,
                                            TemplateStore,
                                            VariableValueError)
+from tests.mock_writer import MockWriter
 
 FIXTURE_DIRECTORY = os.path.join(os.path.dirname(__file__), 'fixtures')
 VALID_TEMPLATE_DIRECTORY = os.path.join(FIXTURE_DIRECTORY,
                                         'valid_templates')
 
+ORDERED_TEMPLATE = """name: %s
+description: Selects an enterprise in order
+template-version: 1.0
+software-type: Nuage Networks VSD
+software-version: 5.0.2
+variables:
+  - name: enterprise_name
+    type: reference
+actions:
+  - select-object:
+      type: Enterprise
+      by-field: name
+      value: {{ enterprise_name }}
+      order: %d
+      actions:
+        - create-object:
+            type: Domain
+            actions:
+              - set-values:
+                  name: %s
+"""
+
 
 def load_standard_configuration():
     store = TemplateStore()
@@ -262,7 +287,7 @@ class TestConfigurationApplyRevert(object):
 
         self.mock_store.reset_mock()
 
-    def verify_mock_calls(self, mock_patch):
+    def verify_mock_calls(self, mock_patch, execute_count=1):
         mock_patch.assert_called_once_with(None)
         self.mock_store.get_template.assert_has_calls([
             call("enterprise", None, None),
@@ -280,9 +305,11 @@ class TestConfigurationApplyRevert(object):
             call("domain_template_dict"),
             call("domain_template_dict")])
 
-        self.mock_writer.start_session.assert_called_once()
-        self.mock_root_action.execute.assert_called_once_with(self.mock_writer)
-        self.mock_writer.stop_session.assert_called_once()
+        assert self.mock_writer.start_session.call_count == execute_count
+        self.mock_root_action.execute.assert_has_calls(
+            [call(self.mock_writer)] * execute_count)
+        assert self.mock_root_action.execute.call_count == execute_count
+        assert self.mock_writer.stop_session.call_count == execute_count
 
     @patch('nuage_metroae_config.configuration.Action')
     def test_apply__success(self, mock_patch):
@@ -331,6 +358,133 @@ class TestConfigurationApplyRevert(object):
 
         assert "Mock reading error" in str(e)
 
+    @patch('nuage_metroae_config.configuration.Action')
+    def test_apply__compiled_once(self, mock_patch):
+        self.setup_mock(mock_patch)
+
+        config = Configuration(self.mock_store)
+
+        self.setup_data(config)
+
+        self.mock_store.get_template.side_effect = [self.mock_ent_template,
+                                                    self.mock_domain_template]
+
+        config.apply(self.mock_writer)
+        config.apply(self.mock_writer)
+
+        self.verify_mock_calls(mock_patch, execute_count=2)
+        self.mock_root_action.reset_execution.assert_called_once_with()
+
+        self.mock_store.get_template.side_effect = [self.mock_ent_template,
+                                                    self.mock_domain_template]
+
+        config.revert(self.mock_writer)
+
+        assert mock_patch.call_count == 2
+        assert self.mock_root_action.read_children_actions.call_count == 8
+
+        self.mock_store.get_template.side_effect = [
+            self.mock_ent_template, self.mock_ent_template,
+            self.mock_domain_template]
+
+        config.add_template_data("Enterprise", **self.data1)
+        config.revert(self.mock_writer)
+
+        assert mock_patch.call_count == 3
+        assert self.mock_root_action.read_children_actions.call_count == 13
+
+    @patch('nuage_metroae_config.configuration.ConcurrentExecutor')
+    @patch('nuage_metroae_config.configuration.Action')
+    def test_apply__concurrent(self, mock_patch, mock_executor):
+        self.setup_mock(mock_patch)
+
+        config = Configuration(self.mock_store)
+        config.set_thread_count(4)
+
+        self.setup_data(config)
+
+        self.mock_store.get_template.side_effect = [self.mock_ent_template,
+                                                    self.mock_domain_template]
+
+        config.apply(self.mock_writer)
+
+        mock_executor.assert_called_once_with(4)
+        mock_executor.return_value.execute.assert_called_once_with(
+            self.mock_root_action, self.mock_writer)
+        self.mock_root_action.execute.assert_not_called()
+
+    @patch('nuage_metroae_config.configuration.Action')
+    def test_apply__debug_disabled(self, mock_patch):
+        self.setup_mock(mock_patch)
+        mock_logger = MagicMock()
+        mock_logger.isEnabledFor.return_value = False
+
+        config = Configuration(self.mock_store)
+        config.set_logger(mock_logger)
+
+        self.setup_data(config)
+
+        self.mock_store.get_template.side_effect = [self.mock_ent_template,
+                                                    self.mock_domain_template]
+
+        config.apply(self.mock_writer)
+
+        # The action tree is only converted to a string when logged
+        mock_logger.isEnabledFor.assert_called_once_with(logging.DEBUG)
+        mock_logger.debug.assert_not_called()
+
+    @patch('nuage_metroae_config.configuration.Action')
+    def test_apply__journal(self, mock_patch):
+        self.setup_mock(mock_patch)
+        mock_journal = MagicMock()
+
+        config = Configuration(self.mock_store)
+        config.set_journal(mock_journal)
+
+        self.setup_data(config)
+
+        self.mock_store.get_template.side_effect = [self.mock_ent_template,
+                                                    self.mock_domain_template]
+
+        self.mock_writer.is_validate_only.return_value = True
+        config.apply(self.mock_writer)
+
+        mock_journal.start.assert_not_called()
+
+        self.mock_writer.is_validate_only.return_value = False
+        config.apply(self.mock_writer)
+
+        mock_journal.start.assert_called_once_with(self.mock_root_action)
+        mock_journal.stop.assert_called_once_with()
+        self.mock_root_action.set_journal.assert_has_calls([
+            call(mock_journal), call(None)])
+
+    @patch('nuage_metroae_config.configuration.Action')
+    def test_apply__run_report(self, mock_patch):
+        self.setup_mock(mock_patch)
+        mock_report = MagicMock()
+        mock_instrumented_writer = MagicMock()
+        mock_report.get_writer.return_value = mock_instrumented_writer
+
+        config = Configuration(self.mock_store)
+        config.set_run_report(mock_report)
+
+        self.setup_data(config)
+
+        self.mock_store.get_template.side_effect = [self.mock_ent_template,
+                                                    self.mock_domain_template]
+
+        self.mock_writer.is_validate_only.return_value = False
+        config.apply(self.mock_writer)
+
+        mock_report.start.assert_called_once_with("apply", False)
+        mock_report.get_writer.assert_called_once_with(self.mock_writer)
+        mock_report.stop.assert_called_once_with(None)
+        self.mock_root_action.execute.assert_called_once_with(
+            mock_instrumented_writer)
+        self.mock_root_action.set_run_report.assert_has_calls([
+            call(mock_report), call(None)])
+
     @patch('nuage_metroae_config.configuration.Action')
     def test_revert__success(self, mock_patch):
         self.setup_mock(mock_patch)
@@ -377,3 +531,123 @@ class TestConfigurationApplyRevert(object):
             config.revert(self.mock_writer)
 
         assert "Mock reading error" in str(e)
+
+
+class TestConfigurationStreaming(object):
+
+    def setup_data(self, config):
+        config.add_template_data("Enterprise", enterprise_name="enterprise1")
+        config.add_template_data("Enterprise", enterprise_name="enterprise2")
+        config.add_template_data("Domain", enterprise_name="enterprise2",
+                                 domain_name="domain2")
+        config.add_template_data("Domain", enterprise_name="enterprise1",
+                                 domain_name="domain1")
+        config.add_template_data("Domain", enterprise_name="enterprise3",
+                                 domain_name="domain3")
+
+    def run_config(self, is_streaming, is_revert=False):
+        config = load_standard_configuration()
+        config.set_streaming(is_streaming)
+        self.setup_data(config)
+        writer = MockWriter()
+        if is_revert:
+            config.revert(writer)
+        else:
+            config.apply(writer)
+
+        return writer.get_recorded_actions()
+
+    def test_partitions__by_enterprise(self):
+        config = load_standard_configuration()
+        self.setup_data(config)
+
+        partitions = config._get_partitions(is_revert=False)
+
+        assert [[(x[0].get_name(), x[1]["enterprise_name"]) for x in y]
+                for y in partitions] == [
+            [("Enterprise", "enterprise1"), ("Domain", "enterprise1")],
+            [("Enterprise", "enterprise2"), ("Domain", "enterprise2")],
+            [("Domain", "enterprise3")]]
+
+    def test_partitions__join_all(self):
+        partitions = _Partitions()
+        for index in range(5):
+            partitions.add()
+        partitions.join(3, 1)
+        assert partitions.get_partitions() == [[0], [1, 3], [2], [4]]
+
+        partitions.join_all(2)
+        partitions.add()
+        assert partitions.get_partitions() == [[0, 1, 2, 3, 4, 5]]
+
+    def test_apply__same_as_whole(self):
+        assert self.run_config(True) == self.run_config(False)
+
+    def test_revert__partitions_reversed(self):
+        recorded_actions = self.run_config(True, is_revert=True)
+
+        assert recorded_actions[1] == "select-object Enterprise name = " \
+                                      "enterprise3 [None]"
+        deletes = [x for x in recorded_actions
+                   if x.startswith("unset-values name=enterprise")]
+        assert [x.split()[1] for x in deletes] == ["name=enterprise2",
+                                                   "name=enterprise1"]
+        # The same objects are reverted, only the stored values and contexts
+        # are numbered differently
+        whole_actions = self.run_config(False, is_revert=True)
+        assert (sorted([x.split(",")[0].split(" [")[0]
+                        for x in recorded_actions]) ==
+                sorted([x.split(",")[0].split(" [")[0]
+                        for x in whole_actions]))
+
+    def run_ordered_config(self, tmpdir, is_streaming, is_revert=False):
+        for name, order in [("First", 1), ("Second", 2), ("Third", 3)]:
+            tmpdir.join(name.lower() + ".yml").write(ORDERED_TEMPLATE %
+                                                     (name, order, name))
+        store = TemplateStore()
+        store.read_templates(str(tmpdir))
+        config = Configuration(store)
+        config.set_streaming(is_streaming)
+        config.add_template_data("Second", enterprise_name="enterprise1")
+        config.add_template_data("First", enterprise_name="enterprise2")
+        config.add_template_data("Third", enterprise_name="enterprise3")
+        config.add_template_data("First", enterprise_name="enterprise3")
+        writer = MockWriter()
+        if is_revert:
+            config.revert(writer)
+        else:
+            config.apply(writer)
+
+        return writer.get_recorded_actions()
+
+    def test_apply__template_order(self, tmpdir):
+        recorded_actions = self.run_ordered_config(tmpdir, True)
+
+        selects = [x.split()[4] for x in recorded_actions
+                   if x.startswith("select-object")]
+        assert selects == ["enterprise2", "enterprise3", "enterprise1"]
+        assert recorded_actions == self.run_ordered_config(tmpdir, False)
+
+    def test_revert__template_order(self, tmpdir):
+        recorded_actions = self.run_ordered_config(tmpdir, True,
+                                                   is_revert=True)
+        whole_actions = self.run_ordered_config(tmpdir, False,
+                                                is_revert=True)
+
+        deletes = [x.split()[1] for x in recorded_actions
+                   if x.startswith("unset-values")]
+        assert deletes == ["name=Second", "name=Third", "name=First",
+                           "name=First"]
+        assert deletes == [x.split()[1] for x in whole_actions
+                           if x.startswith("unset-values")]
+
+    def test_apply__journal(self):
+        config = load_standard_configuration()
+        config.set_streaming()
+        config.set_journal(MagicMock())
+        self.setup_data(config)
+
+        with pytest.raises(JournalError) as e:
+            config.apply(MockWriter())
+
+        assert "can not be used when streaming" in str(e)
@@ -0,0 +1,115 @@
+import pytest
+
+from nuage_metroae_config.actions import Action
+from nuage_metroae_config.errors import DeviceWriterError, JournalError
+from nuage_metroae_config.journal import Journal
+from tests.action_test_params import (CREATE_OBJECTS_CASCADE_DELETE,
+                                      ORDER_STORE_1)
+from tests.mock_writer import MockWriter
+
+
+class TestJournal(object):
+
+    def run_execute(self, template_dict, journal, fail_on=None):
+        root_action = Action(None)
+        writer = MockWriter()
+        if fail_on is not None:
+            writer.raise_exception(DeviceWriterError("Mock error"), fail_on)
+
+        root_action.read_children_actions(template_dict)
+        root_action.reorder()
+        journal.start(root_action)
+        root_action.set_journal(journal)
+        writer.start_session()
+        try:
+            if fail_on is not None:
+                with pytest.raises(DeviceWriterError):
+                    root_action.execute(writer)
+            else:
+                root_action.execute(writer)
+        finally:
+            journal.stop()
+
+        return writer.get_recorded_actions()
+
+    def test_resume__success(self, tmpdir):
+        file_name = str(tmpdir.join("journal.json"))
+
+        recorded_actions = self.run_execute(
+            CREATE_OBJECTS_CASCADE_DELETE, Journal(file_name),
+            fail_on="set-values level2ID")
+
+        assert "create-object Level3 [context_3]" in recorded_actions
+
+        # Level1 was created and selected by its id, the completed Level2
+        # subtrees are skipped and the stored value is restored for Level4
+        expected_actions = [
+            "start-session",
+            "select-object Level1 id = value_1 [None]",
+            "create-object Level4 [context_1]",
+            "set-values level2ID=value_3,name=L4-O1 [context_2]",
+            "get-value id [context_2]"]
+
+        recorded_actions = self.run_execute(
+            CREATE_OBJECTS_CASCADE_DELETE, Journal(file_name, resume=True))
+
+        assert recorded_actions == expected_actions
+
+        recorded_actions = self.run_execute(
+            CREATE_OBJECTS_CASCADE_DELETE, Journal(file_name, resume=True))
+
+        assert recorded_actions == ["start-session"]
+
+    def test_resume__incomplete_line(self, tmpdir):
+        file_name = str(tmpdir.join("journal.json"))
+
+        self.run_execute(ORDER_STORE_1, Journal(file_name),
+                         fail_on="name=L2-O2")
+
+        with open(file_name, "a") as journal_file:
+            journal_file.write('{"key": ')
+
+        expected_actions = [
+            "start-session",
+            "select-object Level1 id = value_3 [None]",
+            "create-object Level2 [context_1]",
+            "set-values name=L2-O2 [context_2]",
+            "get-value id [context_2]",
+            "create-object Level2 [context_1]",
+            "set-values name=L2-O3 [context_4]",
+            "get-value id [context_4]"]
+
+        recorded_actions = self.run_execute(ORDER_STORE_1,
+                                            Journal(file_name, resume=True))
+
+        assert recorded_actions == expected_actions
+
+    def test_resume__no_file(self, tmpdir):
+        file_name = str(tmpdir.join("journal.json"))
+
+        recorded_actions = self.run_execute(ORDER_STORE_1,
+                                            Journal(file_name, resume=True))
+
+        assert "create-object Level1 [None]" in recorded_actions
+
+    def test_resume__different_config(self, tmpdir):
+        file_name = str(tmpdir.join("journal.json"))
+
+        self.run_execute(ORDER_STORE_1, Journal(file_name),
+                         fail_on="name=L2-O2")
+
+        with pytest.raises(JournalError) as e:
+            self.run_execute(CREATE_OBJECTS_CASCADE_DELETE,
+                             Journal(file_name, resume=True))
+
+        assert "different configuration" in str(e)
+
+    def test_no_resume__overwrite(self, tmpdir):
+        file_name = str(tmpdir.join("journal.json"))
+
+        self.run_execute(ORDER_STORE_1, Journal(file_name),
+                         fail_on="name=L2-O2")
+
+        recorded_actions = self.run_execute(ORDER_STORE_1, Journal(file_name))
+
+        assert "create-object Level1 [None]" in recorded_actions
@@ -1,6 +1,7 @@
+import logging
 import pytest
 
-from nuage_metroae_config.logger import Logger
+from nuage_metroae_config.logger import is_log_enabled, Logger
 
 LOGGING_CASES = ["LOG", "ERROR", "OUTPUT", "DEBUG"]
 
@@ -52,3 +53,15 @@ class TestLogger(object):
         assert log_type + ": next line 1" in log
         assert log_type + ": Yes stdout" in log
         assert log_type + ": next line 2" in log
+
+    def test_is_log_enabled__logger(self):
+        assert is_log_enabled(Logger(), "DEBUG") is True
+
+    def test_is_log_enabled__logging(self):
+        logger = logging.getLogger("test_is_log_enabled")
+        logger.setLevel(logging.INFO)
+
+        assert is_log_enabled(logger, "DEBUG") is False
+        assert is_log_enabled(logger, "ERROR") is True
+        # Levels not registered with logging are assumed to be written
+        assert is_log_enabled(logger, "UNKNOWN_LEVEL") is True
@@ -0,0 +1,101 @@
+import json
+import pytest
+
+from nuage_metroae_config.actions import Action
+from nuage_metroae_config.errors import DeviceWriterError
+from nuage_metroae_config.run_report import RunReport
+from tests.action_test_params import ORDER_STORE_1
+from tests.mock_writer import MockWriter
+
+
+class TestRunReport(object):
+
+    def run_execute(self, run_report, writer):
+        root_action = Action(None)
+        root_action.set_template_name("Test template")
+        root_action.read_children_actions(ORDER_STORE_1)
+        root_action.reorder()
+        root_action.set_run_report(run_report)
+
+        run_report.start("apply")
+        error = None
+        try:
+            instrumented_writer = run_report.get_writer(writer)
+            instrumented_writer.start_session()
+            root_action.execute(instrumented_writer)
+            instrumented_writer.stop_session()
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            run_report.stop(error)
+
+    @staticmethod
+    def get_entry(entries, object_type, name, name_key):
+        matches = [x for x in entries
+                   if x["object_type"] == object_type and
+                   x[name_key] == name]
+        assert len(matches) == 1
+        assert matches[0]["template"] == "Test template"
+        return matches[0]
+
+    def test_report__success(self, tmpdir):
+        file_name = str(tmpdir.join("report.json"))
+        run_report = RunReport(file_name)
+        writer = MockWriter()
+
+        self.run_execute(run_report, writer)
+
+        report = run_report.get_report()
+        with open(file_name, "r") as report_file:
+            assert json.loads(report_file.read()) == report
+
+        assert report["mode"] == "apply"
+        assert report["error"] is None
+
+        entry = self.get_entry(report["actions"], "Level2", "create-object",
+                               "action")
+        assert entry["count"] == 3
+        assert entry["errors"] == 0
+        entry = self.get_entry(report["actions"], "Level1", "set-values",
+                               "action")
+        assert entry["count"] == 2
+
+        entry = self.get_entry(report["api_calls"], "Level1",
+                               "create_object", "call")
+        assert entry["count"] == 2
+        entry = self.get_entry(report["api_calls"], "Level2", "set_values",
+                               "call")
+        assert entry["count"] == 3
+
+        assert [(x["template"], x["api_calls"])
+                for x in report["templates"]] in [
+            [("Test template", 10), (None, 2)],
+            [(None, 2), ("Test template", 10)]]
+        assert report["seconds"] >= max([x["seconds"]
+                                         for x in report["actions"]])
+
+    def test_report__error(self):
+        run_report = RunReport()
+        writer = MockWriter()
+        writer.raise_exception(DeviceWriterError("Mock error"),
+                               "set-values name=L2-O2")
+
+        with pytest.raises(DeviceWriterError):
+            self.run_execute(run_report, writer)
+
+        report = run_report.get_report()
+        assert report["error"] == "Mock error"
+
+        # The error is only counted for the action which raised it
+        entry = self.get_entry(report["actions"], "Level2", "set-values",
+                               "action")
+        assert entry["count"] == 2
+        assert entry["errors"] == 1
+        entry = self.get_entry(report["actions"], "Level2", "create-object",
+                               "action")
+        assert entry["errors"] == 0
+        entry = self.get_entry(report["api_calls"], "Level2", "set_values",
+                               "call")
+        assert entry["count"] == 2
+        assert entry["errors"] == 1
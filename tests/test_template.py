@@ -1,9 +1,13 @@
 import json
+from mock import patch
 import os
 import pytest
+import shutil
+import yaml
 
 from nuage_metroae_config.template import (MissingTemplateError,
                                            Template,
+                                           TemplateDataValidator,
                                            TemplateParseError,
                                            TemplateStore,
                                            UndefinedVariableError,
@@ -136,6 +140,102 @@ ENGINE_VERSION_CASES = [
     ("2.0", None, True)]
 
 
+STATIC_YAML_TEMPLATE = """
+name: Static
+software-type: Nuage Networks VSD
+software-version: 5.0.2
+variables: []
+actions:
+  - create-object:
+      select-by-field: name
+      type: Enterprise
+      actions:
+        - set-values:
+            name: {{ name }}
+            description: {{ value }}
+            values: [1, {{ value }}]
+"""
+
+SKELETON_VALUE_CASES = SUBSTITUTE_CASES + [
+    u"unicode \u00e9", u"\u2028", "<tag>&'", "back\\slash", "tab\tnew\nline",
+    "", -1, 2 ** 70, [], ["a", 1, None, [True]], u"outside \U0001f600",
+    1.5e-20, {"a": 1}]
+
+DYNAMIC_TEMPLATE_CASES = [
+    "name: {{ name }}{% if value %}\ndescription: x{% endif %}",
+    "name: {{ name|upper }}",
+    "name: prefix-{{ name }}",
+    "{{ name }}: value",
+    "name: {% set x = name %}{{ x }}",
+    "name: {{ values[0] }}"]
+
+
+class TestTemplateSkeleton(object):
+
+    def get_static_template(self):
+        template = Template()
+        template._parse_without_vars(STATIC_YAML_TEMPLATE, "static.yml")
+        return template
+
+    def render(self, template, **data):
+        return template._decode_to_dict(
+            template._replace_vars_with_kwargs(**data))
+
+    @pytest.mark.parametrize("value", SKELETON_VALUE_CASES)
+    def test_bind__same_as_render(self, value):
+        template = self.get_static_template()
+
+        assert template._get_skeleton() is not None
+        try:
+            expected = self.render(template, name="test", value=value)
+        except TemplateParseError:
+            # Values which can not be rendered must still fail
+            with pytest.raises(TemplateParseError):
+                template._parse_with_vars(name="test", value=value)
+            return
+
+        assert template._parse_with_vars(name="test", value=value) == expected
+
+    def test_bind__no_render(self):
+        template = self.get_static_template()
+        template._parse_with_vars(name="test", value=1)
+
+        with patch.object(template,
+                          "_replace_vars_with_kwargs") as mock_render:
+            result = template._parse_with_vars(name="test2", value=[1, 2])
+
+        mock_render.assert_not_called()
+        set_values = (result["actions"][0]["create-object"]["actions"][0]
+                      ["set-values"])
+        assert set_values["name"] == "test2"
+        assert set_values["values"] == [1, [1, 2]]
+
+    def test_bind__copies_lists(self):
+        template = self.get_static_template()
+        value = ["a"]
+        result = template._parse_with_vars(name="test", value=value)
+        set_values = (result["actions"][0]["create-object"]["actions"][0]
+                      ["set-values"])
+        set_values["description"].append("b")
+
+        assert value == ["a"]
+
+    def test_bind__missing_variable(self):
+        template = self.get_static_template()
+
+        with pytest.raises(UndefinedVariableError) as e:
+            template._parse_with_vars(name="test")
+
+        assert "value" in str(e.value)
+
+    @pytest.mark.parametrize("template_string", DYNAMIC_TEMPLATE_CASES)
+    def test_compile__dynamic(self, template_string):
+        template = Template()
+        template.template_string = template_string
+
+        assert template._get_skeleton() is None
+
+
 class TestTemplateParsing(object):
 
     def verify_valid_templates(self, store):
@@ -253,6 +353,28 @@ class TestTemplateParsing(object):
         assert message in str(e.value)
         assert filename in str(e.value)
 
+    @pytest.mark.parametrize("filename", os.listdir(VALID_TEMPLATE_DIRECTORY))
+    def test_decode__same_as_yaml(self, filename):
+        template = Template()
+        template.filename = filename
+        with open(os.path.join(VALID_TEMPLATE_DIRECTORY, filename),
+                  'r') as file:
+            template.template_string = file.read()
+
+        filled_template = template._replace_vars_with_null()
+
+        assert (template._decode_to_dict(filled_template) ==
+                yaml.safe_load(filled_template))
+
+    def test_decode__error_line(self):
+        template = Template()
+        template.filename = "invalid.json"
+
+        with pytest.raises(TemplateParseError) as e:
+            template._decode_to_dict('{\n  "name": "test",\n  "bad\n}')
+
+        assert "Syntax error in invalid.json:3" in str(e.value)
+
     def test_schema__success(self):
         store = TemplateStore()
         store.read_templates(os.path.join(INVALID_TEMPLATE_DIRECTORY,
@@ -337,6 +459,32 @@ class TestTemplateSubstitution(object):
         processed_value = self.get_domain_value(processed_template)
         assert processed_value == value
 
+    def test__compiled_once(self):
+        store = TemplateStore()
+        store.read_templates(VALID_TEMPLATE_DIRECTORY)
+
+        template = store.get_template('enterprise')
+        template._parse_with_vars(enterprise_name="enterprise1")
+        compiled = dict(template.compiled_templates)
+        processed_template = template._parse_with_vars(
+            enterprise_name="enterprise2")
+
+        assert self.get_enterprise_value(processed_template) == "enterprise2"
+        assert len(compiled) > 0
+        for name, compiled_template in compiled.items():
+            assert template.compiled_templates[name] is compiled_template
+
+    def test__referenced_variables(self):
+        store = TemplateStore()
+        store.read_templates(VALID_TEMPLATE_DIRECTORY)
+
+        template = store.get_template('enterprise')
+        assert template.referenced_variables == set(["enterprise_name"])
+
+        template = store.get_template('domain')
+        assert template.referenced_variables == set(["enterprise_name",
+                                                     "domain_name"])
+
     def test__missing_var(self):
         store = TemplateStore()
         store.read_templates(VALID_TEMPLATE_DIRECTORY)
@@ -596,6 +744,27 @@ class TestTemplateVariableValidation(object):
         assert "true_or_false" in str(e)
         assert "string_list" in str(e)
 
+    def test_validator__compiled_once(self):
+        template = self.get_variables_template()
+
+        min_vars = {"name": "another_name",
+                    "select_name": "another_select",
+                    "int_as_string": "a_string",
+                    "number": 100000,
+                    "floating_point": 1,
+                    "true_or_false": False,
+                    "fruit": "orange",
+                    "string_list": ["a", "b", "c"],
+                    "int_list": [],
+                    "soda_list": ["sprite"]}
+
+        with patch("nuage_metroae_config.template.TemplateDataValidator",
+                   wraps=TemplateDataValidator) as mock_validator:
+            for i in range(3):
+                assert template.validate_template_data(**min_vars) is True
+
+        mock_validator.assert_called_once_with(template)
+
 
 class TestTemplateVersioning(object):
 
@@ -825,3 +994,321 @@ class TestTemplateVersioning(object):
             "Template 1", "Template 2", "Template 3"]
         assert store.get_template_names("Acme", "5.4.1") == [
             "Template 1", "Template 3"]
+
+    def test_get_template__resolved_once(self):
+        store = TemplateStore()
+
+        self.add_template_data(store)
+
+        assert store.get_template("Template 1", "VSD", "5.4.1").id == 2
+        with patch.object(store, "_get_latest_template") as mock_latest:
+            assert store.get_template("template 1", "VSD", "5.4.1").id == 2
+            assert store.get_template("Template 1", "VSD", "5.4.1").id == 2
+
+        mock_latest.assert_not_called()
+
+    def test_get_template__resolved_after_add(self):
+        store = TemplateStore()
+
+        self.add_template_data(store)
+
+        assert store.get_template("Template 1", "VSD", "6.0.0").id == 1
+
+        self.add_template(store, 6, "Template 1", "VSD", "5.5.0", "1.0",
+                          "1.0")
+
+        assert store.get_template("Template 1", "VSD", "6.0.0").id == 6
+        assert store.get_template("Template 1", "VSD", "5.4.2").id == 1
+
+    def test_read__numeric_version(self, tmpdir):
+        # Unquoted versions are read from YAML as numbers
+        tmpdir.join("numeric.yml").write(
+            "name: T\n"
+            "description: Numeric versions\n"
+            "template-version: 1.0\n"
+            "software-type: Nuage Networks VSD\n"
+            "software-version: 5.0\n"
+            "variables:\n"
+            "  - name: enterprise_name\n"
+            "    type: string\n"
+            "actions:\n"
+            "  - create-object:\n"
+            "      type: Enterprise\n"
+            "      actions:\n"
+            "        - set-values:\n"
+            "            name: {{ enterprise_name }}\n")
+
+        store = TemplateStore()
+        store.read_templates(str(tmpdir))
+
+        assert store.get_template_names() == ["T"]
+        assert store.get_template("T").get_name() == "T"
+
+
+class TestTemplateCache(object):
+
+    def copy_templates(self, tmpdir):
+        template_dir = tmpdir.mkdir("templates")
+        for file_name in os.listdir(VALID_TEMPLATE_DIRECTORY):
+            shutil.copy(os.path.join(VALID_TEMPLATE_DIRECTORY, file_name),
+                        str(template_dir))
+
+        return str(template_dir)
+
+    def test_cache__success(self, tmpdir):
+        template_dir = self.copy_templates(tmpdir)
+        cache_file = str(tmpdir.join("template_cache.json"))
+
+        store = TemplateStore()
+        store.set_cache_file(cache_file)
+        store.read_templates(template_dir)
+
+        assert os.path.isfile(cache_file)
+
+        store = TemplateStore()
+        store.set_cache_file(cache_file)
+        with patch.object(Template, "_parse_without_vars") as mock_parse:
+            store.read_templates(template_dir)
+
+        mock_parse.assert_not_called()
+        TestTemplateParsing().verify_valid_templates(store)
+
+    def test_cache__changed_file(self, tmpdir):
+        template_dir = self.copy_templates(tmpdir)
+        cache_file = str(tmpdir.join("template_cache.json"))
+
+        store = TemplateStore()
+        store.set_cache_file(cache_file)
+        store.read_templates(template_dir)
+
+        file_name = os.path.join(template_dir, "enterprise_template.json")
+        with open(file_name, 'r') as file:
+            template_string = file.read()
+        with open(file_name, 'w') as file:
+            file.write(template_string.replace('"Enterprise"',
+                                               '"Enterprise Changed"', 1))
+
+        store = TemplateStore()
+        store.set_cache_file(cache_file)
+        store.read_templates(template_dir)
+
+        assert store.get_template_names() == ["Bidirectional ACL", "Domain",
+                                              "Enterprise Changed"]
+
+    def test_cache__engine_version(self, tmpdir):
+        template_dir = self.copy_templates(tmpdir)
+        cache_file = str(tmpdir.join("template_cache.json"))
+
+        store = TemplateStore("1.0")
+        store.set_cache_file(cache_file)
+        store.read_templates(template_dir)
+
+        store = TemplateStore("1.1")
+        store.set_cache_file(cache_file)
+        with patch.object(Template, "_parse_without_vars",
+                          autospec=True,
+                          side_effect=Template._parse_without_vars) as \
+                mock_parse:
+            store.read_templates(template_dir)
+
+        assert mock_parse.call_count == 3
+
+    def test_cache__corrupt(self, tmpdir):
+        template_dir = self.copy_templates(tmpdir)
+        cache_file = str(tmpdir.join("template_cache.json"))
+        with open(cache_file, 'w') as file:
+            file.write("not a cache {")
+
+        store = TemplateStore()
+        store.set_cache_file(cache_file)
+        store.read_templates(template_dir)
+
+        TestTemplateParsing().verify_valid_templates(store)
+
+        with open(cache_file, 'r') as file:
+            assert len(json.load(file)["templates"]) == 3
+
+    def test_cache__malformed_entry(self, tmpdir):
+        template_dir = self.copy_templates(tmpdir)
+        cache_file = str(tmpdir.join("template_cache.json"))
+
+        store = TemplateStore()
+        store.set_cache_file(cache_file)
+        store.read_templates(template_dir)
+
+        with open(cache_file, 'r') as file:
+            cache = json.load(file)
+        file_names = sorted(cache["templates"])
+        del cache["templates"][file_names[0]]["file"]
+        del cache["templates"][file_names[1]]["template"]["name"]
+        cache["templates"][file_names[2]] = "not an entry"
+        with open(cache_file, 'w') as file:
+            json.dump(cache, file)
+
+        store = TemplateStore()
+        store.set_cache_file(cache_file)
+        store.read_templates(template_dir)
+
+        TestTemplateParsing().verify_valid_templates(store)
+
+        # The malformed entries are rebuilt from the templates
+        store = TemplateStore()
+        store.set_cache_file(cache_file)
+        with patch.object(Template, "_parse_without_vars") as mock_parse:
+            store.read_templates(template_dir)
+
+        mock_parse.assert_not_called()
+
+
+class TestTemplateLazyParsing(object):
+
+    def test_lazy__success(self):
+        store = TemplateStore()
+        store.set_lazy_parsing()
+
+        with patch.object(Template, "_parse_without_vars") as mock_parse:
+            store.read_templates(VALID_TEMPLATE_DIRECTORY)
+            assert store.get_template_names() == ["Bidirectional ACL",
+                                                  "Domain", "Enterprise"]
+
+        mock_parse.assert_not_called()
+
+        TestTemplateParsing().verify_valid_templates(store)
+
+    def test_lazy__parse_once(self):
+        store = TemplateStore()
+        store.set_lazy_parsing()
+        store.read_templates(VALID_TEMPLATE_DIRECTORY)
+
+        with patch.object(Template, "_parse_without_vars",
+                          autospec=True,
+                          side_effect=Template._parse_without_vars) as \
+                mock_parse:
+            store.get_template("Enterprise")
+            store.get_template("Enterprise")
+
+        assert mock_parse.call_count == 1
+
+    @pytest.mark.parametrize("filename, message", PARSE_ERROR_CASES)
+    def test_lazy__invalid(self, filename, message):
+        store = TemplateStore()
+        store.set_lazy_parsing()
+
+        with pytest.raises(TemplateParseError) as e:
+            store.read_templates(os.path.join(INVALID_TEMPLATE_DIRECTORY,
+                                              filename))
+            for name in store.get_template_names():
+                store.get_template(name)
+
+        assert message in str(e.value)
+        assert filename in str(e.value)
+
+    def test_lazy__conditional_header(self):
+        template_string = """
+name: Conditional
+{% if use_new %}
+software-type: Nuage Networks VSD
+{% endif %}
+software-version: 5.0.2
+variables: []
+actions: []
+"""
+        template = Template()
+
+        assert template._scan_headers(template_string, "cond.yml") is False
+
+
+class TestTemplateParallelLoading(object):
+
+    def test_parallel__success(self):
+        store = TemplateStore()
+        store.set_process_count(2)
+        store.read_templates(VALID_TEMPLATE_DIRECTORY)
+
+        TestTemplateParsing().verify_valid_templates(store)
+
+    def test_parallel__same_as_serial(self):
+        serial_store = TemplateStore()
+        serial_store.read_templates(VALID_TEMPLATE_DIRECTORY)
+        parallel_store = TemplateStore()
+        parallel_store.set_process_count(4)
+        parallel_store.read_templates(VALID_TEMPLATE_DIRECTORY)
+
+        assert (parallel_store.get_template_names() ==
+                serial_store.get_template_names())
+        for name in serial_store.get_template_names():
+            serial_template = serial_store.get_template(name)
+            parallel_template = parallel_store.get_template(name)
+            assert parallel_template.filename == serial_template.filename
+            assert parallel_template.variables == serial_template.variables
+            assert (parallel_template._parse_with_vars(
+                **self.get_sample_data(serial_template)) ==
+                serial_template._parse_with_vars(
+                    **self.get_sample_data(serial_template)))
+
+    def test_parallel__cache(self, tmpdir):
+        template_dir = TestTemplateCache().copy_templates(tmpdir)
+        cache_file = str(tmpdir.join("template_cache.json"))
+
+        store = TemplateStore()
+        store.set_cache_file(cache_file)
+        store.set_process_count(2)
+        store.read_templates(template_dir)
+
+        assert os.path.isfile(cache_file)
+
+        store = TemplateStore()
+        store.set_cache_file(cache_file)
+        store.set_process_count(2)
+        with patch("nuage_metroae_config.template.multiprocessing") as mock_mp:
+            store.read_templates(template_dir)
+
+        mock_mp.Pool.assert_not_called()
+        TestTemplateParsing().verify_valid_templates(store)
+
+    @pytest.mark.parametrize("filename, message",
+                             [x for x in PARSE_ERROR_CASES
+                              if x[0] != 'no_exist.json'])
+    def test_parallel__invalid(self, tmpdir, filename, message):
+        template_dir = TestTemplateCache().copy_templates(tmpdir)
+        shutil.copy(os.path.join(INVALID_TEMPLATE_DIRECTORY, filename),
+                    template_dir)
+        store = TemplateStore()
+        store.set_process_count(2)
+
+        with pytest.raises(TemplateParseError) as e:
+            store.read_templates(template_dir)
+
+        assert message in str(e.value)
+        assert filename in str(e.value)
+
+    def test_parallel__first_error(self, tmpdir):
+        template_dir = TestTemplateCache().copy_templates(tmpdir)
+        for filename in ["missing_name.json", "missing_actions.json",
+                         "missing_variables.yaml"]:
+            shutil.copy(os.path.join(INVALID_TEMPLATE_DIRECTORY, filename),
+                        template_dir)
+
+        store = TemplateStore()
+        with pytest.raises(TemplateParseError) as serial_e:
+            store.read_templates(template_dir)
+
+        store = TemplateStore()
+        store.set_process_count(3)
+        with pytest.raises(TemplateParseError) as parallel_e:
+            store.read_templates(template_dir)
+
+        assert str(parallel_e.value) == str(serial_e.value)
+
+    def get_sample_data(self, template):
+        data = dict()
+        for variable in template.variables:
+            if variable["type"] == "list":
+                data[variable["name"]] = []
+            elif variable["type"] == "boolean":
+                data[variable["name"]] = True
+            elif variable["type"] == "integer":
+                data[variable["name"]] = 1
+            else:
+                data[variable["name"]] = "value"
+        return data
@@ -2,6 +2,7 @@ from mock import call, patch, MagicMock
 import json
 import os
 import pytest
+import threading
 import uuid
 
 from bambou.exceptions import BambouHTTPError
@@ -1052,6 +1053,41 @@ class TestVsdWriterDeleteObject(object):
         assert "Delete object" in e.value.get_display_string()
         assert "HTTP 403" in e.value.get_display_string()
 
+    def test_cascade__specs(self):
+        vsd_writer = VsdWriter()
+        vsd_writer.read_api_specifications(VALID_SPECS_DIRECTORY)
+
+        assert vsd_writer.is_cascade_delete("Enterprise", "Domain") is False
+
+        vsd_writer.set_cascade_delete()
+
+        assert vsd_writer.is_cascade_delete("Enterprise", "Domain") is True
+        assert vsd_writer.is_cascade_delete("enterprise",
+                                            "domaintemplate") is True
+        assert vsd_writer.is_cascade_delete("Domain",
+                                            "BridgeInterface") is True
+        assert vsd_writer.is_cascade_delete("DomainTemplate",
+                                            "Domain") is False
+        assert vsd_writer.is_cascade_delete("Domain", "Enterprise") is False
+        assert vsd_writer.is_cascade_delete("Enterprise", "Unknown") is False
+
+    def test_cascade__types(self):
+        vsd_writer = VsdWriter()
+        vsd_writer.read_api_specifications(VALID_SPECS_DIRECTORY)
+        vsd_writer.set_cascade_delete(cascade_delete_types={
+            "Enterprise": ["DomainTemplate"],
+            "Domain": ["*"]})
+
+        assert vsd_writer.is_cascade_delete("Enterprise", "Domain") is False
+        assert vsd_writer.is_cascade_delete("enterprise",
+                                            "domainTemplate") is True
+        assert vsd_writer.is_cascade_delete("Domain", "Zone") is True
+        assert vsd_writer.is_cascade_delete("Zone", "Subnet") is False
+
+        vsd_writer.set_cascade_delete(False)
+
+        assert vsd_writer.is_cascade_delete("Domain", "Zone") is False
+
 
 class TestVsdWriterSetValues(object):
 
@@ -1912,6 +1948,523 @@ class TestVsdWriterGetValue(object):
         assert "Get value FooBar" in e.value.get_display_string()
 
 
+class TestVsdWriterBulkFetch(object):
+
+    def get_mock_enterprise(self, vsd_writer, name, id):
+        mock_object = MagicMock()
+        mock_object.spec = vsd_writer.specs['enterprise']
+        mock_object.get_name.return_value = "Enterprise"
+        mock_object.name = name
+        mock_object.id = id
+        mock_object.bgpenabled = False
+        return mock_object
+
+    @patch("nuage_metroae_config.vsd_writer.EnterpriseFetcher")
+    def test_select__one_fetch(self, mock_fetcher):
+        vsd_writer = VsdWriter()
+        vsd_writer.set_bulk_fetch()
+        setup_standard_session(vsd_writer)
+
+        enterprise_1 = self.get_mock_enterprise(vsd_writer, "ent1", "id1")
+        enterprise_2 = self.get_mock_enterprise(vsd_writer, "ent2", "id2")
+        mock_fetcher.return_value = mock_fetcher
+        mock_fetcher.get.return_value = [enterprise_1, enterprise_2]
+
+        context_1 = vsd_writer.select_object("Enterprise", "Name", "ent1")
+        context_2 = vsd_writer.select_object("Enterprise", "name", "ent2")
+
+        mock_fetcher.get.assert_called_once_with()
+        assert context_1.current_object is enterprise_1
+        assert context_2.current_object is enterprise_2
+
+        with pytest.raises(MissingSelectionError):
+            vsd_writer.select_object("Enterprise", "name", "ent3")
+
+        assert mock_fetcher.get.call_count == 1
+
+    @patch("nuage_metroae_config.vsd_writer.EnterpriseFetcher")
+    def test_delete__concurrent(self, mock_fetcher):
+        vsd_writer = VsdWriter()
+        vsd_writer.set_bulk_fetch()
+        setup_standard_session(vsd_writer)
+
+        enterprises = [self.get_mock_enterprise(vsd_writer, "ent%d" % x,
+                                                "id%d" % x)
+                       for x in range(200)]
+        mock_fetcher.return_value = mock_fetcher
+        mock_fetcher.get.return_value = list(enterprises)
+        contexts = [vsd_writer.select_object("Enterprise", "name",
+                                             "ent%d" % x)
+                    for x in range(200)]
+
+        # Deletes of sibling objects are made by concurrent threads
+        threads = [threading.Thread(target=vsd_writer.delete_object,
+                                    args=(x,))
+                   for x in contexts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for index in range(200):
+            with pytest.raises(MissingSelectionError):
+                vsd_writer.select_object("Enterprise", "name",
+                                         "ent%d" % index)
+
+    @patch("nuage_metroae_config.vsd_writer.EnterpriseFetcher")
+    def test_update__save_changed(self, mock_fetcher):
+        vsd_writer = VsdWriter()
+        vsd_writer.set_bulk_fetch()
+        setup_standard_session(vsd_writer)
+
+        enterprise_1 = self.get_mock_enterprise(vsd_writer, "ent1", "id1")
+        enterprise_2 = self.get_mock_enterprise(vsd_writer, "ent2", "id2")
+        mock_fetcher.return_value = mock_fetcher
+        mock_fetcher.get.return_value = [enterprise_1, enterprise_2]
+
+        context = vsd_writer.update_object("Enterprise", "name", "ent1")
+        assert context.current_object is enterprise_1
+        vsd_writer.set_values(context, name="ent1", BGPEnabled=False)
+        enterprise_1.save.assert_not_called()
+
+        context = vsd_writer.update_object("Enterprise", "name", "ent2")
+        assert context.current_object is enterprise_2
+        vsd_writer.set_values(context, name="ent2", BGPEnabled=True)
+        enterprise_2.save.assert_called_once_with()
+        assert enterprise_2.bgpenabled is True
+
+        mock_fetcher.get.assert_called_once_with()
+
+    @patch("nuage_metroae_config.vsd_writer.EnterpriseFetcher")
+    def test_plan__success(self, mock_fetcher):
+        vsd_writer = VsdWriter()
+        vsd_writer.set_plan_only()
+        mock_session = setup_standard_session(vsd_writer)
+
+        enterprise_1 = self.get_mock_enterprise(vsd_writer, "ent1", "id1")
+        enterprise_2 = self.get_mock_enterprise(vsd_writer, "ent2", "id2")
+        mock_fetcher.return_value = mock_fetcher
+        mock_fetcher.get.return_value = [enterprise_1, enterprise_2]
+
+        context = vsd_writer.update_object("Enterprise", "name", "ent1")
+        vsd_writer.set_values(context, name="ent1")
+
+        context = vsd_writer.update_object("Enterprise", "name", "ent2")
+        vsd_writer.set_values(context, name="ent2", BGPEnabled=True)
+
+        context = vsd_writer.update_object("Enterprise", "name", "ent3")
+        vsd_writer.set_values(context, name="ent3")
+        assert vsd_writer.get_value("id", context) == "ValidatePlaceholder"
+
+        # Planned objects can be selected and have no children yet
+        context = vsd_writer.select_object("Enterprise", "name", "ent3")
+        with pytest.raises(MissingSelectionError):
+            vsd_writer.select_object("Domain", "name", "dom1", context)
+
+        context = vsd_writer.select_object("Enterprise", "name", "ent1")
+        vsd_writer.delete_object(context)
+        with pytest.raises(MissingSelectionError):
+            vsd_writer.select_object("Enterprise", "name", "ent1")
+
+        mock_fetcher.get.assert_called_once_with()
+        enterprise_1.save.assert_not_called()
+        enterprise_1.delete.assert_not_called()
+        enterprise_2.save.assert_not_called()
+        mock_session.root_object.create_child.assert_not_called()
+
+        plan = vsd_writer.get_plan()
+        assert [x["action"] for x in plan] == ["no-op", "update", "create",
+                                               "delete"]
+        assert plan[1]["attributes"] == {"BGPEnabled": True}
+        assert plan[2]["attributes"] == {"name": "ent3"}
+        assert "ent3" in plan[2]["object"]
+        assert plan[2]["parent"] == "Root"
+
+
+class TestVsdWriterCoalesceSelects(object):
+
+    def get_mock_enterprise(self, vsd_writer, name, id):
+        mock_object = MagicMock()
+        mock_object.spec = vsd_writer.specs['enterprise']
+        mock_object.get_name.return_value = "Enterprise"
+        mock_object.name = name
+        mock_object.id = id
+        return mock_object
+
+    @patch("nuage_metroae_config.vsd_writer.EnterpriseFetcher")
+    def test_select__one_fetch(self, mock_fetcher):
+        vsd_writer = VsdWriter()
+        setup_standard_session(vsd_writer)
+
+        enterprise_1 = self.get_mock_enterprise(vsd_writer, "ent1", "id1")
+        enterprise_2 = self.get_mock_enterprise(vsd_writer, "ent2", "id2")
+        enterprise_3 = self.get_mock_enterprise(vsd_writer, "ent2", "id3")
+        mock_fetcher.return_value = mock_fetcher
+        mock_fetcher.get.return_value = [enterprise_1, enterprise_2,
+                                         enterprise_3]
+
+        vsd_writer.coalesce_selects("Enterprise", "name")
+        context = vsd_writer.select_object("Enterprise", "Name", "ent1")
+
+        mock_fetcher.get.assert_called_once_with()
+        assert context.current_object is enterprise_1
+
+        with pytest.raises(MissingSelectionError) as e:
+            vsd_writer.select_object("Enterprise", "name", "ent3")
+
+        assert ("Select object Enterprise name = ent3" in
+                e.value.get_display_string())
+
+        with pytest.raises(MultipleSelectionError) as e:
+            vsd_writer.select_object("Enterprise", "name", "ent2")
+
+        assert ("Select object Enterprise name = ent2" in
+                e.value.get_display_string())
+
+        vsd_writer.delete_object(context)
+        enterprise_1.delete.assert_called_once_with()
+        with pytest.raises(MissingSelectionError):
+            vsd_writer.select_object("Enterprise", "name", "ent1")
+
+        assert mock_fetcher.get.call_count == 1
+
+    def test_select__pages(self):
+        vsd_writer = VsdWriter()
+        setup_standard_session(vsd_writer)
+
+        pages = [[self.get_mock_enterprise(vsd_writer, "ent1", "id1"),
+                  self.get_mock_enterprise(vsd_writer, "ent2", "id2")],
+                 [self.get_mock_enterprise(vsd_writer, "ent3", "id3")]]
+        requested_pages = list()
+
+        def get_page(fetcher, filter=None, page=None, **kwargs):
+            requested_pages.append(page)
+            fetcher.current_total_count = 3
+            return list(pages[page or 0])
+
+        with patch("nuage_metroae_config.bambou_adapter.NURESTFetcher.get",
+                   new=get_page):
+            vsd_writer.coalesce_selects("Enterprise", "name")
+            context = vsd_writer.select_object("Enterprise", "name", "ent3")
+
+        assert context.current_object is pages[1][0]
+        assert requested_pages == [None, 1]
+
+    @patch("nuage_metroae_config.vsd_writer.EnterpriseFetcher")
+    def test_select__not_coalesced(self, mock_fetcher):
+        vsd_writer = VsdWriter()
+        setup_standard_session(vsd_writer)
+
+        enterprise_1 = self.get_mock_enterprise(vsd_writer, "ent1", "id1")
+        mock_fetcher.return_value = mock_fetcher
+        mock_fetcher.get.return_value = [enterprise_1]
+
+        vsd_writer.select_object("Enterprise", "name", "ent1")
+        vsd_writer.select_object("Enterprise", "name", "ent1")
+
+        mock_fetcher.get.assert_has_calls([call(filter='name is "ent1"'),
+                                           call(filter='name is "ent1"')])
+
+    @patch("nuage_metroae_config.vsd_writer.EnterpriseFetcher")
+    def test_coalesce__validate_only(self, mock_fetcher):
+        vsd_writer = VsdWriter()
+        vsd_writer.set_validate_only()
+        setup_standard_session(vsd_writer)
+
+        mock_fetcher.return_value = mock_fetcher
+
+        vsd_writer.coalesce_selects("Enterprise", "name")
+        vsd_writer.select_object("Enterprise", "name", "ent1")
+
+        mock_fetcher.get.assert_not_called()
+
+    @patch("nuage_metroae_config.vsd_writer.EnterpriseFetcher")
+    def test_coalesce__bambou_error(self, mock_fetcher):
+        vsd_writer = VsdWriter()
+        setup_standard_session(vsd_writer)
+
+        mock_fetcher.return_value = mock_fetcher
+        mock_fetcher.get.side_effect = get_mock_bambou_error(404,
+                                                             "Not Found")
+
+        with pytest.raises(VsdError) as e:
+            vsd_writer.coalesce_selects("Enterprise", "name")
+
+        assert ("Coalesce selects Enterprise name" in
+                e.value.get_display_string())
+        assert "HTTP 404" in e.value.get_display_string()
+
+
+class TestVsdWriterBulkSelect(object):
+
+    def get_mock_object(self, vsd_writer, object_name, name, id,
+                        parent_id=None):
+        mock_object = MagicMock()
+        mock_object.spec = vsd_writer.specs[object_name.lower()]
+        mock_object.get_name.return_value = object_name
+        mock_object.name = name
+        mock_object.id = id
+        mock_object.parent_id = parent_id
+        mock_object.bgpenabled = False
+        return mock_object
+
+    @patch("nuage_metroae_config.vsd_writer.EnterpriseFetcher")
+    def test_by_fields__success(self, mock_fetcher):
+        vsd_writer = VsdWriter()
+        setup_standard_session(vsd_writer)
+
+        enterprise_1 = self.get_mock_object(vsd_writer, "Enterprise", "ent1",
+                                            "id1")
+        enterprise_2 = self.get_mock_object(vsd_writer, "Enterprise", "ent2",
+                                            "id2")
+        enterprise_2.bgpenabled = True
+        mock_fetcher.return_value = mock_fetcher
+        mock_fetcher.get.return_value = [enterprise_1, enterprise_2]
+
+        context = vsd_writer.select_object_by_fields(
+            "Enterprise", ["name", "BGPEnabled"], ["ent2", True])
+
+        mock_fetcher.get.assert_called_once_with()
+        assert context.current_object is enterprise_2
+        assert context.object_exists is True
+
+        with pytest.raises(MissingSelectionError) as e:
+            vsd_writer.select_object_by_fields(
+                "Enterprise", ["name", "BGPEnabled"], ["ent1", True])
+
+        assert "No object matches" in str(e)
+        assert "Select object Enterprise" in e.value.get_display_string()
+
+        enterprise_2.name = "ent1"
+        enterprise_2.bgpenabled = False
+        with pytest.raises(MultipleSelectionError) as e:
+            vsd_writer.select_object_by_fields(
+                "Enterprise", ["name", "BGPEnabled"], ["ent1", False])
+
+        assert "Multiple objects match" in str(e)
+
+    @patch("nuage_metroae_config.vsd_writer.EnterpriseFetcher")
+    def test_by_fields__coalesced(self, mock_fetcher):
+        vsd_writer = VsdWriter()
+        setup_standard_session(vsd_writer)
+
+        enterprise_1 = self.get_mock_object(vsd_writer, "Enterprise", "ent1",
+                                            "id1")
+        mock_fetcher.return_value = mock_fetcher
+        mock_fetcher.get.return_value = [enterprise_1]
+
+        vsd_writer.coalesce_selects("Enterprise", ["name", "BGPEnabled"])
+        for index in range(2):
+            context = vsd_writer.select_object_by_fields(
+                "Enterprise", ["name", "BGPEnabled"], ["ent1", False])
+            assert context.current_object is enterprise_1
+
+        mock_fetcher.get.assert_called_once_with()
+
+    def test_by_fields__validate_only(self):
+        vsd_writer = VsdWriter()
+        vsd_writer.set_validate_only()
+        setup_standard_session(vsd_writer)
+
+        context = vsd_writer.select_object_by_fields(
+            "Enterprise", ["name", "BGPEnabled"], ["ent1", False])
+
+        assert context.object_exists is True
+        assert context.current_object is not None
+
+    @patch("nuage_metroae_config.vsd_writer.Fetcher")
+    @patch("nuage_metroae_config.vsd_writer.EnterpriseFetcher")
+    def test_by_child__one_fetch(self, mock_ent_fetcher, mock_fetcher):
+        vsd_writer = VsdWriter()
+        mock_session = setup_standard_session(vsd_writer)
+
+        enterprise_1 = self.get_mock_object(vsd_writer, "Enterprise", "ent1",
+                                            "id1")
+        enterprise_2 = self.get_mock_object(vsd_writer, "Enterprise", "ent2",
+                                            "id2")
+        enterprise_3 = self.get_mock_object(vsd_writer, "Enterprise", "ent3",
+                                            "id3")
+        mock_ent_fetcher.return_value = mock_ent_fetcher
+        mock_ent_fetcher.get.return_value = [enterprise_1, enterprise_2,
+                                             enterprise_3]
+        domain_1 = self.get_mock_object(vsd_writer, "Domain", "dom1",
+                                        "id4", parent_id="id3")
+        domain_2 = self.get_mock_object(vsd_writer, "Domain", "dom1",
+                                        "id5", parent_id="id2")
+        domain_3 = self.get_mock_object(vsd_writer, "Domain", "dom1",
+                                        "id6", parent_id="id2")
+        mock_fetcher.return_value = mock_fetcher
+        mock_fetcher.get.return_value = [domain_1, domain_2, domain_3]
+
+        matches = vsd_writer.get_object_list_by_child("Enterprise", "Domain",
+                                                      "name", "dom1")
+
+        mock_ent_fetcher.get.assert_called_once_with()
+        mock_fetcher.assert_called_once_with(mock_session.root_object,
+                                             vsd_writer.specs['domain'])
+        mock_fetcher.get.assert_called_once_with(filter='name is "dom1"')
+        assert [(x[0].current_object, x[1]) for x in matches] == [
+            (enterprise_2, 2), (enterprise_3, 1)]
+        assert matches[0][0].object_exists is True
+
+    def test_by_child__not_listed(self):
+        vsd_writer = VsdWriter()
+        setup_standard_session(vsd_writer)
+
+        # Domain templates can not be fetched from the root object
+        assert vsd_writer.get_object_list_by_child(
+            "Enterprise", "DomainTemplate", "name", "template1") is None
+
+        vsd_writer.set_bulk_fetch()
+        assert vsd_writer.get_object_list_by_child(
+            "Enterprise", "Domain", "name", "dom1") is None
+
+    @patch("nuage_metroae_config.vsd_writer.Fetcher")
+    def test_by_child__member(self, mock_fetcher):
+        vsd_writer = VsdWriter()
+        setup_standard_session(vsd_writer)
+
+        context = Context()
+        context.current_object = self.get_mock_object(vsd_writer,
+                                                      "Enterprise", "ent1",
+                                                      "id1")
+
+        # Domains are members of domain templates, their parent is the
+        # enterprise
+        assert vsd_writer.get_object_list_by_child(
+            "DomainTemplate", "Domain", "name", "dom1", context) is None
+
+        mock_fetcher.assert_not_called()
+
+    @patch("nuage_metroae_config.vsd_writer.Fetcher")
+    @patch("nuage_metroae_config.vsd_writer.EnterpriseFetcher")
+    def test_by_child__bambou_error(self, mock_ent_fetcher, mock_fetcher):
+        vsd_writer = VsdWriter()
+        setup_standard_session(vsd_writer)
+
+        mock_ent_fetcher.return_value = mock_ent_fetcher
+        mock_ent_fetcher.get.return_value = []
+        mock_fetcher.return_value = mock_fetcher
+        mock_fetcher.get.side_effect = get_mock_bambou_error(404,
+                                                             "Not Found")
+
+        with pytest.raises(VsdError) as e:
+            vsd_writer.get_object_list_by_child("Enterprise", "Domain",
+                                                "name", "dom1")
+
+        assert ("Get object list Enterprise by child Domain name = dom1" in
+                e.value.get_display_string())
+
+
+class TestVsdWriterCallEstimate(object):
+
+    @staticmethod
+    def get_counts(vsd_writer):
+        return {(x["method"], x["object"]): x["count"]
+                for x in vsd_writer.get_call_estimate()}
+
+    def test_estimate__write(self):
+        vsd_writer = VsdWriter()
+        vsd_writer.set_validate_only()
+        setup_standard_session(vsd_writer)
+
+        context = vsd_writer.create_object("Enterprise")
+        vsd_writer.set_values(context, name="ent1")
+        domain_context = vsd_writer.update_object("Domain", "name", "dom1",
+                                                  context)
+        vsd_writer.set_values(domain_context, description="Domain")
+        vsd_writer.delete_object(domain_context)
+
+        assert self.get_counts(vsd_writer) == {("GET", "Me"): 1,
+                                               ("POST", "Enterprise"): 1,
+                                               ("GET", "Domain"): 1,
+                                               ("PUT", "Domain"): 1,
+                                               ("DELETE", "Domain"): 1}
+        assert vsd_writer.get_call_estimate()[0] == {"method": "DELETE",
+                                                     "object": "Domain",
+                                                     "count": 1}
+
+    def test_estimate__coalesced(self):
+        vsd_writer = VsdWriter()
+        vsd_writer.set_validate_only()
+        setup_standard_session(vsd_writer)
+
+        vsd_writer.coalesce_selects("Enterprise", "name")
+        vsd_writer.coalesce_selects("Enterprise", "name")
+        vsd_writer.select_object("Enterprise", "name", "ent1")
+        vsd_writer.select_object("Enterprise", "name", "ent2")
+        vsd_writer.select_object_by_fields("Enterprise", ["name"], ["ent3"])
+
+        assert self.get_counts(vsd_writer) == {("GET", "Me"): 1,
+                                               ("GET", "Enterprise"): 1}
+
+    def test_estimate__not_coalesced(self):
+        vsd_writer = VsdWriter()
+        vsd_writer.set_validate_only()
+        setup_standard_session(vsd_writer)
+
+        vsd_writer.select_object("Enterprise", "name", "ent1")
+        vsd_writer.select_object("Enterprise", "name", "ent2")
+
+        assert self.get_counts(vsd_writer) == {("GET", "Me"): 1,
+                                               ("GET", "Enterprise"): 2}
+
+    def test_estimate__bulk_fetch(self):
+        vsd_writer = VsdWriter()
+        vsd_writer.set_validate_only()
+        vsd_writer.set_bulk_fetch()
+        setup_standard_session(vsd_writer)
+
+        context = vsd_writer.select_object("Enterprise", "name", "ent1")
+        vsd_writer.select_object("Enterprise", "name", "ent2")
+        vsd_writer.select_object("Domain", "name", "dom1", context)
+        vsd_writer.select_object("Domain", "name", "dom2", context)
+
+        assert self.get_counts(vsd_writer) == {("GET", "Me"): 1,
+                                               ("GET", "Enterprise"): 1,
+                                               ("GET", "Domain"): 1}
+
+    def test_estimate__plan_only(self):
+        vsd_writer = VsdWriter()
+        vsd_writer.set_validate_only()
+        vsd_writer.set_plan_only()
+        setup_standard_session(vsd_writer)
+
+        context = vsd_writer.update_object("Enterprise", "name", "ent1")
+        vsd_writer.set_values(context, name="ent1")
+        domain_context = vsd_writer.create_object("Domain", context)
+        vsd_writer.set_values(domain_context, name="dom1",
+                              templateID="template_id")
+        vsd_writer.select_object("Enterprise", "name", "ent2")
+        vsd_writer.delete_object(domain_context)
+        vsd_writer.stop_session()
+
+        # A plan only reads from the VSD, in bulk
+        assert self.get_counts(vsd_writer) == {("GET", "Me"): 1,
+                                               ("GET", "Enterprise"): 1}
+        assert vsd_writer.get_plan() == []
+
+    def test_estimate__new_session(self):
+        vsd_writer = VsdWriter()
+        vsd_writer.set_validate_only()
+        setup_standard_session(vsd_writer)
+
+        vsd_writer.select_object("Enterprise", "name", "ent1")
+        vsd_writer.stop_session()
+        setup_standard_session(vsd_writer)
+
+        assert self.get_counts(vsd_writer) == {("GET", "Me"): 1}
+
+    def test_estimate__not_validate_only(self):
+        vsd_writer = VsdWriter()
+        setup_standard_session(vsd_writer)
+
+        context = vsd_writer.create_object("Enterprise")
+        vsd_writer.set_values(context, name="ent1")
+
+        assert vsd_writer.get_call_estimate() == []
+
+
 class TestVsdWriterVersion(object):
 
     @patch("requests.get")